@@ -1,127 +1,298 @@
 import os
 import json
 import csv
+import io
+import itertools
 from io import StringIO
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from dotenv import load_dotenv
 import logging
-from openai import OpenAI
+import math
 import re
+import threading
+import sys
+import time
+from datetime import datetime
 
-# 環境変数の読み込み
-load_dotenv()
+from prompt_builder import build_messages
+from pipeline import run_batch, iter_postings, iter_postings_from_text, iter_postings_from_jsonl
+from extraction_cache import ExtractionCache, make_cache_key
+from extraction_schema import FUNCTION_NAME, JOB_ROW_SCHEMA, SchemaValidationError, function_tool, parse_row, response_format
+from job_context import JobContext
+from job_mirror import JobMirror
+from job_queue import JobQueue
+from metrics import (
+    EXTRACTION_TIER_ATTEMPTS,
+    EXTRACTION_TIER_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    OPENAI_PROMPT_TOKENS_SAVED,
+    REGISTRY,
+    record_openai_usage,
+)
+from duplicate_index import DuplicateIndex
+from notion_api import NotionClient, NotionOutbox, NotionUnavailableError, NOTION_API_URL, RETRY_STATUS_CODES
+from notion_schema import DatabaseSchema, NotionSchemaError
+from section_parser import (
+    DEV_ENV_PATTERN,
+    FIELDS,
+    PERIOD_TECH_WORDS,
+    clean,
+    extract_fields,
+    has_salary,
+    parse_sections,
+)
+
+# 環境変数の読み込み（.env がある場合のみ。Herokuなどの本番環境では環境変数を直接設定する）
+DOTENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+if os.path.exists(DOTENV_PATH):
+    from dotenv import load_dotenv
+    load_dotenv(DOTENV_PATH)
+
+# ログの設定（DEBUG の場合のみプロンプトやAPIのリクエスト/レスポンスを出力する）
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# DEBUG で出力するプロンプトなどの最大文字数（0 の場合は省略しない）
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', 2000))
 
 # Flaskアプリケーションの設定
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=LOG_LEVEL)
 
 # 環境変数の設定
 NOTION_TOKEN = os.getenv('NOTION_TOKEN')
 DATABASE_ID = os.getenv('NOTION_DATABASE_ID')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
-# グローバル変数
-data = ""  # 入力データを保存するグローバル変数
+# バッチ処理の並列度（ステージごとの上限）
+BATCH_AI_CONCURRENCY = int(os.getenv('BATCH_AI_CONCURRENCY', 4))
+BATCH_NOTION_CONCURRENCY = int(os.getenv('BATCH_NOTION_CONCURRENCY', 2))
+# リクエストで指定できるAI変換ステージの同時実行数の上限（OpenAIへの同時リクエスト数を抑える）
+MAX_AI_CONCURRENCY = int(os.getenv('MAX_AI_CONCURRENCY', 8))
 
-# Notion API の設定
-NOTION_HEADERS = {
-    "Authorization": f"Bearer {NOTION_TOKEN}",
-    "Content-Type": "application/json",
-    "Notion-Version": "2022-06-28"
-}
+# OpenAI の設定（プロンプトを変更した場合は PROMPT_VERSION を更新してキャッシュを無効化する）
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+PROMPT_VERSION = "3"
+# プロンプト（指示と求人情報）のトークン数の上限（超える場合は重要度の低い見出しから切り詰める）
+PROMPT_MAX_TOKENS = int(os.getenv('PROMPT_MAX_TOKENS', 6000))
 
-# OpenAI クライアントの初期化
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def transform_data_with_ai(data):
-    prompt = f"""
-    以下の求人情報を、指定されたCSVフォーマットに変換してください。
-
-    フォーマット: 名前,タグ,仕事内容,勤務地,勤務時間,必須スキル,案件タイトル,案件内容,歓迎スキル,給与,開発環境,雇用形態,業種業界,ポジション,プロダクト,期間,稼働率,働き方,期待する人物像,その他
-
-    各フィールドの詳細な説明と抽出ルール:
-    1. 名前: 【業務名】セクションから抽出。例: "福祉事業会社向け 社内システム開発支援"
-    2. タグ: 業種・業界、技術キーワードをカンマ区切りで。例: "Ruby,Rails,Web開発"
-    3. 仕事内容: 【作業概要】セクションの内容。
-    4. 勤務地: 【作業場所】セクションから場所情報を抽出。例: "基本リモート作業（地方の方可能）"
-    5. 勤務時間: 【稼働】や勤務時間に関する情報。
-    6. 必須スキル: 【スキル】の<マスト>セクションの内容。
-    7. 案件タイトル: 【業務名】セクションの内容。
-    8. 案件内容: 【作業概要】セクションの内容。
-    9. 歓迎スキル: 【スキル】の<Better>セクションの内容。
-    10. 給与: 【単金】セクションの内容。例: "85万（スキル見合い）（精算 140-180/月）"
-    11. 開発環境: 【環境】セクションの「開発環境」に記載されている技術スタックのみ。例: "Ruby、Ruby on Rails、TypeScript、React.js"
-    12. 雇用形態: 契約形態（業務委託など）。
-    13. 業種業界: 業種・業界に関する情報。例: "福祉事業"
-    14. ポジション: 【募集】セクションの内容。例: "バックエンドエンジニア × SE 8名"
-    15. プロダクト: 開発対象のプロダクト情報。
-    16. 期間: 【作業期間】セクションの内容。例: "2025年4月〜"
-    17. 稼働率: 【単金】セクションの精算情報。例: "140-180/月"
-    18. 働き方: 【作業場所】や働き方に関する情報。例: "基本リモート作業"
-    19. 期待する人物像: 【備考】から期待する人物像を抽出。例: "主体的・自律的に行動できる方"
-    20. その他: その他の重要情報。
-
-    重要な注意点:
-    - 各フィールドは必ず対応するセクションから情報を抽出し、混同しないでください。
-    - 【環境】の開発環境と【単金】の情報を混同しないでください。
-    - 【作業期間】と開発環境の情報を混同しないでください。
-    - 給与情報は必ず【単金】セクションから抽出してください。
-    - 期間情報は必ず【作業期間】セクションから抽出してください。
-    - 開発環境は【環境】セクションの「開発環境」部分から技術スタックのみを抽出してください。
-    - 情報がない場合は「情報なし」と出力してください。
-    - 必ず1行のCSV形式で出力し、ヘッダー行は含めないでください。
-
-    求人情報:
-    {data}
-    """
-    
-    logging.debug("Sending prompt to OpenAI: %s", prompt)
+# AIによる抽出方式（tools: Function Calling / json_schema: Structured Outputs（対応モデルのみ） / csv: 従来のCSV形式）
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'tools')
+
+# セクションパーサーの信頼度がこの値以上ならAIを呼び出さない（1より大きくすると常にAIを使用）
+SECTION_PARSER_THRESHOLD = float(os.getenv('SECTION_PARSER_THRESHOLD', 0.8))
+
+# 抽出に使う段階（安い順、カンマ区切り）。parser はセクションパーサー（ローカル）、それ以外は OpenAI のモデル名。
+# 品質チェックに合格しなかった場合のみ次の段階に進む（例: parser,gpt-4o-mini,gpt-4o）
+LOCAL_TIER = 'parser'
+EXTRACTION_TIERS = [tier.strip() for tier in os.getenv('EXTRACTION_TIERS', f'{LOCAL_TIER},{OPENAI_MODEL}').split(',')
+                    if tier.strip()]
+# AIの段階がすべてエラーになった場合に、信頼度がしきい値未満のセクションパーサーの結果を登録するか
+PARSER_FALLBACK_ON_AI_ERROR = os.getenv('PARSER_FALLBACK_ON_AI_ERROR', 'false').lower() == 'true'
+
+# AI変換結果キャッシュの設定
+EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', 'true').lower() == 'true'
+EXTRACTION_CACHE_PATH = os.getenv('EXTRACTION_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extraction_cache.sqlite3'))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv('EXTRACTION_CACHE_MAX_ENTRIES', 10000))
+EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv('EXTRACTION_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+
+# ジョブキューの設定
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_queue.sqlite3'))
+JOB_QUEUE_WORKERS = int(os.getenv('JOB_QUEUE_WORKERS', 2))
+
+# Notion API の設定（Notionのレート制限は平均3リクエスト/秒）
+NOTION_BASE_URL = os.getenv('NOTION_API_URL', NOTION_API_URL)
+NOTION_RATE_LIMIT = float(os.getenv('NOTION_RATE_LIMIT', 3))
+# NOTION_RATE_LIMIT はアプリ全体（全ワーカープロセスの合計）の上限。gunicorn のワーカー数で等分し、
+# 各プロセスのバックグラウンド処理（スキーマ・重複検出インデックス・ミラーの同期）も同じ上限に含める
+WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+NOTION_PROCESS_RATE_LIMIT = NOTION_RATE_LIMIT / WEB_CONCURRENCY
+# リクエストで指定できるNotion登録ステージの同時実行数の上限（既定はプロセスあたりのレート制限に合わせる）
+MAX_NOTION_CONCURRENCY = int(os.getenv('MAX_NOTION_CONCURRENCY', max(1, math.ceil(NOTION_PROCESS_RATE_LIMIT))))
+NOTION_MAX_RETRIES = int(os.getenv('NOTION_MAX_RETRIES', 5))
+NOTION_TIMEOUT = float(os.getenv('NOTION_TIMEOUT', 30))
+NOTION_OUTBOX_PATH = os.getenv('NOTION_OUTBOX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'notion_outbox.sqlite3'))
+NOTION_OUTBOX_REPLAY_INTERVAL = int(os.getenv('NOTION_OUTBOX_REPLAY_INTERVAL', 60))
+# データベースのスキーマを再取得する間隔（秒）と、タグなどの選択肢を新しく作成するかどうか
+NOTION_SCHEMA_REFRESH_INTERVAL = int(os.getenv('NOTION_SCHEMA_REFRESH_INTERVAL', 600))
+NOTION_ALLOW_NEW_OPTIONS = os.getenv('NOTION_ALLOW_NEW_OPTIONS', 'true').lower() == 'true'
+
+# 重複検出の設定（skip: 重複時は登録しない / update: 既存ページを更新 / create: 重複を無視して登録）
+DUPLICATE_MODE = os.getenv('DUPLICATE_MODE', 'skip')
+DUPLICATE_INDEX_PATH = os.getenv('DUPLICATE_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'duplicate_index.sqlite3'))
+DUPLICATE_INDEX_SYNC_INTERVAL = int(os.getenv('DUPLICATE_INDEX_SYNC_INTERVAL', 300))
+# 全件を取得し直してNotionで削除されたページを取り除く間隔（秒）
+DUPLICATE_INDEX_FULL_SYNC_INTERVAL = int(os.getenv('DUPLICATE_INDEX_FULL_SYNC_INTERVAL', 86400))
+
+# 求人データベースのローカルミラー（/search で検索する）の設定
+JOB_MIRROR_PATH = os.getenv('JOB_MIRROR_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'job_mirror.sqlite3'))
+JOB_MIRROR_SYNC_INTERVAL = int(os.getenv('JOB_MIRROR_SYNC_INTERVAL', 600))
+JOB_MIRROR_SYNC_WORKERS = int(os.getenv('JOB_MIRROR_SYNC_WORKERS', 4))
+# 全件を取得し直してNotionで削除されたページを取り除く間隔（秒）
+JOB_MIRROR_FULL_SYNC_INTERVAL = int(os.getenv('JOB_MIRROR_FULL_SYNC_INTERVAL', 86400))
+
+# Notion クライアントと送信待ちキューの初期化
+notion_client = NotionClient(NOTION_TOKEN, base_url=NOTION_BASE_URL, rate=NOTION_PROCESS_RATE_LIMIT,
+                             max_retries=NOTION_MAX_RETRIES, timeout=NOTION_TIMEOUT)
+notion_outbox = NotionOutbox(NOTION_OUTBOX_PATH)
+
+# データベースのスキーマのキャッシュ（最初のリクエスト時に取得し、以降は定期的に再取得）
+notion_schema = DatabaseSchema(notion_client, DATABASE_ID, NOTION_SCHEMA_REFRESH_INTERVAL, NOTION_ALLOW_NEW_OPTIONS)
+
+# 重複検出インデックスの初期化（Notionとの同期は最初のリクエスト時に開始）
+duplicate_index = DuplicateIndex(DUPLICATE_INDEX_PATH)
+
+# 求人データベースのローカルミラーの初期化（Notionとの同期は最初のリクエスト時に開始）
+job_mirror = JobMirror(JOB_MIRROR_PATH)
+
+# OpenAI クライアント（openai パッケージの読み込みに時間がかかるため、最初にAIを呼び出すときに作成する）
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+# AI変換結果キャッシュの初期化
+extraction_cache = None
+if EXTRACTION_CACHE_ENABLED:
+    extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_ENTRIES, EXTRACTION_CACHE_TTL_SECONDS)
+
+def get_openai_client():
+    """OpenAI クライアントを返す（初回のみ openai パッケージを読み込んで作成する）"""
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    return _openai_client
+
+def preload_openai_client():
+    """OpenAI クライアントをバックグラウンドのスレッドで作成しておく（gunicorn のワーカーの起動直後に呼び出す）"""
+    if OPENAI_API_KEY and _openai_client is None:
+        threading.Thread(target=get_openai_client, name="openai-preload", daemon=True).start()
+
+def log_payload(message, payload):
+    """プロンプトやAPIのリクエスト/レスポンスを、DEBUG の場合のみ文字列にしてログに出力する"""
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False, default=str)
+    if LOG_PAYLOAD_MAX_CHARS and len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = f"{text[:LOG_PAYLOAD_MAX_CHARS]}... ({len(text)} chars)"
+    logging.debug(message, text)
+
+def record_prompt_report(report, context, model=OPENAI_MODEL):
+    """プロンプトのトークン数と節約できたトークン数を記録する"""
+    logging.info("Prompt tokens: %d (saved %d, trimmed %s)",
+                 report["prompt_tokens"], report["saved_tokens"], report["trimmed_sections"] or "none")
+    OPENAI_PROMPT_TOKENS_SAVED.inc(report["saved_tokens"], model=model)
+    context.prompt_report = report
+
+def transform_data_with_ai(context, model=OPENAI_MODEL):
+    with context.span("prompt_build"):
+        messages, report = build_messages(context.content, structured=False, max_tokens=PROMPT_MAX_TOKENS,
+                                          model=model)
+    record_prompt_report(report, context, model)
+    log_payload(f"Sending prompt to OpenAI ({model}): %s", messages)
     
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that converts job information to CSV format."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=1500
-    )
+    with context.span("openai"):
+        response = get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=1500
+        )
+    record_openai_usage(model, response.usage)
     
     result = response.choices[0].message.content.strip()
-    logging.debug("OpenAI response: %s", result)
+    log_payload("OpenAI response: %s", result)
     return result
 
-def create_notion_page(row):
-    url = f"https://api.notion.com/v1/pages"
-    
+def extract_row_with_ai(context, model=OPENAI_MODEL):
+    """求人情報をAIでスキーマに沿って構造化抽出し、検証済みの行データを返す
+
+    EXTRACTION_MODE が tools の場合は Function Calling、json_schema の場合は
+    Structured Outputs を使用する。値にカンマが含まれても列がずれることはない。
+    """
+    with context.span("prompt_build"):
+        messages, report = build_messages(context.content, structured=True, max_tokens=PROMPT_MAX_TOKENS,
+                                          model=model, schema=JOB_ROW_SCHEMA)
+    record_prompt_report(report, context, model)
+
+    options = {}
+    if EXTRACTION_MODE == 'json_schema':
+        options["response_format"] = response_format()
+    else:
+        options["tools"] = [function_tool()]
+        options["tool_choice"] = {"type": "function", "function": {"name": FUNCTION_NAME}}
+
+    with context.span("openai"):
+        response = get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=1500,
+            **options
+        )
+    record_openai_usage(model, response.usage)
+
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        raise JobProcessingError("AIの出力が長すぎるため途中で打ち切られました", 400)
+    if EXTRACTION_MODE == 'json_schema':
+        arguments = choice.message.content
+    elif choice.message.tool_calls:
+        arguments = choice.message.tool_calls[0].function.arguments
+    else:
+        arguments = None
+    log_payload("OpenAI structured response: %s", arguments)
+    if not arguments:
+        raise JobProcessingError("AIが求人情報を抽出できませんでした", 400)
+
+    with context.span("schema_validate"):
+        try:
+            return parse_row(arguments)
+        except SchemaValidationError as e:
+            raise JobProcessingError("AIの出力が求人情報の形式に一致しませんでした", 400, {"errors": e.errors})
+
+def parse_ai_csv(transformed_data):
+    """AIが出力したCSV形式の1行を行データに変換する（EXTRACTION_MODE が csv の場合）"""
+    # CSVヘッダーを明示的に定義
+    headers = ["名前", "タグ", "仕事内容", "勤務地", "勤務時間", "必須スキル", "案件タイトル", "案件内容", 
+              "歓迎スキル", "給与", "開発環境", "雇用形態", "業種業界", "ポジション", "プロダクト", 
+              "期間", "稼働率", "働き方", "期待する人物像", "その他"]
+
+    # ヘッダーがない場合は追加
+    if not transformed_data.startswith("名前,タグ"):
+        csv_data = StringIO(transformed_data)
+    else:
+        # ヘッダーがある場合は除去
+        lines = transformed_data.split('\n')
+        if len(lines) > 1:
+            csv_data = StringIO('\n'.join(lines[1:]))
+        else:
+            raise JobProcessingError("AIが適切なCSV形式を生成できませんでした", 400)
+
+    try:
+        values = next(csv.reader(csv_data))
+    except StopIteration:
+        raise JobProcessingError("AIが適切なCSV形式を生成できませんでした", 400)
+
+    # 列数がヘッダーと異なる場合は、余分な列を捨てて足りない列を空にする（空の項目は最終検証で「情報なし」になる）
+    if len(values) != len(headers):
+        logging.warning("AI CSV row has %d columns, expected %d", len(values), len(headers))
+    values = (values + [""] * len(headers))[:len(headers)]
+    return dict(zip(headers, values))
+
+def build_notion_properties(row):
+    """行データからNotionのプロパティを作成する（キャッシュしたデータベースのスキーマに合わせる）"""
     # データの最終検証
     final_validate_data(row)
     
     # Notionプロパティの作成
-    properties = {
-        "名前": {"title": [{"text": {"content": row["名前"]}}]},
-        "タグ": {"multi_select": [{"name": tag.strip()} for tag in row["タグ"].split(",") if tag.strip()]},
-        "仕事内容": {"rich_text": [{"text": {"content": row["仕事内容"][:2000] if len(row["仕事内容"]) > 2000 else row["仕事内容"]}}]},
-        "勤務地": {"rich_text": [{"text": {"content": row["勤務地"]}}]},
-        "勤務時間": {"rich_text": [{"text": {"content": row["勤務時間"]}}]},
-        "必須スキル": {"rich_text": [{"text": {"content": row["必須スキル"][:2000] if len(row["必須スキル"]) > 2000 else row["必須スキル"]}}]},
-        "案件タイトル": {"rich_text": [{"text": {"content": row["案件タイトル"]}}]},
-        "案件内容": {"rich_text": [{"text": {"content": row["案件内容"][:2000] if len(row["案件内容"]) > 2000 else row["案件内容"]}}]},
-        "歓迎スキル": {"rich_text": [{"text": {"content": row["歓迎スキル"][:2000] if len(row["歓迎スキル"]) > 2000 else row["歓迎スキル"]}}]},
-        "給与": {"rich_text": [{"text": {"content": row["給与"]}}]},
-        "開発環境": {"rich_text": [{"text": {"content": row["開発環境"]}}]},
-        "雇用形態": {"rich_text": [{"text": {"content": row["雇用形態"]}}]},
-        "業種業界": {"rich_text": [{"text": {"content": row["業種業界"]}}]},
-        "ポジション": {"rich_text": [{"text": {"content": row["ポジション"]}}]},
-        "プロダクト": {"rich_text": [{"text": {"content": row["プロダクト"]}}]},
-        "期間": {"rich_text": [{"text": {"content": row["期間"]}}]},
-        "稼働率": {"rich_text": [{"text": {"content": row["稼働率"]}}]},
-        "働き方": {"rich_text": [{"text": {"content": row["働き方"]}}]},
-        "期待する人物像": {"rich_text": [{"text": {"content": row["期待する人物像"]}}]},
-        "その他": {"rich_text": [{"text": {"content": row["その他"]}}]}
-    }
+    try:
+        return notion_schema.build_properties(row)
+    except NotionSchemaError as e:
+        logging.error("Notion database schema does not match: %s", e)
+        raise JobProcessingError("Notionデータベースの構成が求人データと一致しません", 500, {"errors": e.errors})
+
+def create_notion_page(row):
+    properties = build_notion_properties(row)
     
     # リクエストデータの作成
     data = {
@@ -129,10 +300,21 @@ def create_notion_page(row):
         "properties": properties
     }
     
-    logging.debug("Notion API request data: %s", json.dumps(data, ensure_ascii=False))
+    log_payload("Notion API request data: %s", data)
     
-    # Notionにリクエスト送信
-    response = requests.post(url, headers=NOTION_HEADERS, json=data)
+    # Notionにリクエスト送信（429 / 5xx の場合はクライアント側で再試行）
+    response = notion_client.post("pages", json=data)
+    if response.status_code == 200:
+        notion_schema.remember_options(properties)
+    return response
+
+def update_notion_page(page_id, row):
+    """既存のNotionページのプロパティを更新する"""
+    data = {"properties": build_notion_properties(row)}
+    log_payload("Notion API update data: %s", data)
+    response = notion_client.patch(f"pages/{page_id}", json=data)
+    if response.status_code == 200:
+        notion_schema.remember_options(data["properties"])
     return response
 
 def final_validate_data(row):
@@ -154,6 +336,378 @@ def final_validate_data(row):
         if isinstance(row[field], str) and len(row[field]) > 2000:
             row[field] = row[field][:1997] + "..."
 
+class JobProcessingError(Exception):
+    """求人情報の処理中に発生したエラー（HTTPステータスコード付き）"""
+
+    def __init__(self, message, status_code=500, details=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.details = details or {}
+
+class DuplicatePostingError(JobProcessingError):
+    """登録済みの求人と重複している"""
+
+    def __init__(self, duplicates):
+        super().__init__("登録済みの求人と重複しています", 409, {"duplicates": duplicates})
+        self.duplicates = duplicates
+
+def check_notion_schema(context):
+    """AIを呼び出す前に、キャッシュしたスキーマでNotionのデータベースに登録できるかを確認する"""
+    try:
+        with context.span("schema_check"):
+            missing = notion_schema.check(FIELDS)
+    except NotionSchemaError as e:
+        logging.error("Notion database schema does not match: %s", e)
+        raise JobProcessingError("Notionデータベースの構成が求人データと一致しません", 500, {"errors": e.errors})
+    except (NotionUnavailableError, requests.RequestException) as e:
+        # Notionが一時的に利用できない場合は変換を続け、登録時に送信待ちキューへ保存する
+        logging.warning("Could not load Notion database schema: %s", e)
+        return
+    if missing:
+        logging.debug("Fields not in the Notion database: %s", missing)
+
+def extract_job_row(context):
+    """求人情報テキスト（context.content）を検証済みのNotion用データに変換し、context.row に設定して返す"""
+    content = context.content
+    on_duplicate = context.on_duplicate or DUPLICATE_MODE
+    check_notion_schema(context)
+    
+    # セクションパーサーで抽出する（重複の判定と、最初の段階の抽出結果に使う）
+    with context.span("section_parser"):
+        parsed, confidence = extract_fields(content)
+    context.confidence = confidence
+    logging.debug("Section parser confidence: %s", confidence)
+    
+    # 登録済みの求人と重複していればAIを呼び出す前に中止する
+    if on_duplicate == 'skip':
+        with context.span("duplicate_check"):
+            duplicates = duplicate_index.find(parsed)
+        if duplicates:
+            raise DuplicatePostingError(duplicates)
+    
+    row = route_extraction(context, parsed)
+    logging.debug("Parsed row with all fields: %s", row)
+    
+    # 各フィールドの値を個別にログ出力
+    for key, value in row.items():
+        logging.debug("Field %s: %s (type: %s)", key, value, type(value))
+
+    context.row = row
+    return row
+
+def run_tier(context, tier, parsed):
+    """1つの段階で求人情報を抽出し、検証・修正した行データを返す"""
+    content = context.content
+    if tier == LOCAL_TIER:
+        row = dict(parsed)
+    elif EXTRACTION_MODE == 'csv':
+        transformed_data = transform_data_with_ai(context, tier)
+        log_payload("Transformed data: %s", transformed_data)
+        with context.span("csv_parse"):
+            row = parse_ai_csv(transformed_data)
+    else:
+        row = extract_row_with_ai(context, tier)
+
+    # データの検証と修正
+    with context.span("validate"):
+        validate_and_fix_data(row, content)
+    
+    # 正規表現を使った直接抽出（AIの解析が不十分な場合のバックアップ）
+    if tier != LOCAL_TIER:
+        with context.span("direct_extract"):
+            direct_extract_data(row, content)
+    return row
+
+def is_ai_unavailable_error(error):
+    """OpenAI API の呼び出しや通信のエラーか（openai パッケージは読み込み済みの場合のみ確認する）"""
+    if isinstance(error, requests.RequestException):
+        return True
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, openai.APIError)
+
+def route_extraction(context, parsed):
+    """EXTRACTION_TIERS の段階を安い順に試し、品質チェックに合格した最初の結果を返す
+
+    すべての段階が不合格の場合は、最後まで試したうえで問題の最も少ない結果を返す（同数の場合は後の段階の結果）。
+    AIの段階がエラーになった場合は次の段階に進む。AIの段階がすべてエラーになり、信頼度がしきい値未満の
+    セクションパーサーの結果しか残らない場合は、PARSER_FALLBACK_ON_AI_ERROR が有効な場合を除いてエラーにする。
+    段階ごとの結果と所要時間は context.routing とメトリクスに記録する。
+    """
+    content = context.content
+    ai_tiers = [tier for tier in EXTRACTION_TIERS if tier != LOCAL_TIER]
+    cache_key = None
+    best = None
+    error = None
+    ai_succeeded = False
+    for index, tier in enumerate(EXTRACTION_TIERS):
+        last = index == len(EXTRACTION_TIERS) - 1
+
+        # 同じ求人の変換結果がキャッシュにあればAIを呼び出さずに返す
+        if tier != LOCAL_TIER and extraction_cache is not None and cache_key is None:
+            cache_key = make_cache_key(content, f"{PROMPT_VERSION}:{EXTRACTION_MODE}:{','.join(ai_tiers)}")
+            with context.span("cache_lookup"):
+                cached_row = extraction_cache.get(cache_key)
+            if cached_row is not None:
+                logging.debug("Extraction cache hit: %s", cache_key)
+                EXTRACTION_TIER_ATTEMPTS.inc(tier="cache", outcome="accepted")
+                context.routing.append({"tier": "cache", "accepted": True})
+                return cached_row
+
+        started = time.perf_counter()
+        try:
+            row = run_tier(context, tier, parsed)
+        except Exception as e:
+            if not isinstance(e, JobProcessingError) and not is_ai_unavailable_error(e):
+                raise
+            if not isinstance(e, JobProcessingError):
+                e = JobProcessingError("AIによる抽出中にエラーが発生しました", 503, {"error": str(e)})
+            elapsed = time.perf_counter() - started
+            EXTRACTION_TIER_SECONDS.observe(elapsed, tier=tier)
+            EXTRACTION_TIER_ATTEMPTS.inc(tier=tier, outcome="error")
+            context.routing.append({"tier": tier, "accepted": False, "error": e.message, "seconds": round(elapsed, 4)})
+            logging.warning("Extraction tier %s failed: %s", tier, e.details.get("error", e.message))
+            error = e
+            continue
+        elapsed = time.perf_counter() - started
+        ai_succeeded = ai_succeeded or tier != LOCAL_TIER
+
+        issues = quality_issues(row, content)
+        if tier == LOCAL_TIER and context.confidence < SECTION_PARSER_THRESHOLD:
+            issues.append("confidence")
+        accepted = not issues
+        outcome = "accepted" if accepted else ("rejected" if last else "escalated")
+        EXTRACTION_TIER_SECONDS.observe(elapsed, tier=tier)
+        EXTRACTION_TIER_ATTEMPTS.inc(tier=tier, outcome=outcome)
+        context.routing.append({"tier": tier, "accepted": accepted, "issues": issues, "seconds": round(elapsed, 4)})
+        logging.info("Extraction tier %s: %s %s", tier, outcome, issues or "")
+
+        # 問題の数が同じ場合は、後の（より性能の高い）段階の結果を優先する
+        if best is None or len(issues) <= len(best[2]):
+            best = (tier, row, issues)
+        if accepted:
+            break
+
+    if best is None:
+        raise error
+    tier, row, issues = best
+    if tier == LOCAL_TIER and "confidence" in issues and error is not None and not ai_succeeded:
+        if not PARSER_FALLBACK_ON_AI_ERROR:
+            raise error
+        logging.warning("AI extraction failed, using section parser result below confidence threshold")
+    if cache_key is not None and tier != LOCAL_TIER:
+        with context.span("cache_store"):
+            extraction_cache.put(cache_key, row)
+    return row
+
+def send_notion_row(row, context=None):
+    """変換済みデータをNotionに登録し、作成されたページ情報を返す
+
+    再試行してもNotionが応答しない場合は NotionUnavailableError を送出する。
+    """
+    context = context or JobContext()
+    logging.debug("Creating Notion page")
+    try:
+        with context.span("notion"):
+            response = create_notion_page(row)
+    except requests.RequestException as e:
+        raise NotionUnavailableError(str(e))
+    log_payload("Notion API response: %s", response.text)
+    
+    if response.status_code in RETRY_STATUS_CODES:
+        logging.error("Notion is unavailable: %s", response.text)
+        raise NotionUnavailableError(f"Notion API returned {response.status_code}")
+    if response.status_code != 200:
+        logging.error("Failed to create Notion page: %s", response.text)
+        raise JobProcessingError("Notionページの作成中にエラーが発生しました", 500)
+
+    page = response.json()
+    duplicate_index.add(page.get("id"), row, page.get("url"), page.get("last_edited_time"))
+    job_mirror.add(page.get("id"), row, page.get("url"), page.get("last_edited_time"))
+    return {"page_id": page.get("id"), "url": page.get("url")}
+
+def update_duplicate_page(page_id, row, context):
+    """重複していた既存ページを変換済みデータで更新する
+
+    再試行してもNotionが応答しない場合は NotionUnavailableError を送出する。
+    """
+    try:
+        with context.span("notion"):
+            response = update_notion_page(page_id, row)
+    except requests.RequestException as e:
+        raise NotionUnavailableError(str(e))
+    if response.status_code in RETRY_STATUS_CODES:
+        logging.error("Notion is unavailable: %s", response.text)
+        raise NotionUnavailableError(f"Notion API returned {response.status_code}")
+    if response.status_code != 200:
+        logging.error("Failed to update Notion page: %s", response.text)
+        raise JobProcessingError("Notionページの更新中にエラーが発生しました", 500)
+    page = response.json()
+    duplicate_index.add(page_id, row, page.get("url"), page.get("last_edited_time"))
+    job_mirror.add(page_id, row, page.get("url"), page.get("last_edited_time"))
+    return {"page_id": page_id, "url": page.get("url"), "status": "updated"}
+
+def publish_job_row(context):
+    """変換済みデータ（context.row）をNotionに登録する
+
+    登録済みの求人と重複している場合は context.on_duplicate に従って
+    登録を中止（skip）、既存ページを更新（update）、またはそのまま登録（create）する。
+    Notionが一時的に利用できない場合は、AI変換をやり直さずに済むよう
+    変換済みデータを送信待ちキューに保存し、後から自動的に再送する。
+    """
+    row = context.row
+    on_duplicate = context.on_duplicate or DUPLICATE_MODE
+    page_id = None
+    if on_duplicate != 'create':
+        with context.span("duplicate_check"):
+            duplicates = duplicate_index.find(row)
+        if duplicates and on_duplicate != 'update':
+            raise DuplicatePostingError(duplicates)
+        if duplicates:
+            page_id = duplicates[0]["page_id"]
+    
+    try:
+        if page_id:
+            logging.info("Updating duplicate page %s", page_id)
+            return update_duplicate_page(page_id, row, context)
+        return send_notion_row(row, context)
+    except NotionUnavailableError as e:
+        # 再送時にも同じ重複の扱いになるよう、更新先のページまたは on_duplicate を一緒に保存する
+        options = {"page_id": page_id} if page_id else {"on_duplicate": on_duplicate, "queued_at": time.time()}
+        entry_id = notion_outbox.add(row, str(e), options)
+        logging.warning("Notion is unavailable, saved row to outbox entry %d", entry_id)
+        return {"status": "deferred", "outbox_id": entry_id}
+
+def sync_duplicate_index_for_replay():
+    """送信待ちキューを再送する前に、重複検出インデックスをNotionと同期する（再送1回につき1回）"""
+    try:
+        duplicate_index.sync(notion_client, DATABASE_ID, notion_schema)
+    except NotionUnavailableError:
+        raise
+    except Exception:
+        logging.warning("Failed to sync duplicate index before outbox replay", exc_info=True)
+
+def created_since(match, timestamp):
+    """重複していたページが timestamp 以降に作成・更新されたか（Notion の時刻は分単位のため余裕を持たせる）"""
+    if timestamp is None or not match.get("last_edited_time"):
+        return True
+    edited = datetime.fromisoformat(match["last_edited_time"].replace("Z", "+00:00")).timestamp()
+    return edited >= timestamp - NOTION_TIMEOUT - 60
+
+def replay_notion_row(row, on_duplicate=None, page_id=None, queued_at=None):
+    """送信待ちキューのデータを、保存時の重複の扱いに従って再送する
+
+    タイムアウトなどで送信待ちになったデータは、Notion 側ではページが作成済みの場合がある。
+    再送の前に同期した重複検出インデックス（sync_duplicate_index_for_replay）で照合し、
+    skip の場合は重複があれば再送せず、update の場合は重複していたページを更新する。
+    create の場合は、保存した時刻以降に作成された完全一致のページがある場合のみ再送しない。
+    """
+    context = JobContext(on_duplicate=on_duplicate)
+    if page_id:
+        return update_duplicate_page(page_id, row, context)
+    on_duplicate = on_duplicate or DUPLICATE_MODE
+    duplicates = duplicate_index.find(row)
+    if on_duplicate == 'create':
+        duplicates = [match for match in duplicates if match["reason"] == "exact" and created_since(match, queued_at)]
+    if duplicates and on_duplicate == 'update':
+        logging.info("Updating duplicate page %s from outbox", duplicates[0]["page_id"])
+        return update_duplicate_page(duplicates[0]["page_id"], row, context)
+    if duplicates:
+        logging.info("Skipping outbox replay, page already exists: %s", duplicates[0]["page_id"])
+        return {"status": "duplicate", "duplicates": duplicates}
+    return send_notion_row(row, context)
+
+def process_queued_job(content, progress, on_duplicate=None):
+    """ジョブキューのワーカーから呼ばれる求人情報の処理"""
+    context = JobContext(content, on_duplicate)
+    progress("transforming")
+    extract_job_row(context)
+    progress("publishing")
+    return publish_job_row(context)
+
+def batch_stages(on_duplicate=None):
+    """run_batch に渡す変換・登録の関数（求人ごとに JobContext を作成して引き渡す）"""
+    def transform(content):
+        context = JobContext(content, on_duplicate)
+        extract_job_row(context)
+        return context
+    return transform, publish_job_row
+
+# ジョブキューの初期化（ワーカーは最初のリクエスト時に起動）
+job_queue = JobQueue(JOB_QUEUE_PATH, process_queued_job, workers=JOB_QUEUE_WORKERS)
+
+@app.before_request
+def start_background_workers():
+    job_queue.start()
+    notion_outbox.start_replayer(replay_notion_row, NOTION_OUTBOX_REPLAY_INTERVAL, sync_duplicate_index_for_replay)
+    if NOTION_TOKEN and DATABASE_ID:
+        notion_schema.start_refresher()
+        duplicate_index.start_syncer(notion_client, DATABASE_ID, notion_schema, DUPLICATE_INDEX_SYNC_INTERVAL,
+                                     DUPLICATE_INDEX_FULL_SYNC_INTERVAL)
+        job_mirror.start_syncer(notion_client, DATABASE_ID, notion_schema, JOB_MIRROR_SYNC_INTERVAL,
+                                JOB_MIRROR_SYNC_WORKERS, JOB_MIRROR_FULL_SYNC_INTERVAL)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                     endpoint=request.endpoint or "unknown", status=response.status_code)
+    return response
+
+def wants_async():
+    """リクエストが非同期処理（202 Accepted）を求めているか"""
+    if request.args.get('async', '').lower() in ('1', 'true'):
+        return True
+    if 'respond-async' in request.headers.get('Prefer', ''):
+        return True
+    body = request.get_json(silent=True) or {}
+    return body.get('async') is True
+
+def wants_timings():
+    """レスポンスにステージごとの所要時間を含めるか（?timings=1 またはボディの timings: true）"""
+    if request.args.get('timings', '').lower() in ('1', 'true'):
+        return True
+    body = request.get_json(silent=True) or {}
+    return body.get('timings') is True
+
+def job_options(on_duplicate):
+    """ジョブキューに保存する処理のオプション"""
+    return {"on_duplicate": on_duplicate} if on_duplicate else None
+
+def submit_job(content, on_duplicate=None):
+    """ジョブを登録し、202 Accepted のレスポンスを返す"""
+    job_id = job_queue.submit(content, job_options(on_duplicate))
+    logging.info("Queued job %s", job_id)
+    response = jsonify({
+        "message": "処理を受け付けました",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+    })
+    response.headers['Location'] = f"/jobs/{job_id}"
+    return response, 202
+
+def process_postings(postings, on_duplicate=None):
+    """分割された複数の求人を処理する（非同期の場合は見つかった求人から順にジョブを登録する）"""
+    if wants_async():
+        jobs = []
+        for posting in postings:
+            job_id = job_queue.submit(posting, job_options(on_duplicate))
+            jobs.append({"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+        logging.info("Queued %d jobs from one request", len(jobs))
+        return jsonify({"message": f"{len(jobs)}件の求人を受け付けました", "jobs": jobs}), 202
+
+    transform, publish = batch_stages(on_duplicate)
+    report = run_batch(postings, transform, publish,
+                       transform_workers=BATCH_AI_CONCURRENCY, publish_workers=BATCH_NOTION_CONCURRENCY)
+    summary = report["summary"]
+    report["message"] = f"{summary['total']}件中{summary['succeeded']}件の求人を処理しました"
+    return jsonify(report), 200
+
 @app.route('/process_job', methods=['POST', 'GET'])
 def process_job():
     if request.method == 'GET':
@@ -162,65 +716,153 @@ def process_job():
     try:
         logging.debug("Received request: %s", request.json)
         content = request.json['content']
+        on_duplicate = request.json.get('on_duplicate')
+
+        # 複数の求人が貼り付けられた場合は1件ずつに分割して処理する
+        postings = iter_postings_from_text(content)
+        first = next(postings, None)
+        second = next(postings, None)
+        if first is None:
+            return jsonify({"message": "求人情報を入力してください"}), 400
+        if second is not None:
+            return process_postings(itertools.chain((first, second), postings), on_duplicate)
+
+        # 非同期処理が指定された場合はキューに登録してすぐに返す
+        if wants_async():
+            return submit_job(content, on_duplicate)
         
-        # グローバル変数に保存（validate_and_fix_data関数で使用）
-        global data
-        data = content
-        
-        logging.debug("Transforming data with AI")
-        transformed_data = transform_data_with_ai(content)
-        logging.debug("Transformed data: %s", transformed_data)
-
-        # CSVヘッダーを明示的に定義
-        headers = ["名前", "タグ", "仕事内容", "勤務地", "勤務時間", "必須スキル", "案件タイトル", "案件内容", 
-                  "歓迎スキル", "給与", "開発環境", "雇用形態", "業種業界", "ポジション", "プロダクト", 
-                  "期間", "稼働率", "働き方", "期待する人物像", "その他"]
-        
-        # ヘッダーがない場合は追加
-        if not transformed_data.startswith("名前,タグ"):
-            csv_data = StringIO(transformed_data)
-        else:
-            # ヘッダーがある場合は除去
-            lines = transformed_data.split('\n')
-            if len(lines) > 1:
-                csv_data = StringIO('\n'.join(lines[1:]))
+        # 入力やステージごとの所要時間はリクエストごとのコンテキストで引き渡す
+        # （timings を指定した場合は所要時間をレスポンスにも含める）
+        context = JobContext(content, on_duplicate)
+        with context.span("total"):
+            extract_job_row(context)
+            result = publish_job_row(context)
+        timings = context.timing_report()
+        logging.info("Processed job posting: %s", timings)
+        extra = {}
+        if wants_timings():
+            extra["timings"] = timings
+            extra["routing"] = context.routing
+            if context.prompt_report:
+                extra["prompt"] = context.prompt_report
+
+        if result.get("status") == "deferred":
+            return jsonify({"message": "Notionが一時的に利用できないため登録を保留しました（自動的に再送されます）",
+                            "outbox_id": result["outbox_id"], **extra}), 202
+
+        if result.get("status") == "updated":
+            return jsonify({"message": "登録済みの求人を更新しました", "page_id": result["page_id"], **extra}), 200
+
+        return jsonify({"message": "処理が完了しました", **extra}), 200
+    except JobProcessingError as e:
+        return jsonify({"message": e.message, **e.details}), e.status_code
+    except Exception as e:
+        logging.exception("An error occurred")
+        return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    try:
+        content = request.json['content']
+        return submit_job(content, request.json.get('on_duplicate'))
+    except Exception as e:
+        logging.exception("An error occurred")
+        return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"message": "ジョブが見つかりません"}), 404
+    return jsonify(job), 200
+
+@app.route('/process_jobs', methods=['POST'])
+def process_jobs():
+    """複数の求人情報をまとめて処理するバッチエンドポイント
+
+    JSONボディの ``contents``（文字列のリスト）、アップロードされた
+    テキスト/JSONLファイル（フィールド名 ``file``）、またはテキストのリクエストボディ
+    （``Content-Type: text/plain``、オプションはクエリパラメータで指定）を受け付ける。
+    ファイルとテキストのボディはストリームとして読み込み、見つかった求人から順に処理する。
+    """
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            lines = io.TextIOWrapper(upload.stream, encoding='utf-8')
+            if upload.filename and upload.filename.endswith('.jsonl'):
+                contents = iter_postings_from_jsonl(lines)
             else:
-                return jsonify({"message": "AIが適切なCSV形式を生成できませんでした"}), 400
-        
-        # CSVリーダーを作成（ヘッダーを明示的に指定）
-        reader = csv.DictReader(csv_data, fieldnames=headers)
-        
-        try:
-            row = next(reader)
-            # データの検証と修正
-            validate_and_fix_data(row)
-            
-            # 正規表現を使った直接抽出（AIの解析が不十分な場合のバックアップ）
-            direct_extract_data(row, content)
-                
-            logging.debug("Parsed row with all fields: %s", row)
-        except StopIteration:
-            return jsonify({"message": "AIが適切なCSV形式を生成できませんでした"}), 400
-        
-        # 各フィールドの値を個別にログ出力
-        for key, value in row.items():
-            logging.debug("Field %s: %s (type: %s)", key, value, type(value))
+                contents = iter_postings(lines)
+            options = request.form
+        elif request.mimetype == 'text/plain':
+            contents = iter_postings(io.TextIOWrapper(request.stream, encoding=request.mimetype_params.get('charset', 'utf-8')))
+            options = request.args
+        else:
+            body = request.json or {}
+            contents = body.get('contents') or []
+            options = body
 
-        logging.debug("Creating Notion page")
-        response = create_notion_page(row)
-        logging.debug("Notion API response: %s", response.text)
-        
-        if response.status_code != 200:
-            logging.error("Failed to create Notion page: %s", response.text)
-            return jsonify({"message": "Notionページの作成中にエラーが発生しました"}), 500
+        # 1件のリクエストで大量のスレッドやAPI呼び出しを発生させないよう、設定した上限に収める
+        ai_workers = min(int(options.get('ai_concurrency', BATCH_AI_CONCURRENCY)), MAX_AI_CONCURRENCY)
+        notion_workers = min(int(options.get('notion_concurrency', BATCH_NOTION_CONCURRENCY)), MAX_NOTION_CONCURRENCY)
+        logging.info("Processing batch of postings (ai=%d, notion=%d)", ai_workers, notion_workers)
 
-        return jsonify({"message": "処理が完了しました"}), 200
+        on_duplicate = options.get('on_duplicate')
+        transform, publish = batch_stages(on_duplicate)
+        report = run_batch(contents, transform, publish,
+                           transform_workers=ai_workers, publish_workers=notion_workers)
+        if report["summary"]["total"] == 0:
+            return jsonify({"message": "処理対象の求人情報がありません"}), 400
+        return jsonify(report), 200
     except Exception as e:
         logging.exception("An error occurred")
         return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
 
-def validate_and_fix_data(row):
-    """データの検証と修正を行う関数"""
+# validate_and_fix_data で不足タグを補うキーワード（部分一致、1回の走査で検出する）
+FALLBACK_TAG_KEYWORDS = ["Ruby", "Rails", "Python", "Java", "AWS", "Docker", "Web", "フロントエンド", "バックエンド", "設計", "開発"]
+FALLBACK_TAG_PATTERN = re.compile("|".join(re.escape(tech.lower()) for tech in FALLBACK_TAG_KEYWORDS))
+FALLBACK_TAG_CANONICAL = {tech.lower(): tech for tech in FALLBACK_TAG_KEYWORDS}
+DEFAULT_TAGS = ["システム開発", "エンジニア", "IT"]
+
+# 誤抽出の検出に使うパターン
+PERIOD_TECH_PATTERN = re.compile("|".join(PERIOD_TECH_WORDS), re.IGNORECASE)
+ENV_SALARY_PATTERN = re.compile(r'万|円|単金')
+# 求人情報に含まれる金額（「70万」「700,000円」など）
+SALARY_AMOUNT_PATTERN = re.compile(r'\d+(?:\.\d+)?\s*万|\d[\d,]*\s*円')
+TECH_NAME_PATTERN = re.compile(r'([A-Za-z0-9.]+(?:\s*[A-Za-z0-9.]+)*)')
+
+# direct_extract_data で直接抽出する項目と、抽出元のセクション
+DIRECT_EXTRACT_SECTIONS = {
+    "名前": "業務名",
+    "仕事内容": "作業概要",
+    "勤務地": "作業場所",
+    "必須スキル": "マスト",
+    "案件タイトル": "業務名",
+    "歓迎スキル": "Better",
+    "給与": "単金",
+    "開発環境": "環境",
+    "ポジション": "募集",
+    "期間": "作業期間",
+    "働き方": "作業場所",
+}
+
+def find_section(content, name):
+    """求人情報から指定したセクションの本文を返す（見つからない場合は空文字）"""
+    sections, subsections, _ = parse_sections(content)
+    if name in ("マスト", "Better"):
+        return subsections.get(name, "")
+    return sections.get(name, "")
+
+def find_dev_env(environment):
+    """【環境】セクションから「開発環境」の行を返す（ラベルがない場合はセクション全体）"""
+    match = DEV_ENV_PATTERN.search(environment)
+    return match.group(1) if match else environment
+
+def validate_and_fix_data(row, content):
+    """データの検証と修正を行う関数（誤抽出した項目は入力データ content から再抽出する）"""
+    
+    # 再抽出に使う入力データ
+    source = content
     
     # 空の値をチェック
     for key, value in row.items():
@@ -236,131 +878,111 @@ def validate_and_fix_data(row):
     # 1. 期間フィールドの検証
     if "期間" in row:
         # 期間フィールドに技術スタックや給与情報が混入している場合
-        if any(tech in row["期間"].lower() for tech in ["ruby", "rails", "jest", "typescript", "react", "aws", "docker"]):
-            # 期間情報を再抽出
-            row["期間"] = "情報なし"
-            # 入力データから期間情報を探す
-            period_pattern = re.compile(r'【作業期間】\s*・?([^【]+)')
-            match = period_pattern.search(data)
-            if match:
-                row["期間"] = match.group(1).strip()
+        if PERIOD_TECH_PATTERN.search(row["期間"]):
+            # 入力データから期間情報を再抽出
+            row["期間"] = clean(find_section(source, "作業期間")) or "情報なし"
     
     # 2. 給与フィールドの検証
     if "給与" in row:
         # 給与情報が含まれていない場合
-        if not any(word in row["給与"].lower() for word in ["万", "円", "千", "k", "万円"]):
+        if not has_salary(row["給与"]):
             # 給与情報を再抽出
-            salary_pattern = re.compile(r'【単金】\s*・?([^【]+)')
-            match = salary_pattern.search(data)
-            if match:
-                row["給与"] = match.group(1).strip()
+            salary = clean(find_section(source, "単金"))
+            if salary:
+                row["給与"] = salary
     
     # 3. 開発環境フィールドの検証
     if "開発環境" in row:
         # 開発環境に給与情報が混入している場合
-        if any(word in row["開発環境"].lower() for word in ["万円", "万", "円", "85万", "単金"]):
-            # 開発環境情報を再抽出
+        if ENV_SALARY_PATTERN.search(row["開発環境"]):
+            # 開発環境情報を再抽出（技術スタックが記載された最初の行のみ）
             row["開発環境"] = "情報なし"
-            # 入力データから開発環境情報を探す
-            env_pattern = re.compile(r'【環境】\s*[^開]*開発環境\s*([^【]+)')
-            match = env_pattern.search(data)
-            if match:
-                env_text = match.group(1).strip()
-                # 技術スタックのみを抽出（行ごとに分割して最初の数行を取得）
-                env_lines = env_text.split('\n')
-                if env_lines:
-                    row["開発環境"] = env_lines[0].strip()
+            environment = find_section(source, "環境")
+            if environment:
+                env_lines = find_dev_env(environment).strip().split('\n')
+                row["開発環境"] = env_lines[0].strip() or "情報なし"
     
     # 4. タグの検証（最低3つ確保）
     if "タグ" in row:
         tags = [tag.strip() for tag in row["タグ"].split(",") if tag.strip()]
         if len(tags) < 3:
-            # タグが3つ未満の場合、他のフィールドから抽出
-            potential_tags = set()
+            # タグが3つ未満の場合、他のフィールドから技術キーワードを抽出
+            potential_tags = []
             for key, value in row.items():
                 if isinstance(value, str) and key not in ["タグ", "名前"]:
-                    # 技術キーワードを抽出
-                    for tech in ["Ruby", "Rails", "Python", "Java", "AWS", "Docker", "Web", "フロントエンド", "バックエンド", "設計", "開発"]:
-                        if tech.lower() in value.lower():
-                            potential_tags.add(tech)
+                    for match in FALLBACK_TAG_PATTERN.finditer(value.lower()):
+                        tech = FALLBACK_TAG_CANONICAL[match.group(0)]
+                        if tech not in tags and tech not in potential_tags:
+                            potential_tags.append(tech)
             
             # 既存のタグと合わせる
-            all_tags = set(tags) | potential_tags
-            if len(all_tags) >= 3:
-                row["タグ"] = ", ".join(list(all_tags)[:5])  # 最大5つまで
-            else:
+            all_tags = tags + potential_tags
+            if len(all_tags) < 3:
                 # それでも足りない場合、デフォルトタグを追加
-                default_tags = ["システム開発", "エンジニア", "IT"]
-                all_tags = set(tags) | potential_tags | set(default_tags)
-                row["タグ"] = ", ".join(list(all_tags)[:5])
+                all_tags += [tag for tag in DEFAULT_TAGS if tag not in all_tags]
+            row["タグ"] = ", ".join(all_tags[:5])  # 最大5つまで
     
     # 5. 勤務地の検証
     if "勤務地" in row and (row["勤務地"] == "情報なし" or not row["勤務地"]):
         # 勤務地情報を再抽出
-        location_pattern = re.compile(r'【作業場所】\s*・?([^【]+)')
-        match = location_pattern.search(data)
-        if match:
-            row["勤務地"] = match.group(1).strip()
+        location = clean(find_section(source, "作業場所"))
+        if location:
+            row["勤務地"] = location
     
     # 6. ポジションの検証
     if "ポジション" in row and (row["ポジション"] == "情報なし" or not row["ポジション"]):
         # ポジション情報を再抽出
-        position_pattern = re.compile(r'【募集】\s*・?([^【]+)')
-        match = position_pattern.search(data)
-        if match:
-            row["ポジション"] = match.group(1).strip()
+        position = clean(find_section(source, "募集"))
+        if position:
+            row["ポジション"] = position
+
+def quality_issues(row, content):
+    """抽出結果の品質チェック（validate_and_fix_data と同じ条件）で不合格となった項目のリスト"""
+    issues = []
+    for field in ("名前", "仕事内容"):
+        if row.get(field, "情報なし") == "情報なし":
+            issues.append(field)
+    if PERIOD_TECH_PATTERN.search(row.get("期間", "")):
+        issues.append("期間")
+    # 単金のセクション（ない場合は求人情報全体）に金額がある場合のみ給与を必須とする
+    if not has_salary(row.get("給与", "")) and SALARY_AMOUNT_PATTERN.search(find_section(content, "単金") or content):
+        issues.append("給与")
+    if ENV_SALARY_PATTERN.search(row.get("開発環境", "")):
+        issues.append("開発環境")
+    return issues
 
 def direct_extract_data(row, content):
-    """正規表現を使って直接データを抽出する関数"""
+    """セクションパーサーの結果から直接データを抽出する関数"""
     
-    # 重要なフィールドを正規表現で直接抽出
-    patterns = {
-        "名前": r'【業務名】\s*・?([^【]+)',
-        "仕事内容": r'【作業概要】\s*([^【]+)',
-        "勤務地": r'【作業場所】\s*・?([^【]+)',
-        "必須スキル": r'【スキル】\s*.*?<マスト>\s*([^<【]+)',
-        "案件タイトル": r'【業務名】\s*・?([^【]+)',
-        "歓迎スキル": r'<Better>\s*([^【]+)',
-        "給与": r'【単金】\s*・?([^【]+)',
-        "開発環境": r'【環境】\s*[^開]*開発環境\s*([^【]+)',
-        "ポジション": r'【募集】\s*・?([^【]+)',
-        "期間": r'【作業期間】\s*・?([^【]+)',
-        "働き方": r'【作業場所】\s*・?([^【]+)'
-    }
-    
-    # 各パターンでマッチングを試行
-    for field, pattern in patterns.items():
+    # 各フィールドの抽出元セクションを参照
+    for field, section_name in DIRECT_EXTRACT_SECTIONS.items():
         # 現在の値が「情報なし」または空の場合のみ抽出を試みる
         if field in row and (row[field] == "情報なし" or not row[field]):
-            match = re.search(pattern, content, re.DOTALL)
-            if match:
-                extracted_value = match.group(1).strip()
-                # 複数行の場合は整形
-                extracted_value = re.sub(r'\s+', ' ', extracted_value)
+            extracted_value = find_section(content, section_name)
+            if section_name == "環境":
+                extracted_value = find_dev_env(extracted_value)
+            # 複数行の場合は整形
+            extracted_value = clean(extracted_value)
+            if extracted_value:
                 row[field] = extracted_value
     
     # 特殊なケース: 開発環境
     if "開発環境" in row and (row["開発環境"] == "情報なし" or "万" in row["開発環境"]):
-        env_match = re.search(r'【環境】\s*.*?開発環境\s*(.*?)(?=\s*[【]|$)', content, re.DOTALL)
-        if env_match:
-            env_text = env_match.group(1).strip()
-            # 最初の行だけを取得（技術スタックが記載されている可能性が高い）
-            env_lines = env_text.split('\n')
-            if env_lines:
-                tech_stack = []
-                for line in env_lines[:3]:  # 最初の3行まで
-                    # 技術名のみを抽出
-                    techs = re.findall(r'([A-Za-z0-9.]+(?:\s*[A-Za-z0-9.]+)*)', line)
-                    tech_stack.extend(techs)
-                if tech_stack:
-                    row["開発環境"] = ", ".join(tech_stack)
+        environment = find_section(content, "環境")
+        if environment:
+            # 最初の3行から技術名のみを抽出（技術スタックが記載されている可能性が高い）
+            tech_stack = []
+            for line in find_dev_env(environment).strip().split('\n')[:3]:
+                tech_stack.extend(TECH_NAME_PATTERN.findall(line))
+            if tech_stack:
+                row["開発環境"] = ", ".join(tech_stack)
 
 @app.route('/debug_database', methods=['GET'])
 def debug_database():
+    """キャッシュしたデータベースのスキーマを返す（?refresh=1 でNotionから取得し直す）"""
     try:
-        url = f"https://api.notion.com/v1/databases/{DATABASE_ID}"
-        response = requests.get(url, headers=NOTION_HEADERS)
-        return jsonify(response.json()), 200
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true')
+        return jsonify(notion_schema.get(refresh=refresh)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -391,28 +1013,114 @@ def test_notion():
 @app.route('/test_ai_transform', methods=['POST'])
 def test_ai_transform():
     try:
-        content = request.json['content']
-        transformed_data = transform_data_with_ai(content)
-        
-        # CSVヘッダーを明示的に定義
-        headers = ["名前", "タグ", "仕事内容", "勤務地", "勤務時間", "必須スキル", "案件タイトル", "案件内容", 
-                  "歓迎スキル", "給与", "開発環境", "雇用形態", "業種業界", "ポジション", "プロダクト", 
-                  "期間", "稼働率", "働き方", "期待する人物像", "その他"]
-        
-        # CSVデータをパース
-        csv_data = StringIO(transformed_data)
-        reader = csv.DictReader(csv_data, fieldnames=headers)
+        context = JobContext(request.json['content'])
+        if EXTRACTION_MODE != 'csv':
+            row = extract_row_with_ai(context)
+            return jsonify({"mode": EXTRACTION_MODE, "parsed_data": row, "prompt": context.prompt_report}), 200
+        transformed_data = transform_data_with_ai(context)
         
         try:
-            row = next(reader)
+            row = parse_ai_csv(transformed_data)
             return jsonify({"transformed_data": transformed_data, "parsed_data": row}), 200
-        except StopIteration:
-            return jsonify({"message": "AIが適切なCSV形式を生成できませんでした", "raw_data": transformed_data}), 400
+        except JobProcessingError as e:
+            return jsonify({"message": e.message, "raw_data": transformed_data}), 400
             
     except Exception as e:
         logging.exception("An error occurred")
         return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
 
+@app.route('/notion_outbox', methods=['GET'])
+def get_notion_outbox():
+    entries = [
+        {"id": entry["id"], "name": entry["row"].get("名前"), "attempts": entry["attempts"],
+         "last_error": entry["last_error"], "created_at": entry["created_at"], "options": entry["options"]}
+        for entry in notion_outbox.pending(limit=int(request.args.get('limit', 100)))
+    ]
+    return jsonify({"count": notion_outbox.count(), "entries": entries}), 200
+
+@app.route('/notion_outbox/replay', methods=['POST'])
+def replay_notion_outbox():
+    try:
+        return jsonify(notion_outbox.replay(replay_notion_row, prepare=sync_duplicate_index_for_replay)), 200
+    except Exception as e:
+        logging.exception("An error occurred")
+        return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
+
+@app.route('/check_duplicate', methods=['POST'])
+def check_duplicate():
+    try:
+        row, _ = extract_fields(request.json['content'])
+        return jsonify({"duplicates": duplicate_index.find(row)}), 200
+    except Exception as e:
+        logging.exception("An error occurred")
+        return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
+
+@app.route('/duplicate_index', methods=['GET'])
+def get_duplicate_index():
+    return jsonify(duplicate_index.stats()), 200
+
+@app.route('/duplicate_index/sync', methods=['POST'])
+def sync_duplicate_index():
+    try:
+        full = request.args.get('full', '').lower() in ('1', 'true')
+        return jsonify(duplicate_index.sync(notion_client, DATABASE_ID, notion_schema, full=full)), 200
+    except Exception as e:
+        logging.exception("An error occurred")
+        return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
+
+@app.route('/search', methods=['GET'])
+def search_jobs():
+    """ローカルミラーから登録済みの求人を検索する（全文検索とタグ・給与・勤務地・期間による絞り込み）"""
+    try:
+        args = request.args
+        salary_min = args.get('salary_min', type=float)
+        salary_max = args.get('salary_max', type=float)
+        remote = args.get('remote')
+        result = job_mirror.search(
+            query=args.get('q'),
+            tags=args.getlist('tag'),
+            prefecture=args.get('prefecture'),
+            remote=None if remote is None else remote.lower() in ('1', 'true'),
+            salary_min=salary_min,
+            salary_max=salary_max,
+            start_from=args.get('start_from'),
+            start_by=args.get('start_by'),
+            limit=min(max(args.get('limit', 20, type=int), 1), 100),
+            offset=max(args.get('offset', 0, type=int), 0),
+            facets=args.get('facets', 'true').lower() not in ('0', 'false'),
+        )
+        return jsonify(result), 200
+    except Exception as e:
+        logging.exception("An error occurred")
+        return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
+
+@app.route('/job_mirror', methods=['GET'])
+def get_job_mirror():
+    return jsonify(job_mirror.stats()), 200
+
+@app.route('/job_mirror/sync', methods=['POST'])
+def sync_job_mirror():
+    try:
+        full = request.args.get('full', '').lower() in ('1', 'true')
+        return jsonify(job_mirror.sync(notion_client, DATABASE_ID, notion_schema, full=full,
+                                       workers=JOB_MIRROR_SYNC_WORKERS)), 200
+    except Exception as e:
+        logging.exception("An error occurred")
+        return jsonify({"message": f"エラーが発生しました: {str(e)}"}), 500
+
+@app.route('/cache_stats', methods=['GET', 'DELETE'])
+def cache_stats():
+    if extraction_cache is None:
+        return jsonify({"enabled": False}), 200
+    if request.method == 'DELETE':
+        extraction_cache.clear()
+    return jsonify({"enabled": True, **extraction_cache.stats()}), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """処理時間・トークン使用量・Notion APIの応答をPrometheusのテキスト形式で返す"""
+    return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route('/ping', methods=['GET'])
 def ping():
     return jsonify({"message": "pong", "status": "ok"}), 200
@@ -0,0 +1,71 @@
+"""求人情報の一括登録CLI
+
+使い方:
+    python batch_import.py postings.txt
+    python batch_import.py postings.jsonl --ai-concurrency 8 --notion-concurrency 3 --output result.json
+
+テキストファイルは求人ごとの【業務名】などの見出しで求人を区切る（見出しの前の "---" などの区切り行は省略可）。
+JSONLファイルは1行に1件（``{"content": "..."}`` または文字列）で記述する。
+"""
+import argparse
+import json
+import logging
+import sys
+
+from app import (
+    BATCH_AI_CONCURRENCY,
+    BATCH_NOTION_CONCURRENCY,
+    batch_stages,
+)
+from pipeline import run_batch, iter_postings, iter_postings_from_jsonl
+
+
+def load_postings(path, file_format=None):
+    """ファイルから求人を1件ずつ読み込む（ファイル全体をメモリに読み込まない）"""
+    if file_format is None:
+        file_format = "jsonl" if path.endswith(".jsonl") else "text"
+    with open(path, encoding="utf-8") as f:
+        if file_format == "jsonl":
+            yield from iter_postings_from_jsonl(f)
+        else:
+            yield from iter_postings(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="求人情報をまとめてNotionに登録します")
+    parser.add_argument("path", help="求人情報のテキストまたはJSONLファイル")
+    parser.add_argument("--format", choices=["text", "jsonl"], help="入力形式（省略時は拡張子から判定）")
+    parser.add_argument("--ai-concurrency", type=int, default=BATCH_AI_CONCURRENCY, help="AI変換の同時実行数")
+    parser.add_argument("--notion-concurrency", type=int, default=BATCH_NOTION_CONCURRENCY, help="Notion登録の同時実行数")
+    parser.add_argument("--on-duplicate", choices=["skip", "update", "create"], help="登録済みの求人と重複した場合の動作")
+    parser.add_argument("--output", help="処理結果を書き出すJSONファイル")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO)
+    transform, publish = batch_stages(args.on_duplicate)
+    report = run_batch(load_postings(args.path, args.format), transform, publish,
+                       transform_workers=args.ai_concurrency,
+                       publish_workers=args.notion_concurrency)
+
+    for item in report["results"]:
+        if item["status"] == "success":
+            print(f"[{item['index']}] OK    {item.get('name', '')}")
+        else:
+            print(f"[{item['index']}] ERROR ({item['stage']}) {item['message']}")
+
+    summary = report["summary"]
+    if summary["total"] == 0:
+        print("処理対象の求人情報がありません", file=sys.stderr)
+        return 1
+    print(f"合計: {summary['total']}件 成功: {summary['succeeded']}件 失敗: {summary['failed']}件 "
+          f"所要時間: {summary['elapsed_seconds']}秒 スループット: {summary['postings_per_second']}件/秒")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    return 0 if summary["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""並行処理でリクエスト間のデータが混ざらないことを確認するチェック
+
+OpenAI と Notion をローカルのスタブ（fake_servers.py）に置き換え、求人ごとに固有の
+識別子を埋め込んだ求人情報を /process_job と /process_jobs に同時に送信する。
+OpenAI スタブは期間・勤務地・ポジションをわざと誤って返すため、アプリはそれらを
+リクエストの入力データから再抽出する。Notion スタブに登録された各ページのすべての項目が
+同じ求人の識別子を含んでいるかを確認し、他のリクエストの値が混ざっていれば終了コード 1 を返す。
+
+使い方（backend ディレクトリで実行）:
+    python bench/concurrency_check.py
+    python bench/concurrency_check.py --requests 200 --concurrency 32 --batch 40
+"""
+import argparse
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import requests
+
+from replay_benchmark import start_app
+from fake_servers import FakeNotionHandler, FakeOpenAIHandler, StubConfig, server_url, start_server
+
+MARKER_PATTERN = re.compile(r"#(\d{5})#")
+# 識別子を確認する項目（AIの出力をそのまま使う項目と、入力データから再抽出される項目）
+CHECKED_FIELDS = ("名前", "仕事内容", "勤務地", "期間", "ポジション")
+
+
+def make_posting(index):
+    """識別子 #00000# を各セクションに埋め込んだ求人情報"""
+    marker = f"#{index:05d}#"
+    return (
+        f"【業務名】\n並行処理検証 案件{marker}\n"
+        f"【作業概要】\n・検証用システム{marker}の開発\n"
+        f"【作業場所】\n・拠点{marker}（リモート可）\n"
+        "【スキル】\n<マスト>\n・Pythonでの開発経験\n<Better>\n・Flaskでの開発経験\n"
+        "【単金】\n・70万（精算 140-180/月）\n"
+        f"【作業期間】\n・2025年4月〜 {marker}\n"
+        "【環境】\n開発環境：Python、Flask\n"
+        f"【募集】\n・検証担当{marker} 1名\n"
+    )
+
+
+def property_text(value):
+    """Notion のプロパティ値から文字列を取り出す"""
+    for key in ("title", "rich_text"):
+        if key in value:
+            return "".join(part["text"]["content"] for part in value[key])
+    return ""
+
+
+def check_pages(bodies, expected):
+    """登録されたページごとに、すべての項目が同じ求人の識別子だけを含んでいるかを確認する"""
+    problems = []
+    seen = []
+    for body in bodies:
+        properties = body.get("properties", {})
+        texts = {field: property_text(properties.get(field, {})) for field in CHECKED_FIELDS}
+        markers = {field: set(MARKER_PATTERN.findall(text)) for field, text in texts.items()}
+        owners = set().union(*markers.values())
+        if len(owners) != 1 or any(len(found) != 1 for found in markers.values()):
+            problems.append(f"mixed markers: { {field: sorted(found) for field, found in markers.items()} }")
+            continue
+        seen.append(owners.pop())
+    missing = sorted(set(expected) - set(seen))
+    repeated = sorted({marker for marker in seen if seen.count(marker) > 1})
+    if missing:
+        problems.append(f"{len(missing)} postings were not registered: {missing[:10]}")
+    if repeated:
+        problems.append(f"postings registered more than once: {repeated[:10]}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="並行処理でリクエスト間のデータが混ざらないことを確認します")
+    parser.add_argument("--requests", type=int, default=64, help="/process_job に送信するリクエスト数")
+    parser.add_argument("--batch", type=int, default=16, help="/process_jobs にまとめて送信する求人数")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時実行数")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="OpenAIスタブの応答遅延（秒）")
+    parser.add_argument("--notion-latency", type=float, default=0.02, help="Notionスタブの応答遅延（秒）")
+    parser.add_argument("--extraction-mode", choices=["tools", "json_schema", "csv"], help="AIによる抽出方式")
+    parser.add_argument("--verbose", action="store_true", help="アプリのログを表示する")
+    args = parser.parse_args(argv)
+
+    openai_server = start_server(FakeOpenAIHandler, StubConfig(args.openai_latency, args.openai_latency / 2,
+                                                               corrupt=True))
+    notion_config = StubConfig(args.notion_latency, args.notion_latency / 2, record=True)
+    notion_server = start_server(FakeNotionHandler, notion_config)
+    options = SimpleNamespace(notion_rate=1000.0, cache=False, always_ai=True, tiers=None,
+                              extraction_mode=args.extraction_mode, verbose=args.verbose)
+    url = start_app(options, server_url(openai_server), server_url(notion_server))
+
+    singles = list(range(args.requests))
+    batch = list(range(args.requests, args.requests + args.batch))
+    failures = []
+
+    def send(index):
+        response = requests.post(f"{url}/process_job", params={"timings": "1"},
+                                 json={"content": make_posting(index)}, timeout=120)
+        if response.status_code != 200:
+            return f"posting {index}: HTTP {response.status_code} {response.text[:200]}"
+        if "total" not in response.json().get("timings", {}):
+            return f"posting {index}: timings are missing"
+        return None
+
+    def send_batch():
+        if not batch:
+            return None
+        text = "\n---\n".join(make_posting(index) for index in batch)
+        response = requests.post(f"{url}/process_jobs", data=text.encode("utf-8"),
+                                 headers={"Content-Type": "text/plain; charset=utf-8"}, timeout=300)
+        summary = response.json().get("summary", {}) if response.status_code == 200 else {}
+        if summary.get("succeeded") != len(batch):
+            return f"batch: HTTP {response.status_code} {response.text[:200]}"
+        return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency + 1) as pool:
+        batch_future = pool.submit(send_batch)
+        failures.extend(error for error in pool.map(send, singles) if error)
+        if batch_future.result():
+            failures.append(batch_future.result())
+    elapsed = time.perf_counter() - started
+
+    failures.extend(check_pages(notion_config.bodies, [f"{index:05d}" for index in singles + batch]))
+    print(f"送信: {len(singles)}件（/process_job）+ {len(batch)}件（/process_jobs）  "
+          f"同時実行数: {args.concurrency}  所要時間: {elapsed:.2f}秒  登録ページ: {len(notion_config.bodies)}件")
+    for failure in failures:
+        print(f"NG: {failure}")
+    if failures:
+        return 1
+    print("OK: リクエスト間でデータの混入はありませんでした")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""求人情報の抽出処理のマイクロベンチマーク
+
+10KB以上の求人情報に対して、AIの出力を検証・再抽出する処理
+（validate_and_fix_data / direct_extract_data）の1件あたりの処理時間を、
+以前の実装（項目ごとに re.search で全文を走査）と現在の実装
+（事前コンパイル済みのパターンで1回だけ走査）で比較する。
+あわせてセクションパーサーだけで20項目を抽出する時間も計測する。
+
+使い方（backend ディレクトリで実行）:
+    python bench/extraction_benchmark.py
+    python bench/extraction_benchmark.py --size 50000 --repeat 200
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# ベンチマークでは外部APIやキャッシュを使わない
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "false")
+
+import app  # noqa: E402
+from section_parser import FIELDS, extract_fields, parse_sections  # noqa: E402
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_posting.txt")
+
+# 以前の実装（項目ごとに全文を走査し、パターンをリクエストごとにコンパイルする）の比較用コピー
+LEGACY_PATTERNS = {
+    "名前": r'【業務名】\s*・?([^【]+)',
+    "仕事内容": r'【作業概要】\s*([^【]+)',
+    "勤務地": r'【作業場所】\s*・?([^【]+)',
+    "必須スキル": r'【スキル】\s*.*?<マスト>\s*([^<【]+)',
+    "案件タイトル": r'【業務名】\s*・?([^【]+)',
+    "歓迎スキル": r'<Better>\s*([^【]+)',
+    "給与": r'【単金】\s*・?([^【]+)',
+    "開発環境": r'【環境】\s*[^開]*開発環境\s*([^【]+)',
+    "ポジション": r'【募集】\s*・?([^【]+)',
+    "期間": r'【作業期間】\s*・?([^【]+)',
+    "働き方": r'【作業場所】\s*・?([^【]+)',
+}
+LEGACY_TECHS = ["Ruby", "Rails", "Python", "Java", "AWS", "Docker", "Web", "フロントエンド", "バックエンド", "設計", "開発"]
+
+
+def legacy_validate_and_fix_data(row, data):
+    for key, value in row.items():
+        if value is None or (isinstance(value, str) and value.strip() == ''):
+            row[key] = "情報なし"
+    if any(tech in row["期間"].lower() for tech in ["ruby", "rails", "jest", "typescript", "react", "aws", "docker"]):
+        row["期間"] = "情報なし"
+        match = re.compile(r'【作業期間】\s*・?([^【]+)').search(data)
+        if match:
+            row["期間"] = match.group(1).strip()
+    if not any(word in row["給与"].lower() for word in ["万", "円", "千", "k", "万円"]):
+        match = re.compile(r'【単金】\s*・?([^【]+)').search(data)
+        if match:
+            row["給与"] = match.group(1).strip()
+    if any(word in row["開発環境"].lower() for word in ["万円", "万", "円", "85万", "単金"]):
+        row["開発環境"] = "情報なし"
+        match = re.compile(r'【環境】\s*[^開]*開発環境\s*([^【]+)').search(data)
+        if match:
+            row["開発環境"] = match.group(1).strip().split('\n')[0].strip()
+    tags = [tag.strip() for tag in row["タグ"].split(",") if tag.strip()]
+    if len(tags) < 3:
+        potential_tags = set()
+        for key, value in row.items():
+            if isinstance(value, str) and key not in ["タグ", "名前"]:
+                for tech in LEGACY_TECHS:
+                    if tech.lower() in value.lower():
+                        potential_tags.add(tech)
+        row["タグ"] = ", ".join(list(set(tags) | potential_tags | {"システム開発", "エンジニア", "IT"})[:5])
+    if row["勤務地"] == "情報なし":
+        match = re.compile(r'【作業場所】\s*・?([^【]+)').search(data)
+        if match:
+            row["勤務地"] = match.group(1).strip()
+    if row["ポジション"] == "情報なし":
+        match = re.compile(r'【募集】\s*・?([^【]+)').search(data)
+        if match:
+            row["ポジション"] = match.group(1).strip()
+
+
+def legacy_direct_extract_data(row, content):
+    for field, pattern in LEGACY_PATTERNS.items():
+        if row[field] == "情報なし" or not row[field]:
+            match = re.search(pattern, content, re.DOTALL)
+            if match:
+                row[field] = re.sub(r'\s+', ' ', match.group(1).strip())
+    if row["開発環境"] == "情報なし" or "万" in row["開発環境"]:
+        env_match = re.search(r'【環境】\s*.*?開発環境\s*(.*?)(?=\s*[【]|$)', content, re.DOTALL)
+        if env_match:
+            tech_stack = []
+            for line in env_match.group(1).strip().split('\n')[:3]:
+                tech_stack.extend(re.findall(r'([A-Za-z0-9.]+(?:\s*[A-Za-z0-9.]+)*)', line))
+            if tech_stack:
+                row["開発環境"] = ", ".join(tech_stack)
+
+
+def ai_like_row():
+    """AIの出力を模した行データ（一部の項目が欠落・混同している）"""
+    row = {field: "情報なし" for field in FIELDS}
+    row.update({"名前": "社内システム開発支援", "タグ": "Ruby", "期間": "Ruby on Rails", "給与": "スキル見合い", "開発環境": "85万"})
+    return row
+
+
+def legacy_extract(content):
+    row = ai_like_row()
+    legacy_validate_and_fix_data(row, content)
+    legacy_direct_extract_data(row, content)
+    return row
+
+
+def current_extract(content):
+    """現在の実装で検証・再抽出する（セクション分割は1回のみ）"""
+    parse_sections.cache_clear()
+    row = ai_like_row()
+    app.validate_and_fix_data(row, content)
+    app.direct_extract_data(row, content)
+    return row
+
+
+def parser_extract(content):
+    """セクションパーサーのみで20項目を抽出する"""
+    parse_sections.cache_clear()
+    return extract_fields(content)
+
+
+def build_posting(size):
+    """サンプルの求人情報を size 文字以上になるまで長文化する"""
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        sample = f.read()
+    filler = "・既存システムの改修、保守運用、テスト、ドキュメント作成を担当いただきます。\n"
+    overview, rest = sample.split("【作業場所】", 1)
+    body = overview
+    while len(body) + len(rest) < size:
+        body += filler
+    return body + "【作業場所】" + rest
+
+
+def build_digest(size):
+    """「開発環境」や <マスト> の表記がない求人を連結したメール（バックトラックが起きやすい入力）"""
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        sample = f.read()
+    sample = sample.replace("開発環境：", "").replace("<マスト>", "")
+    digest = ""
+    while len(digest) < size:
+        digest += sample + "\n"
+    return digest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="抽出処理のマイクロベンチマーク")
+    parser.add_argument("--size", type=int, default=12000, help="求人情報の文字数")
+    parser.add_argument("--repeat", type=int, default=100, help="1回の計測での繰り返し回数")
+    args = parser.parse_args(argv)
+
+    cases = (("長文の求人", build_posting(args.size)), ("複数求人のメール", build_digest(args.size)))
+    for label, content in cases:
+        print(f"{label}: {len(content)}文字 / {len(content.encode('utf-8'))}バイト")
+        for name, func in (("legacy", legacy_extract), ("current", current_extract), ("parser", parser_extract)):
+            timings = timeit.repeat(lambda: func(content), number=args.repeat, repeat=5)
+            best = min(timings) / args.repeat
+            print(f"  {name:8s} {best * 1000:8.3f} ms/件")
+
+
+if __name__ == "__main__":
+    main()
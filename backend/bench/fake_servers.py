@@ -0,0 +1,309 @@
+"""ベンチマーク用の OpenAI / Notion API のローカルスタブ
+
+実際のAPIを呼び出さずに処理全体の性能を測るための HTTP サーバー。
+応答の遅延（平均とゆらぎ）と 429 を返す割合を指定できる。
+並行処理の検証用に、OpenAI の応答の一部の項目をわざと誤らせたり（corrupt）、
+Notion に登録されたページの内容を記録したり（record）することもできる。
+
+- OpenAI: POST /v1/chat/completions
+  Function Calling / Structured Outputs / CSV のいずれの形式にも、
+  セクションパーサーで求人情報から作った応答を返す。
+- Notion: POST /v1/pages, PATCH /v1/pages/<id>, POST /v1/databases/<id>/query,
+  GET /v1/databases/<id>
+
+単体でも起動できる（backend ディレクトリで実行）:
+    python bench/fake_servers.py --openai-port 8801 --notion-port 8802 --openai-latency 0.8 --notion-429-rate 0.1
+アプリ側では OPENAI_BASE_URL=http://127.0.0.1:8801/v1 と NOTION_API_URL=http://127.0.0.1:8802/v1 を設定する。
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from section_parser import FIELDS, NO_INFO, extract_fields  # noqa: E402
+
+USER_PREFIX = "求人情報:\n"
+
+
+class StubConfig:
+    """スタブの応答の設定（起動後も変更できる）"""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit_ratio=0.0, retry_after=1, corrupt=False, record=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.corrupt = corrupt
+        self.record = record
+        self.requests = 0
+        self.rate_limited = 0
+        self.bodies = []
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """設定された遅延だけ待ち、429 を返すかどうかを返す"""
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        limited = random.random() < self.rate_limit_ratio
+        with self._lock:
+            self.requests += 1
+            if limited:
+                self.rate_limited += 1
+        return limited
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "rate_limited": self.rate_limited}
+
+    def add_body(self, body):
+        """受け取ったリクエストボディを記録する（record=True の場合）"""
+        if self.record:
+            with self._lock:
+                self.bodies.append(body)
+
+    def save_page(self, page, properties):
+        """登録・更新されたページを保存する（record=True の場合、データベースの検索結果として返す）"""
+        if not self.record:
+            return
+        properties = {name: {"type": next(iter(value)), **value} for name, value in properties.items()}
+        with self._lock:
+            stored = self.pages.setdefault(page["id"], {**page, "properties": {}})
+            stored["properties"].update(properties)
+            stored["last_edited_time"] = page["last_edited_time"]
+
+    def query(self, body):
+        """保存したページを最終更新日時の昇順で検索する（last_edited_time の条件とページ送りに対応）"""
+        conditions = body.get("filter", {})
+        conditions = conditions.get("and", [conditions]) if conditions else []
+        with self._lock:
+            pages = sorted(self.pages.values(), key=lambda page: page["last_edited_time"])
+        for condition in conditions:
+            bound = condition.get("last_edited_time", {})
+            if "on_or_after" in bound:
+                pages = [page for page in pages if page["last_edited_time"] >= bound["on_or_after"]]
+            if "before" in bound:
+                pages = [page for page in pages if page["last_edited_time"] < bound["before"]]
+        start = int(body.get("start_cursor") or 0)
+        end = start + int(body.get("page_size", 100))
+        has_more = end < len(pages)
+        return {"object": "list", "results": pages[start:end], "has_more": has_more,
+                "next_cursor": str(end) if has_more else None}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def rate_limited(self):
+        """遅延の後、設定された割合で 429 を返す（返した場合は True）"""
+        if not self.config.wait():
+            return False
+        self.send_json(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}},
+                       {"Retry-After": str(self.config.retry_after)})
+        return True
+
+
+def completion_row(messages, corrupt=False):
+    """ユーザーメッセージの求人情報からセクションパーサーで行データを作る
+
+    corrupt=True の場合は、アプリ側で入力データから再抽出される項目（期間・勤務地・ポジション）を誤らせる。
+    """
+    content = next((message["content"] for message in reversed(messages) if message.get("role") == "user"), "")
+    if content.startswith(USER_PREFIX):
+        content = content[len(USER_PREFIX):]
+    row, _ = extract_fields(content)
+    if corrupt:
+        row.update({"期間": "Ruby, AWS", "勤務地": NO_INFO, "ポジション": NO_INFO})
+    return row
+
+
+class FakeOpenAIHandler(StubHandler):
+    """OpenAI Chat Completions API のスタブ"""
+
+    def do_POST(self):
+        body = self.read_json()
+        if self.rate_limited():
+            return
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        messages = body.get("messages", [])
+        row = completion_row(messages, self.config.corrupt)
+        message = {"role": "assistant", "content": None}
+        if body.get("tools"):
+            arguments = dict(row, タグ=[tag.strip() for tag in row["タグ"].split(",") if tag.strip()])
+            name = body["tools"][0]["function"]["name"]
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)},
+            }]
+            output = message["tool_calls"][0]["function"]["arguments"]
+            finish_reason = "tool_calls"
+        elif body.get("response_format", {}).get("type") == "json_schema":
+            output = message["content"] = json.dumps(row, ensure_ascii=False)
+            finish_reason = "stop"
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow([row[field] for field in FIELDS])
+            output = message["content"] = buffer.getvalue().strip()
+            finish_reason = "stop"
+
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages)
+        completion_tokens = len(output)
+        self.send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+def database_schema(database_id):
+    """求人データベースのスキーマ（20項目）"""
+    properties = {}
+    for field in FIELDS:
+        if field == "名前":
+            properties[field] = {"id": "title", "name": field, "type": "title", "title": {}}
+        elif field == "タグ":
+            options = [{"name": name} for name in ("Python", "Java", "AWS", "Ruby on Rails", "React")]
+            properties[field] = {"id": "tags", "name": field, "type": "multi_select", "multi_select": {"options": options}}
+        else:
+            properties[field] = {"id": field, "name": field, "type": "rich_text", "rich_text": {}}
+    return {"object": "database", "id": database_id, "properties": properties}
+
+
+def property_errors(properties):
+    """データベースにないプロパティや型が一致しないプロパティのエラーメッセージ（Notion の 400 と同じ条件）"""
+    schema = database_schema("")["properties"]
+    errors = []
+    for name, value in properties.items():
+        if name not in schema:
+            errors.append(f"{name} is not a property that exists.")
+        elif schema[name]["type"] not in value:
+            errors.append(f"{name} is expected to be {schema[name]['type']}.")
+    return errors
+
+
+class FakeNotionHandler(StubHandler):
+    """Notion API のスタブ（record=True の場合は登録されたページとリクエストボディを保存する）"""
+
+    def page(self, page_id=None, properties=None):
+        page_id = page_id or str(uuid.uuid4())
+        now = time.time()
+        page = {"object": "page", "id": page_id, "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+                "last_edited_time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now)) + f".{int(now % 1 * 1000):03d}Z"}
+        self.config.save_page(page, properties or {})
+        return page
+
+    def do_GET(self):
+        if self.rate_limited():
+            return
+        parts = self.path.strip("/").split("/")
+        if len(parts) >= 3 and parts[-2] == "databases":
+            self.send_json(200, database_schema(parts[-1]))
+        else:
+            self.send_json(404, {"object": "error", "status": 404, "message": "Not found"})
+
+    def validation_failed(self, body):
+        """プロパティがスキーマと一致しない場合は 400 を返す（返した場合は True）"""
+        errors = property_errors(body.get("properties", {}))
+        if errors:
+            self.send_json(400, {"object": "error", "status": 400, "code": "validation_error",
+                                 "message": " ".join(errors)})
+        return bool(errors)
+
+    def do_POST(self):
+        body = self.read_json()
+        if self.rate_limited():
+            return
+        if self.path.rstrip("/").endswith("/pages"):
+            self.config.add_body(body)
+            if self.validation_failed(body):
+                return
+        if self.path.endswith("/query"):
+            self.send_json(200, self.config.query(body))
+        elif self.path.rstrip("/").endswith("/pages"):
+            self.send_json(200, self.page(properties=body.get("properties")))
+        else:
+            self.send_json(404, {"object": "error", "status": 404, "message": "Not found"})
+
+    def do_PATCH(self):
+        body = self.read_json()
+        if self.rate_limited() or self.validation_failed(body):
+            return
+        self.send_json(200, self.page(self.path.rstrip("/").split("/")[-1], body.get("properties")))
+
+
+def start_server(handler, config, port=0, host="127.0.0.1"):
+    """スタブをバックグラウンドのスレッドで起動し、サーバーを返す（port=0 の場合は空いているポート）"""
+    handler_class = type(handler.__name__, (handler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=handler.__name__, daemon=True).start()
+    return server
+
+
+def server_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI / Notion API のスタブを起動します")
+    parser.add_argument("--openai-port", type=int, default=8801)
+    parser.add_argument("--notion-port", type=int, default=8802)
+    parser.add_argument("--openai-latency", type=float, default=1.0, help="OpenAI の応答遅延（秒）")
+    parser.add_argument("--notion-latency", type=float, default=0.3, help="Notion の応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="応答遅延のゆらぎ（秒）")
+    parser.add_argument("--openai-429-rate", type=float, default=0.0, help="OpenAI が 429 を返す割合")
+    parser.add_argument("--notion-429-rate", type=float, default=0.0, help="Notion が 429 を返す割合")
+    args = parser.parse_args(argv)
+
+    openai_server = start_server(FakeOpenAIHandler, StubConfig(args.openai_latency, args.jitter, args.openai_429_rate),
+                                 args.openai_port)
+    notion_server = start_server(FakeNotionHandler, StubConfig(args.notion_latency, args.jitter, args.notion_429_rate),
+                                 args.notion_port)
+    print(f"OPENAI_BASE_URL={server_url(openai_server)}")
+    print(f"NOTION_API_URL={server_url(notion_server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""求人コーパスを /process_job に再生する負荷ベンチマーク
+
+OpenAI と Notion をローカルのスタブ（fake_servers.py）に置き換え、
+記録済みの求人情報（corpus.jsonl）を指定した同時実行数で /process_job に送信して、
+レイテンシのパーセンタイル（p50/p95/p99）、スループット、エラー率と
+ステージごとの所要時間、抽出の段階（EXTRACTION_TIERS）ごとの合格率を表示する。APIの利用料金は発生せず、Notionにも書き込まない。
+
+使い方（backend ディレクトリで実行）:
+    python bench/replay_benchmark.py
+    python bench/replay_benchmark.py --requests 200 --concurrency 8 --openai-latency 1.5 --notion-429-rate 0.1
+    python bench/replay_benchmark.py --always-ai --output result.json
+    python bench/replay_benchmark.py --tiers parser,gpt-4o-mini,gpt-4o
+    python bench/replay_benchmark.py --baseline result.json   # p95 が悪化した場合は終了コード 1
+
+既定ではアプリをこのプロセス内のスレッド型サーバーで起動する。
+gunicorn などで起動済みのアプリを測る場合は、fake_servers.py でスタブを起動して
+アプリの OPENAI_BASE_URL / NOTION_API_URL をスタブに向けたうえで --url を指定する。
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_servers import FakeNotionHandler, FakeOpenAIHandler, StubConfig, server_url, start_server  # noqa: E402
+
+CORPUS_PATH = os.path.join(BENCH_DIR, "corpus.jsonl")
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, p):
+    """最近傍順位法によるパーセンタイル"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(values):
+    return {f"p{p}": round(percentile(values, p) * 1000, 1) if values else None for p in (50, 95, 99)}
+
+
+def start_app(args, openai_url, notion_url):
+    """アプリをスタブに向けた設定で読み込み、スレッド型のサーバーで起動して URL を返す"""
+    workdir = tempfile.mkdtemp(prefix="replay-benchmark-")
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": openai_url,
+        "NOTION_API_URL": notion_url,
+        "NOTION_TOKEN": "benchmark",
+        "NOTION_DATABASE_ID": "benchmark-database",
+        "NOTION_RATE_LIMIT": str(args.notion_rate),
+        "DUPLICATE_MODE": "create",
+        "EXTRACTION_CACHE_ENABLED": "true" if args.cache else "false",
+        "EXTRACTION_CACHE_PATH": os.path.join(workdir, "extraction_cache.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "job_queue.sqlite3"),
+        "NOTION_OUTBOX_PATH": os.path.join(workdir, "notion_outbox.sqlite3"),
+        "DUPLICATE_INDEX_PATH": os.path.join(workdir, "duplicate_index.sqlite3"),
+        "JOB_MIRROR_PATH": os.path.join(workdir, "job_mirror.sqlite3"),
+    })
+    if args.always_ai:
+        os.environ["SECTION_PARSER_THRESHOLD"] = "2"
+    if args.extraction_mode:
+        os.environ["EXTRACTION_MODE"] = args.extraction_mode
+    if args.tiers:
+        os.environ["EXTRACTION_TIERS"] = args.tiers
+
+    from werkzeug.serving import make_server
+
+    import app
+
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.ERROR)
+    logging.getLogger("werkzeug").setLevel(logging.INFO if args.verbose else logging.ERROR)
+    server = make_server("127.0.0.1", 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def replay(url, corpus, total, concurrency):
+    """コーパスを先頭から繰り返し送信し、リクエストごとの結果を返す"""
+    local = threading.local()
+
+    def send(index):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        posting = corpus[index % len(corpus)]
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{url}/process_job", params={"timings": "1"},
+                                    json={"content": posting["content"]}, timeout=300)
+            status = response.status_code
+            body = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+        except requests.RequestException as e:
+            status = type(e).__name__
+            body = {}
+        return {"name": posting.get("name"), "status": status, "seconds": time.perf_counter() - started,
+                "timings": body.get("timings") or {}, "routing": body.get("routing") or []}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(send, range(total)))
+    return results, time.perf_counter() - started
+
+
+def build_report(results, elapsed, concurrency):
+    latencies = [result["seconds"] for result in results]
+    errors = [result for result in results if result["status"] not in (200, 202)]
+    stages = {}
+    tiers = {}
+    for result in results:
+        for stage, seconds in result["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+        for attempt in result["routing"]:
+            tier = tiers.setdefault(attempt["tier"], {"attempts": 0, "accepted": 0, "seconds": []})
+            tier["attempts"] += 1
+            tier["accepted"] += 1 if attempt["accepted"] else 0
+            if "seconds" in attempt:
+                tier["seconds"].append(attempt["seconds"])
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(results) / elapsed, 3) if elapsed > 0 else None,
+        "error_rate": round(len(errors) / len(results), 4) if results else None,
+        "status_counts": {str(status): count for status, count in Counter(r["status"] for r in results).items()},
+        "latency_ms": {**summarize(latencies), "max": round(max(latencies) * 1000, 1) if latencies else None},
+        "stages_ms": {stage: summarize(values) for stage, values in sorted(stages.items())},
+        "tiers": {name: {"attempts": tier["attempts"], "hit_rate": round(tier["accepted"] / tier["attempts"], 3),
+                         "latency_ms": summarize(tier["seconds"])}
+                  for name, tier in tiers.items()},
+    }
+
+
+def print_report(report):
+    print(f"リクエスト数: {report['requests']}  同時実行数: {report['concurrency']}  "
+          f"所要時間: {report['elapsed_seconds']}秒  スループット: {report['throughput_per_second']}件/秒")
+    latency = report["latency_ms"]
+    print(f"レイテンシ(ms): p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+    print(f"エラー率: {report['error_rate'] * 100:.1f}%  ステータス: {report['status_counts']}")
+    if report["stages_ms"]:
+        print(f"{'ステージ':20s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+        for stage, values in report["stages_ms"].items():
+            print(f"{stage:20s} {values['p50']:9.1f} {values['p95']:9.1f} {values['p99']:9.1f}")
+    for name, tier in report["tiers"].items():
+        print(f"段階 {name}: {tier['attempts']}回 合格率 {tier['hit_rate'] * 100:.1f}%  "
+              f"p50={tier['latency_ms']['p50']}ms p95={tier['latency_ms']['p95']}ms")
+    for name, stats in report.get("stubs", {}).items():
+        print(f"{name}スタブ: {stats['requests']}リクエスト（うち429: {stats['rate_limited']}）")
+
+
+def compare(report, baseline, max_regression):
+    """基準の結果と比べて p95 レイテンシとスループットが悪化していないかを確認する"""
+    failures = []
+    p95, base_p95 = report["latency_ms"]["p95"], baseline["latency_ms"]["p95"]
+    if base_p95 and p95 > base_p95 * (1 + max_regression):
+        failures.append(f"p95 latency {base_p95}ms -> {p95}ms")
+    throughput, base_throughput = report["throughput_per_second"], baseline["throughput_per_second"]
+    if base_throughput and throughput < base_throughput * (1 - max_regression):
+        failures.append(f"throughput {base_throughput}/s -> {throughput}/s")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="求人コーパスを /process_job に再生する負荷ベンチマーク")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="求人コーパス（JSONL）")
+    parser.add_argument("--requests", type=int, default=50, help="送信するリクエスト数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時実行数")
+    parser.add_argument("--url", help="起動済みのアプリのURL（省略時はこのプロセス内で起動）")
+    parser.add_argument("--openai-latency", type=float, default=1.0, help="OpenAIスタブの応答遅延（秒）")
+    parser.add_argument("--notion-latency", type=float, default=0.3, help="Notionスタブの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="応答遅延のゆらぎ（秒）")
+    parser.add_argument("--openai-429-rate", type=float, default=0.0, help="OpenAIスタブが429を返す割合")
+    parser.add_argument("--notion-429-rate", type=float, default=0.0, help="Notionスタブが429を返す割合")
+    parser.add_argument("--notion-rate", type=float, default=3.0, help="アプリ側のNotionのレート制限（リクエスト/秒）")
+    parser.add_argument("--always-ai", action="store_true", help="セクションパーサーを使わずに常にAIで抽出する")
+    parser.add_argument("--extraction-mode", choices=["tools", "json_schema", "csv"], help="AIによる抽出方式")
+    parser.add_argument("--tiers", help="抽出の段階（EXTRACTION_TIERS、例: parser,gpt-4o-mini,gpt-4o）")
+    parser.add_argument("--cache", action="store_true", help="AI変換結果キャッシュを有効にする")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル")
+    parser.add_argument("--baseline", help="比較する基準の結果（--output で保存したJSON）")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="許容する悪化の割合")
+    parser.add_argument("--verbose", action="store_true", help="アプリのログを表示する")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    stubs = {}
+    url = args.url
+    if url is None:
+        openai_config = StubConfig(args.openai_latency, args.jitter, args.openai_429_rate)
+        notion_config = StubConfig(args.notion_latency, args.jitter, args.notion_429_rate)
+        openai_server = start_server(FakeOpenAIHandler, openai_config)
+        notion_server = start_server(FakeNotionHandler, notion_config)
+        url = start_app(args, server_url(openai_server), server_url(notion_server))
+        stubs = {"OpenAI": openai_config, "Notion": notion_config}
+
+    results, elapsed = replay(url.rstrip("/"), corpus, args.requests, args.concurrency)
+    report = build_report(results, elapsed, args.concurrency)
+    report["stubs"] = {name: config.stats() for name, config in stubs.items()}
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(report, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"悪化: {failure}")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
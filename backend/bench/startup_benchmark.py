@@ -0,0 +1,161 @@
+"""起動時間（import）と最初のリクエストのレイテンシ、ログ出力の量を測るベンチマーク
+
+dyno やワーカーの新規起動を想定し、アプリを新しい Python プロセスで読み込むたびに
+以下を測定する。OpenAI と Notion はローカルのスタブ（fake_servers.py）に置き換える。
+
+- import: `import app` にかかった時間
+- first_ping: 最初のリクエスト（/ping）のレイテンシ（バックグラウンドのワーカーの起動を含む）
+- first_job: AIで抽出する最初の /process_job のレイテンシ（OpenAI クライアントの作成を含む）
+- job_p50: 2件目以降の /process_job のレイテンシの中央値
+- log_bytes: /process_job 1件あたりのログ出力のバイト数
+
+LOG_LEVEL（既定は INFO と DEBUG）ごとに --runs 回ずつプロセスを起動し、中央値を表示する。
+--preload を指定すると、gunicorn の post_worker_init（gunicorn.conf.py）と同じく
+import の直後にバックグラウンドで OpenAI クライアントを作成してから測定する。
+
+使い方（backend ディレクトリで実行）:
+    python bench/startup_benchmark.py
+    python bench/startup_benchmark.py --runs 5 --requests 20 --log-levels INFO
+    python bench/startup_benchmark.py --preload
+    python bench/startup_benchmark.py --max-import-seconds 1.0 --max-log-bytes 2000   # 超えた場合は終了コード 1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_servers import FakeNotionHandler, FakeOpenAIHandler, StubConfig, server_url, start_server  # noqa: E402
+
+POSTING_PATH = os.path.join(BENCH_DIR, "sample_posting.txt")
+METRICS = ("import", "first_ping", "first_job", "job_p50", "log_bytes")
+
+
+def measure(requests_count, preload=False):
+    """（子プロセス）アプリを読み込んで測定し、結果をJSONで標準出力に書き出す"""
+    started = time.perf_counter()
+    import app
+    imported = time.perf_counter() - started
+    openai_loaded = "openai" in sys.modules
+    if preload:
+        app.preload_openai_client()
+
+    with open(POSTING_PATH, encoding="utf-8") as f:
+        posting = f.read()
+    client = app.app.test_client()
+
+    def timed(method, path, **kwargs):
+        started = time.perf_counter()
+        response = getattr(client, method)(path, **kwargs)
+        if response.status_code != 200:
+            raise SystemExit(f"{path}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}")
+        return time.perf_counter() - started
+
+    first_ping = timed("get", "/ping")
+    log_start = sys.stderr.tell()
+    jobs = [timed("post", "/process_job", json={"content": posting}) for _ in range(requests_count + 1)]
+    log_bytes = (sys.stderr.tell() - log_start) / len(jobs)
+    print(json.dumps({
+        "import": imported,
+        "first_ping": first_ping,
+        "first_job": jobs[0],
+        "job_p50": statistics.median(jobs[1:]) if len(jobs) > 1 else jobs[0],
+        "log_bytes": log_bytes,
+        "openai_loaded_at_import": openai_loaded,
+    }))
+
+
+def run_child(log_level, requests_count, openai_url, notion_url, preload=False):
+    """新しいプロセスでアプリを起動して測定結果を返す（ログは一時ファイルに書き出して量を測る）"""
+    workdir = tempfile.mkdtemp(prefix="startup-benchmark-")
+    env = dict(os.environ)
+    env.update({
+        "LOG_LEVEL": log_level,
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": openai_url,
+        "NOTION_API_URL": notion_url,
+        "NOTION_TOKEN": "benchmark",
+        "NOTION_DATABASE_ID": "benchmark-database",
+        "NOTION_RATE_LIMIT": "1000",
+        "DUPLICATE_MODE": "create",
+        "SECTION_PARSER_THRESHOLD": "2",
+        "EXTRACTION_CACHE_ENABLED": "false",
+        "JOB_QUEUE_PATH": os.path.join(workdir, "job_queue.sqlite3"),
+        "NOTION_OUTBOX_PATH": os.path.join(workdir, "notion_outbox.sqlite3"),
+        "DUPLICATE_INDEX_PATH": os.path.join(workdir, "duplicate_index.sqlite3"),
+        "JOB_MIRROR_PATH": os.path.join(workdir, "job_mirror.sqlite3"),
+    })
+    with open(os.path.join(workdir, "app.log"), "w+", encoding="utf-8") as log:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--requests", str(requests_count)]
+            + (["--preload"] if preload else []),
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, stderr=log, text=True,
+        )
+        if completed.returncode != 0:
+            log.seek(0)
+            raise RuntimeError(f"LOG_LEVEL={log_level}: {completed.stdout.strip()}\n{log.read()[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="起動時間と最初のリクエストのレイテンシを測ります")
+    parser.add_argument("--runs", type=int, default=3, help="ログレベルごとにアプリを起動する回数")
+    parser.add_argument("--requests", type=int, default=10, help="1回の起動で送信する /process_job の件数（最初の1件を除く）")
+    parser.add_argument("--log-levels", default="INFO,DEBUG", help="測定する LOG_LEVEL（カンマ区切り）")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="OpenAIスタブの応答遅延（秒）")
+    parser.add_argument("--notion-latency", type=float, default=0.0, help="Notionスタブの応答遅延（秒）")
+    parser.add_argument("--preload", action="store_true", help="import の直後にバックグラウンドで OpenAI クライアントを作成する")
+    parser.add_argument("--max-import-seconds", type=float, help="import の中央値の上限（秒）")
+    parser.add_argument("--max-first-job-seconds", type=float, help="最初の /process_job の中央値の上限（秒）")
+    parser.add_argument("--max-log-bytes", type=float, help="INFO での /process_job 1件あたりのログ出力の上限（バイト）")
+    parser.add_argument("--output", help="結果を書き出すJSONファイル")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        measure(args.requests, args.preload)
+        return 0
+
+    openai_server = start_server(FakeOpenAIHandler, StubConfig(args.openai_latency))
+    notion_server = start_server(FakeNotionHandler, StubConfig(args.notion_latency))
+    report = {}
+    for level in [level.strip().upper() for level in args.log_levels.split(",") if level.strip()]:
+        runs = [run_child(level, args.requests, server_url(openai_server), server_url(notion_server), args.preload)
+                for _ in range(args.runs)]
+        report[level] = {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+        report[level]["openai_loaded_at_import"] = any(run["openai_loaded_at_import"] for run in runs)
+
+    print(f"{'LOG_LEVEL':<10}{'import':>10}{'first_ping':>12}{'first_job':>12}{'job_p50':>10}{'log_bytes':>11}")
+    for level, result in report.items():
+        print(f"{level:<10}{result['import'] * 1000:>8.0f}ms{result['first_ping'] * 1000:>10.0f}ms"
+              f"{result['first_job'] * 1000:>10.0f}ms{result['job_p50'] * 1000:>8.1f}ms{result['log_bytes']:>11.0f}")
+        if result["openai_loaded_at_import"]:
+            print(f"  注意: {level} では import 時に openai パッケージが読み込まれています")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    for level, result in report.items():
+        if args.max_import_seconds is not None and result["import"] > args.max_import_seconds:
+            failures.append(f"{level}: import {result['import']:.3f}s > {args.max_import_seconds}s")
+        if args.max_first_job_seconds is not None and result["first_job"] > args.max_first_job_seconds:
+            failures.append(f"{level}: first_job {result['first_job']:.3f}s > {args.max_first_job_seconds}s")
+    info = report.get("INFO")
+    if args.max_log_bytes is not None and info and info["log_bytes"] > args.max_log_bytes:
+        failures.append(f"INFO: log_bytes {info['log_bytes']:.0f} > {args.max_log_bytes}")
+    for failure in failures:
+        print(f"超過: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
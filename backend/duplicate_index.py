@@ -0,0 +1,391 @@
+"""登録済み求人の重複検出インデックス
+
+Notionデータベースの既存ページをローカルに保持し、再投稿や一部だけ編集された
+求人を登録前に検出する。インデックスは次の2段階で照合する。
+- 正規化した 名前 / 案件タイトル / 給与 の完全一致
+- 仕事内容の文字 n-gram から作る MinHash 署名の LSH による候補抽出と、
+  推定 Jaccard 係数・タイトルのあいまい一致（RapidFuzz）による判定
+
+ページ情報はSQLiteに保存し、最初に使うときにメモリへ読み込んで照合する。
+Notionとの同期は last_edited_time を使って差分のみ取得する。
+同じファイルを使う他のプロセス（gunicorn のワーカー）が追加・削除したページは、
+変更履歴のテーブルから照合の前に読み込む。
+"""
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+import zlib
+
+from rapidfuzz import fuzz, process
+
+from notion_api import page_to_row, query_database
+from sqlite_store import SQLiteStore
+
+# MinHash の設定（ビン数 = BANDS × ROWS_PER_BAND）
+SHINGLE_SIZE = 3
+BANDS = 16
+ROWS_PER_BAND = 4
+NUM_BINS = BANDS * ROWS_PER_BAND
+EMPTY_BIN = 0xFFFFFFFF
+# 空のビンを埋めるときの距離あたりのオフセット（crc32 // NUM_BINS の最大値より大きい値）
+DENSIFY_OFFSET = 1 << 26
+MAX_BODY_CHARS = 2000
+
+# 重複とみなすしきい値
+JACCARD_THRESHOLD = 0.8
+JACCARD_WITH_TITLE_THRESHOLD = 0.5
+TITLE_SIMILARITY_THRESHOLD = 85
+
+# 他のプロセスに変更を伝える変更履歴の保存期間（秒）。これより長く照合しなかったプロセスは全件を読み込み直す
+CHANGE_LOG_RETENTION = 24 * 3600
+
+NORMALIZE_PATTERN = re.compile(r'[\W_]+')
+NO_INFO = "情報なし"
+
+
+def normalize_text(value):
+    """照合用に文字列を正規化する（全角/半角・大文字/小文字・記号と空白の違いを無視）"""
+    if not value or value == NO_INFO:
+        return ""
+    return NORMALIZE_PATTERN.sub("", unicodedata.normalize("NFKC", value).lower())
+
+
+def exact_key(row):
+    """名前・案件タイトル・給与から完全一致用のキーを作る（名前がない場合は None）"""
+    name = normalize_text(row.get("名前"))
+    if not name:
+        return None
+    return "|".join((name, normalize_text(row.get("案件タイトル")), normalize_text(row.get("給与"))))
+
+
+def minhash_signature(text):
+    """文字 n-gram の MinHash 署名を作る（1回のハッシュで全ビンを埋める One Permutation Hashing）"""
+    text = normalize_text(text)[:MAX_BODY_CHARS]
+    if len(text) < SHINGLE_SIZE:
+        return None
+    signature = [EMPTY_BIN] * NUM_BINS
+    encoded = text.encode("utf-8")
+    # 文字単位の n-gram を UTF-8 のバイト位置で切り出す
+    offsets = [i for i, byte in enumerate(encoded) if byte & 0xC0 != 0x80] + [len(encoded)]
+    for i in range(len(offsets) - SHINGLE_SIZE):
+        h = zlib.crc32(encoded[offsets[i]:offsets[i + SHINGLE_SIZE]])
+        index = h % NUM_BINS
+        value = h // NUM_BINS
+        if value < signature[index]:
+            signature[index] = value
+    return densify(signature)
+
+
+def densify(signature):
+    """空のビンを右隣の空でないビンの値で埋める（Rotation Densification）
+
+    短い文章では空のビンが多くなり、空のビンどうしが一致して無関係な求人が
+    LSH の候補に大量に混ざるため、ビンの距離に応じたオフセットを加えて埋める。
+    """
+    if all(value == EMPTY_BIN for value in signature):
+        return None
+    densified = list(signature)
+    for i, value in enumerate(signature):
+        if value == EMPTY_BIN:
+            distance = 1
+            while signature[(i + distance) % NUM_BINS] == EMPTY_BIN:
+                distance += 1
+            densified[i] = signature[(i + distance) % NUM_BINS] + distance * DENSIFY_OFFSET
+    return densified
+
+
+def estimate_jaccard(a, b):
+    """2つの MinHash 署名から Jaccard 係数を推定する"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_BINS
+
+
+def band_keys(signature):
+    """LSH のバンドごとのキー"""
+    return [(band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])) for band in range(BANDS)]
+
+
+class DuplicateIndex(SQLiteStore):
+    """既存ページの重複検出インデックス（照合はメモリ上で行う）"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._syncer = None
+        self._pages = {}
+        self._exact = {}
+        self._bands = {}
+        self._titles = {}
+        # 読み込み済みの変更履歴の位置と、最後に確認したデータベースのバージョン（PRAGMA data_version）
+        self._seq = 0
+        self._data_version = None
+
+    def load(self):
+        """保存済みのページをメモリに読み込む（読み込み済みの場合は何もしない）
+
+        ページ数に比例して時間がかかるため、import 時ではなく最初の照合時、
+        またはバックグラウンドの同期スレッドの開始時に読み込む。
+        メモリ上のインデックスを使う処理は、ロックを取得する前にこのメソッドを呼ぶ。
+        """
+        self._conn
+
+    def _create_schema(self, conn):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS duplicate_index (
+                page_id TEXT PRIMARY KEY,
+                name TEXT,
+                title TEXT,
+                salary TEXT,
+                url TEXT,
+                signature TEXT,
+                last_edited_time TEXT
+            )
+            """
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS duplicate_index_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS duplicate_index_changes "
+            "(seq INTEGER PRIMARY KEY AUTOINCREMENT, page_id TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def _open(self):
+        conn = super()._open()
+        with self._lock:
+            self._reload(conn)
+        logging.info("Loaded %d pages into duplicate index", len(self._pages))
+        return conn
+
+    def _reload(self, conn):
+        """保存済みのページをすべてメモリに読み込み直す"""
+        self._pages, self._exact, self._bands, self._titles = {}, {}, {}, {}
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM duplicate_index_changes").fetchone()[0]
+        found = conn.execute(
+            "SELECT page_id, name, title, salary, url, signature, last_edited_time FROM duplicate_index"
+        ).fetchall()
+        for page_id, name, title, salary, url, signature, last_edited_time in found:
+            self._add_to_memory(page_id, {"名前": name, "案件タイトル": title, "給与": salary}, url,
+                                json.loads(signature) if signature else None, last_edited_time)
+
+    def _refresh(self):
+        """他のプロセスが追加・削除したページをメモリに反映する（ファイルが変更されていない場合は何もしない）"""
+        conn = self._conn
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        oldest = conn.execute("SELECT MIN(seq) FROM duplicate_index_changes").fetchone()[0]
+        if oldest is not None and oldest > self._seq + 1:
+            # 読み込む前に変更履歴が削除されていた場合は全件を読み込み直す
+            self._reload(conn)
+            logging.info("Reloaded %d pages into duplicate index", len(self._pages))
+            return
+        self._data_version = version
+        changes = conn.execute(
+            "SELECT seq, page_id FROM duplicate_index_changes WHERE seq > ? ORDER BY seq", (self._seq,)
+        ).fetchall()
+        for page_id in dict.fromkeys(page_id for _, page_id in changes):
+            found = conn.execute(
+                "SELECT name, title, salary, url, signature, last_edited_time FROM duplicate_index WHERE page_id = ?",
+                (page_id,),
+            ).fetchone()
+            if found is None:
+                self._remove_from_memory(page_id)
+                continue
+            name, title, salary, url, signature, last_edited_time = found
+            self._add_to_memory(page_id, {"名前": name, "案件タイトル": title, "給与": salary}, url,
+                                json.loads(signature) if signature else None, last_edited_time)
+        if changes:
+            self._seq = changes[-1][0]
+            logging.debug("Applied %d duplicate index changes from other processes", len(changes))
+
+    def _log_change(self, page_id):
+        self._conn.execute("INSERT INTO duplicate_index_changes (page_id, created_at) VALUES (?, ?)",
+                           (page_id, time.time()))
+
+    def _add_to_memory(self, page_id, row, url, signature, last_edited_time):
+        self._remove_from_memory(page_id)
+        key = exact_key(row)
+        entry = {"page_id": page_id, "name": row.get("名前"), "url": url, "key": key,
+                 "signature": signature, "last_edited_time": last_edited_time}
+        self._pages[page_id] = entry
+        if key:
+            self._exact.setdefault(key, set()).add(page_id)
+        if signature:
+            for band in band_keys(signature):
+                self._bands.setdefault(band, set()).add(page_id)
+        title = normalize_text(row.get("名前"))
+        if title:
+            self._titles[page_id] = title
+
+    def _remove_from_memory(self, page_id):
+        entry = self._pages.pop(page_id, None)
+        if entry is None:
+            return
+        if entry["key"]:
+            self._exact.get(entry["key"], set()).discard(page_id)
+        if entry["signature"]:
+            for band in band_keys(entry["signature"]):
+                self._bands.get(band, set()).discard(page_id)
+        self._titles.pop(page_id, None)
+
+    def add(self, page_id, row, url=None, last_edited_time=None):
+        """ページを追加または更新する"""
+        self.load()
+        signature = minhash_signature(row.get("仕事内容", ""))
+        with self._lock:
+            self._add_to_memory(page_id, row, url, signature, last_edited_time)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO duplicate_index (page_id, name, title, salary, url, signature, last_edited_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (page_id, row.get("名前"), row.get("案件タイトル"), row.get("給与"), url,
+                 json.dumps(signature) if signature else None, last_edited_time),
+            )
+            self._log_change(page_id)
+            self._conn.commit()
+
+    def remove(self, page_id):
+        """ページを削除する"""
+        self.load()
+        with self._lock:
+            self._remove_from_memory(page_id)
+            self._conn.execute("DELETE FROM duplicate_index WHERE page_id = ?", (page_id,))
+            self._log_change(page_id)
+            self._conn.commit()
+
+    def find(self, row, limit=5):
+        """重複の可能性があるページを類似度の高い順に返す"""
+        self.load()
+        signature = minhash_signature(row.get("仕事内容", ""))
+        key = exact_key(row)
+        title = normalize_text(row.get("名前"))
+        matches = {}
+        with self._lock:
+            self._refresh()
+            # 1. 名前・案件タイトル・給与の完全一致
+            if key:
+                for page_id in self._exact.get(key, ()):
+                    matches[page_id] = {"score": 1.0, "reason": "exact"}
+
+            # 2. 仕事内容の MinHash が近いページ（LSH で候補を絞ってから判定）
+            if signature:
+                candidates = set()
+                for band in band_keys(signature):
+                    candidates.update(self._bands.get(band, ()))
+                for page_id in candidates - matches.keys():
+                    jaccard = estimate_jaccard(signature, self._pages[page_id]["signature"])
+                    if jaccard >= JACCARD_THRESHOLD:
+                        matches[page_id] = {"score": round(jaccard, 3), "reason": "content"}
+                    elif jaccard >= JACCARD_WITH_TITLE_THRESHOLD and title:
+                        similarity = fuzz.ratio(title, self._titles.get(page_id, ""))
+                        if similarity >= TITLE_SIMILARITY_THRESHOLD:
+                            matches[page_id] = {"score": round(jaccard, 3), "reason": "content+title"}
+
+            # 3. 仕事内容がない場合はタイトルのあいまい一致
+            elif title and self._titles:
+                for _, similarity, page_id in process.extract(
+                    title, self._titles, scorer=fuzz.ratio, score_cutoff=95, limit=limit
+                ):
+                    matches.setdefault(page_id, {"score": round(similarity / 100, 3), "reason": "title"})
+
+            results = [
+                {"page_id": page_id, "name": self._pages[page_id]["name"], "url": self._pages[page_id]["url"],
+                 "last_edited_time": self._pages[page_id]["last_edited_time"], **match}
+                for page_id, match in matches.items()
+            ]
+        results.sort(key=lambda match: match["score"], reverse=True)
+        return results[:limit]
+
+    def _get_meta(self, key):
+        found = self._conn.execute("SELECT value FROM duplicate_index_meta WHERE key = ?", (key,)).fetchone()
+        return found[0] if found else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO duplicate_index_meta (key, value) VALUES (?, ?)", (key, value))
+        self._conn.commit()
+
+    def sync(self, client, database_id, schema=None, full=False):
+        """Notionデータベースと同期する（前回以降に更新されたページのみ取得）
+
+        schema: ページを行データに変換するデータベースのスキーマ（DatabaseSchema）。
+        タイトルプロパティの名前が「名前」以外のデータベースでも、登録時と同じ対応で項目を取り出す。
+        データベースの検索結果にはアーカイブ・削除されたページが含まれないため、
+        全件を取得する場合（full）は、取得できなかったページをインデックスから削除する。
+        """
+        self.load()
+        with self._sync_lock:
+            started = time.perf_counter()
+            with self._lock:
+                since = None if full else self._get_meta("last_edited_time")
+                # 同期中にアプリから追加されたページを削除しないよう、開始時点のページのみを対象にする
+                existing = set(self._pages) if since is None else set()
+            latest = since
+            updated = 0
+            removed = 0
+            seen = set()
+            to_row = schema.row_from_page if schema is not None else page_to_row
+            for page in query_database(client, database_id, edited_since=since):
+                seen.add(page["id"])
+                if page.get("archived") or page.get("in_trash"):
+                    self.remove(page["id"])
+                    removed += 1
+                else:
+                    self.add(page["id"], to_row(page), page.get("url"), page.get("last_edited_time"))
+                    updated += 1
+                if page.get("last_edited_time") and (latest is None or page["last_edited_time"] > latest):
+                    latest = page["last_edited_time"]
+            for page_id in existing - seen:
+                self.remove(page_id)
+                removed += 1
+            with self._lock:
+                if since is None:
+                    self._set_meta("last_full_sync", str(time.time()))
+                # 最新の変更は残し、削除された変更を読み込んでいないプロセスが全件を読み込み直せるようにする
+                self._conn.execute(
+                    "DELETE FROM duplicate_index_changes WHERE created_at < ? "
+                    "AND seq < (SELECT MAX(seq) FROM duplicate_index_changes)",
+                    (time.time() - CHANGE_LOG_RETENTION,),
+                )
+                self._conn.commit()
+                if latest:
+                    self._set_meta("last_edited_time", latest)
+            elapsed = time.perf_counter() - started
+            logging.info("Synced duplicate index: %d updated, %d removed in %.1fs", updated, removed, elapsed)
+            return {"updated": updated, "removed": removed, "last_edited_time": latest,
+                    "elapsed_seconds": round(elapsed, 3), **self.stats()}
+
+    def start_syncer(self, client, database_id, schema=None, interval=300, full_interval=86400):
+        """一定間隔でNotionと同期するスレッドを起動する（起動済みの場合は何もしない）
+
+        full_interval 秒ごとに全件を取得し、Notionで削除されたページをインデックスから取り除く。
+        """
+        with self._lock:
+            if self._syncer is not None:
+                return
+            self._syncer = threading.Thread(
+                target=self._sync_loop, args=(client, database_id, schema, interval, full_interval), name="duplicate-index",
+                daemon=True
+            )
+        self._syncer.start()
+
+    def _sync_loop(self, client, database_id, schema, interval, full_interval):
+        try:
+            self.load()
+        except Exception:
+            logging.exception("Failed to load duplicate index")
+        while True:
+            try:
+                with self._lock:
+                    last_full_sync = float(self._get_meta("last_full_sync") or 0)
+                self.sync(client, database_id, schema, full=time.time() - last_full_sync >= full_interval)
+            except Exception:
+                logging.exception("Failed to sync duplicate index")
+            time.sleep(interval)
+
+    def stats(self):
+        self.load()
+        with self._lock:
+            return {"pages": len(self._pages), "last_synced_edit": self._get_meta("last_edited_time")}
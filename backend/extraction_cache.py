@@ -0,0 +1,135 @@
+"""AI変換結果の永続キャッシュ
+
+同じ求人情報が何度も貼り付けられても OpenAI を再度呼び出さないよう、
+正規化した求人テキストのハッシュとプロンプト/モデルのバージョンをキーに、
+変換済みの行データを SQLite に保存する。件数上限と有効期限で古いエントリを削除する。
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+from sqlite_store import SQLiteStore
+
+
+def normalize_posting(content):
+    """キャッシュキー用に求人テキストを正規化する（全角/半角・空白の揺れを吸収）"""
+    text = unicodedata.normalize("NFKC", content)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(content, version):
+    """正規化した求人テキストとバージョン文字列からキャッシュキーを作成する"""
+    digest = hashlib.sha256()
+    digest.update(version.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_posting(content).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ExtractionCache(SQLiteStore):
+    """SQLiteを使ったAI変換結果のキャッシュ"""
+
+    def __init__(self, path, max_entries=10000, ttl_seconds=30 * 24 * 3600):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _create_schema(self, conn):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                row TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS extraction_cache_accessed ON extraction_cache (accessed_at)"
+        )
+
+    def get(self, key):
+        """キャッシュされた行データを返す（存在しないか期限切れの場合は None）"""
+        now = time.time()
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT row, created_at FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if found is None or now - found[1] > self.ttl_seconds:
+                if found is not None:
+                    self._conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE extraction_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(found[0])
+
+    def put(self, key, row):
+        """行データをキャッシュに保存し、必要に応じて古いエントリを削除する"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, row, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(row, ensure_ascii=False), now, now),
+            )
+            self.stores += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """期限切れのエントリと、件数上限を超えた最終アクセスの古いエントリを削除する"""
+        expired = self._conn.execute(
+            "DELETE FROM extraction_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._count() - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM extraction_cache WHERE key IN "
+                "(SELECT key FROM extraction_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+        else:
+            overflow = 0
+        if expired or overflow:
+            logging.debug("Evicted %d expired and %d overflow cache entries", expired, overflow)
+        self.evictions += expired + overflow
+
+    def _count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+
+    def clear(self):
+        """すべてのエントリを削除する"""
+        with self._lock:
+            self._conn.execute("DELETE FROM extraction_cache")
+            self._conn.commit()
+
+    def stats(self):
+        """ヒット/ミスのカウンタとエントリ数を返す"""
+        with self._lock:
+            entries = self._count()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
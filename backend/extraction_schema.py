@@ -0,0 +1,114 @@
+"""AIによる構造化抽出のスキーマとローカルでの検証
+
+OpenAI の Function Calling / Structured Outputs に渡す Notion の20項目の
+JSON Schema と、返された JSON を行データに変換する軽量な検証処理。
+CSV と違い値にカンマや改行が含まれても列がずれないため、列ずれを前提とした
+修復処理や CSV の解析失敗による再送信が不要になる。
+"""
+import json
+
+from section_parser import FIELDS, NO_INFO
+
+FUNCTION_NAME = "register_job_posting"
+
+# 各項目の説明（Function Calling ではスキーマの description としてモデルに渡す）
+FIELD_DESCRIPTIONS = {
+    "名前": "【業務名】の内容",
+    "タグ": "業種・業界や技術キーワード",
+    "仕事内容": "【作業概要】の内容",
+    "勤務地": "【作業場所】の場所情報",
+    "勤務時間": "【稼働】や勤務時間の情報",
+    "必須スキル": "【スキル】の<マスト>の内容",
+    "案件タイトル": "【業務名】の内容",
+    "案件内容": "【作業概要】の内容",
+    "歓迎スキル": "【スキル】の<Better>の内容",
+    "給与": "【単金】の内容（精算幅を含む）",
+    "開発環境": "【環境】の「開発環境」の技術スタックのみ",
+    "雇用形態": "契約形態（業務委託など）",
+    "業種業界": "業種・業界",
+    "ポジション": "【募集】の内容",
+    "プロダクト": "開発対象のプロダクト",
+    "期間": "【作業期間】の内容",
+    "稼働率": "【単金】の精算幅（例: 140-180/月）",
+    "働き方": "リモート可否などの働き方",
+    "期待する人物像": "【備考】の期待する人物像",
+    "その他": "その他の重要情報",
+}
+
+# タグは配列で受け取り、Notion の multi_select 用にカンマ区切りの文字列へ変換する
+ARRAY_FIELDS = {"タグ"}
+
+JOB_ROW_SCHEMA = {
+    "type": "object",
+    "properties": {
+        field: (
+            {"type": "array", "items": {"type": "string"}, "description": FIELD_DESCRIPTIONS[field]}
+            if field in ARRAY_FIELDS
+            else {"type": "string", "description": FIELD_DESCRIPTIONS[field]}
+        )
+        for field in FIELDS
+    },
+    "required": list(FIELDS),
+    "additionalProperties": False,
+}
+
+
+class SchemaValidationError(ValueError):
+    """AIの出力がスキーマに一致しない"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def function_tool(strict=False):
+    """Function Calling 用のツール定義"""
+    function = {
+        "name": FUNCTION_NAME,
+        "description": "求人情報から抽出したNotionデータベースの20項目を登録する",
+        "parameters": JOB_ROW_SCHEMA,
+    }
+    if strict:
+        function["strict"] = True
+    return {"type": "function", "function": function}
+
+
+def response_format():
+    """Structured Outputs（response_format）用のスキーマ定義"""
+    return {"type": "json_schema", "json_schema": {"name": "job_posting", "strict": True, "schema": JOB_ROW_SCHEMA}}
+
+
+def parse_row(arguments):
+    """AIが返した JSON 文字列（または辞書）を検証し、行データ（項目名 → 文字列）に変換する
+
+    欠けている項目や空の値は「情報なし」で補い、型が合わない値がある場合は
+    SchemaValidationError を送出する。スキーマにない項目は無視する。
+    """
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments)
+        except ValueError as e:
+            raise SchemaValidationError([f"invalid JSON: {e}"])
+    if not isinstance(arguments, dict):
+        raise SchemaValidationError([f"expected object, got {type(arguments).__name__}"])
+
+    row = {}
+    errors = []
+    for field in FIELDS:
+        value = arguments.get(field)
+        if value is None:
+            row[field] = NO_INFO
+        elif field in ARRAY_FIELDS and isinstance(value, list):
+            if not all(isinstance(item, str) for item in value):
+                errors.append(f"{field}: expected array of strings")
+                continue
+            row[field] = ", ".join(item.strip() for item in value if item.strip()) or NO_INFO
+        elif isinstance(value, str):
+            row[field] = value.strip() or NO_INFO
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            row[field] = str(value)
+        else:
+            errors.append(f"{field}: expected string, got {type(value).__name__}")
+    if errors:
+        raise SchemaValidationError(errors)
+    return row
@@ -0,0 +1,33 @@
+"""gunicorn の設定（本番環境の起動方法）
+
+処理時間の大半は OpenAI / Notion の応答待ちのため、スレッド型のワーカー（gthread）で
+1プロセスあたり複数のリクエストを同時に処理する。リクエストごとの状態は
+JobContext（job_context.py）で引き渡し、モジュールのグローバル変数には保存しない。
+読み込みに時間がかかる openai パッケージは app の import 時には読み込まず、
+ワーカーの起動直後にバックグラウンドで読み込む（起動してすぐにリクエストを受け付けられる）。
+
+使い方（backend ディレクトリで実行）:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "gthread"
+# プロセス数（Heroku では dyno のメモリに応じて WEB_CONCURRENCY が設定される）
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# app.py はワーカー数で Notion API のレート制限（NOTION_RATE_LIMIT）を等分するため、既定値の場合も設定しておく
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# 1プロセスあたりの同時処理数
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# OpenAI の応答待ちを含むため、既定（30秒）より長くする
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    """ワーカーの起動後、最初のリクエストを待たずに OpenAI クライアントを作成しておく"""
+    import app
+
+    app.preload_openai_client()
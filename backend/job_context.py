@@ -0,0 +1,43 @@
+"""1件の求人の処理に関する情報（リクエストごとのコンテキスト）
+
+求人テキストや重複時の動作、各ステージの所要時間、プロンプトの記録などを
+モジュールのグローバル変数に置かずにこのオブジェクトにまとめて処理の各段階に引き渡す。
+リクエストやジョブごとに作成するため、スレッド型のワーカーで複数の求人を
+同時に処理しても互いの入力が混ざることはない。
+"""
+import time
+from contextlib import contextmanager
+
+from metrics import STAGE_SECONDS
+
+
+class JobContext:
+    """1件の求人の処理に関する情報"""
+
+    def __init__(self, content=None, on_duplicate=None):
+        self.content = content
+        self.on_duplicate = on_duplicate
+        self.row = None
+        self.confidence = None
+        self.timings = {}
+        self.prompt_report = None
+        self.routing = []
+
+    @property
+    def name(self):
+        return self.row.get("名前") if self.row else None
+
+    @contextmanager
+    def span(self, stage):
+        """処理ステージの所要時間を計測し、メトリクスとこのコンテキストに記録する"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+            self.timings[stage] = self.timings.get(stage, 0) + elapsed
+
+    def timing_report(self):
+        """ステージごとの所要時間（秒）"""
+        return {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
@@ -0,0 +1,404 @@
+"""Notionの求人データベースのローカルミラー（SQLite）と検索
+
+登録済みの求人をNotion APIのページ送りで毎回検索する代わりに、データベース全体を
+ローカルのSQLiteファイルに項目ごとの列として複製し、全文検索とファセット検索を行う。
+
+- 同期は最終更新日時（last_edited_time）が前回以降のページのみを取得する差分同期
+- 取得範囲を最終更新日時で分割して並列にページ送りし、APIの1ページ分（最大100件）ずつまとめて書き込む
+- ページは create_notion_page と同じプロパティの対応（notion_schema.py）で行データに戻して保存する
+- 全文検索は FTS5 の trigram トークナイザー（日本語を分かち書きせずに部分一致で検索）を使用し、
+  FTS5 が使えない環境や2文字以下の語は LIKE で検索する
+- 給与（万円）・期間（開始年月）・勤務地（都道府県とリモート可否）は検索用の列に正規化して保存する
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from notion_api import page_to_row, query_database_batches
+from section_parser import FIELDS, NO_INFO
+from sqlite_store import SQLiteStore
+
+# 全文検索の対象にする項目
+SEARCH_FIELDS = ["名前", "タグ", "仕事内容", "勤務地", "必須スキル", "歓迎スキル", "案件タイトル", "案件内容", "開発環境",
+                 "ポジション", "業種業界"]
+# 検索結果に含める項目
+RESULT_FIELDS = ["名前", "タグ", "勤務地", "給与", "期間", "必須スキル", "開発環境", "働き方"]
+FACET_LIMIT = 20
+# 給与のファセットの区切り（万円）
+SALARY_BUCKETS = (50, 70, 90)
+
+SALARY_MAN_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*万')
+SALARY_YEN_PATTERN = re.compile(r'(\d{1,3}(?:,\d{3})+|\d{5,})\s*円')
+PERIOD_START_PATTERN = re.compile(r'(\d{4})\s*[年/.\-]\s*(\d{1,2})\s*月?')
+IMMEDIATE_PATTERN = re.compile(r'即日|即時|ASAP', re.IGNORECASE)
+PREFECTURE_PATTERN = re.compile(r'(北海道|東京都|京都府|大阪府|(?:神奈川|和歌山|鹿児島|[^\s　、,，・（()）/]{2})県)')
+# 都道府県名が書かれていない場合に使う市区名
+CITY_PREFECTURES = {
+    "東京": "東京都", "千代田区": "東京都", "中央区": "東京都", "港区": "東京都", "新宿区": "東京都", "渋谷区": "東京都",
+    "品川区": "東京都", "大阪": "大阪府", "横浜": "神奈川県", "川崎": "神奈川県", "名古屋": "愛知県", "福岡": "福岡県",
+    "札幌": "北海道", "京都": "京都府", "神戸": "兵庫県", "仙台": "宮城県",
+}
+CITY_PATTERN = re.compile("|".join(sorted(CITY_PREFECTURES, key=len, reverse=True)))
+REMOTE_PATTERN = re.compile(r'リモート|在宅|テレワーク|remote', re.IGNORECASE)
+
+
+def parse_salary(value):
+    """給与の文字列から下限・上限（万円）を取り出す（金額がない場合は (None, None)）"""
+    if not value or value == NO_INFO:
+        return None, None
+    amounts = [float(amount) for amount in SALARY_MAN_PATTERN.findall(value)]
+    amounts += [int(amount.replace(",", "")) / 10000 for amount in SALARY_YEN_PATTERN.findall(value)]
+    if not amounts:
+        return None, None
+    # 「〜90万」のように上限のみの場合は下限なし
+    if len(amounts) == 1 and re.match(r'\s*[〜~～]', value):
+        return None, amounts[0]
+    return min(amounts), max(amounts)
+
+
+def parse_period(value):
+    """期間の文字列から開始年月（YYYY-MM）と即日開始かどうかを取り出す"""
+    if not value or value == NO_INFO:
+        return None, False
+    match = PERIOD_START_PATTERN.search(value)
+    start = f"{int(match.group(1)):04d}-{int(match.group(2)):02d}" if match and 1 <= int(match.group(2)) <= 12 else None
+    return start, bool(IMMEDIATE_PATTERN.search(value))
+
+
+def parse_location(value):
+    """勤務地の文字列から都道府県（分からない場合は None）とリモート可否を取り出す"""
+    if not value or value == NO_INFO:
+        return None, False
+    match = PREFECTURE_PATTERN.search(value)
+    prefecture = match.group(1) if match else None
+    if prefecture is None:
+        city = CITY_PATTERN.search(value)
+        prefecture = CITY_PREFECTURES[city.group(0)] if city else None
+    return prefecture, bool(REMOTE_PATTERN.search(value))
+
+
+def split_tags(value):
+    return sorted({tag.strip() for tag in (value or "").split(",") if tag.strip() and tag.strip() != NO_INFO})
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def split_windows(start, end, count):
+    """[start, end) を count 個の期間に分割する（最後の期間は終わりを指定しない）"""
+    if count <= 1 or end - start < timedelta(minutes=count):
+        return [(start, None)]
+    step = (end - start) / count
+    bounds = [start + step * index for index in range(count)]
+    return [(bound, bounds[index + 1] if index + 1 < count else None) for index, bound in enumerate(bounds)]
+
+
+def to_iso(value):
+    return value.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z") if value else None
+
+
+def parse_iso(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+_COLUMNS = ["page_id", "url", "last_edited_time", *(quote(field) for field in FIELDS),
+            "salary_min", "salary_max", "period_start", "period_immediate", "prefecture", "remote"]
+UPSERT_SQL = (
+    f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)}) "
+    f"ON CONFLICT (page_id) DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in _COLUMNS[1:])}"
+)
+
+
+class JobMirror(SQLiteStore):
+    """Notionの求人データベースのローカルミラー"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._syncer = None
+        self._fts = None
+
+    @property
+    def fts(self):
+        """FTS5 の trigram による全文検索が使えるか"""
+        return self._conn is not None and self._fts
+
+    def _create_schema(self, conn):
+        columns = ", ".join(f"{quote(field)} TEXT" for field in FIELDS)
+        conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS jobs (
+                page_id TEXT PRIMARY KEY,
+                url TEXT,
+                last_edited_time TEXT,
+                {columns},
+                salary_min REAL,
+                salary_max REAL,
+                period_start TEXT,
+                period_immediate INTEGER,
+                prefecture TEXT,
+                remote INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS jobs_salary ON jobs (salary_max, salary_min);
+            CREATE INDEX IF NOT EXISTS jobs_period ON jobs (period_start);
+            CREATE INDEX IF NOT EXISTS jobs_prefecture ON jobs (prefecture);
+            CREATE INDEX IF NOT EXISTS jobs_edited ON jobs (last_edited_time);
+            CREATE TABLE IF NOT EXISTS job_tags (
+                page_id TEXT,
+                tag TEXT COLLATE NOCASE,
+                PRIMARY KEY (page_id, tag)
+            );
+            CREATE INDEX IF NOT EXISTS job_tags_tag ON job_tags (tag);
+            CREATE TABLE IF NOT EXISTS job_mirror_meta (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self._fts = self._create_fts(conn)
+
+    def _create_fts(self, conn):
+        """全文検索用のテーブルを作成する（FTS5 の trigram が使えない場合は False）"""
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts USING fts5(text, tokenize='trigram')")
+            return True
+        except sqlite3.OperationalError:
+            logging.warning("SQLite FTS5 trigram tokenizer is not available, falling back to LIKE search")
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs_fts (text TEXT)")
+            return False
+
+    def _get_meta(self, key):
+        found = self._conn.execute("SELECT value FROM job_mirror_meta WHERE key = ?", (key,)).fetchone()
+        return found[0] if found else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO job_mirror_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _upsert(self, page_id, row, url, last_edited_time):
+        salary_min, salary_max = parse_salary(row.get("給与"))
+        period_start, immediate = parse_period(row.get("期間"))
+        prefecture, remote = parse_location(row.get("勤務地"))
+        values = [row.get(field) or NO_INFO for field in FIELDS]
+        self._conn.execute(
+            UPSERT_SQL,
+            [page_id, url, last_edited_time, *values, salary_min, salary_max, period_start, int(immediate),
+             prefecture, int(remote)],
+        )
+        rowid = self._conn.execute("SELECT rowid FROM jobs WHERE page_id = ?", (page_id,)).fetchone()[0]
+        self._conn.execute("DELETE FROM jobs_fts WHERE rowid = ?", (rowid,))
+        self._conn.execute("INSERT INTO jobs_fts (rowid, text) VALUES (?, ?)",
+                           (rowid, "\n".join(row.get(field) or "" for field in SEARCH_FIELDS)))
+        self._conn.execute("DELETE FROM job_tags WHERE page_id = ?", (page_id,))
+        self._conn.executemany("INSERT OR IGNORE INTO job_tags (page_id, tag) VALUES (?, ?)",
+                               [(page_id, tag) for tag in split_tags(row.get("タグ"))])
+
+    def _delete(self, page_id):
+        found = self._conn.execute("SELECT rowid FROM jobs WHERE page_id = ?", (page_id,)).fetchone()
+        if found is None:
+            return
+        self._conn.execute("DELETE FROM jobs_fts WHERE rowid = ?", (found[0],))
+        self._conn.execute("DELETE FROM jobs WHERE page_id = ?", (page_id,))
+        self._conn.execute("DELETE FROM job_tags WHERE page_id = ?", (page_id,))
+
+    def add(self, page_id, row, url=None, last_edited_time=None):
+        """アプリから登録・更新したページをすぐに検索できるように追加する"""
+        with self._lock:
+            self._upsert(page_id, row, url, last_edited_time)
+            self._conn.commit()
+
+    def write_pages(self, pages, to_row=page_to_row):
+        """Notionのページをまとめて書き込む（アーカイブ済みのページは削除する）"""
+        updated = removed = 0
+        latest = None
+        with self._lock:
+            for page in pages:
+                if page.get("archived") or page.get("in_trash"):
+                    self._delete(page["id"])
+                    removed += 1
+                else:
+                    self._upsert(page["id"], to_row(page), page.get("url"), page.get("last_edited_time"))
+                    updated += 1
+                if page.get("last_edited_time") and (latest is None or page["last_edited_time"] > latest):
+                    latest = page["last_edited_time"]
+            self._conn.commit()
+        return updated, removed, latest
+
+    def sync(self, client, database_id, schema=None, full=False, workers=4, page_size=100):
+        """Notionデータベースと同期する（前回以降に更新されたページのみ取得）
+
+        取得範囲を最終更新日時で workers 個に分割し、それぞれ並列にページ送りする。
+        schema（DatabaseSchema）を指定した場合は、登録時と同じプロパティの対応で行データに戻す。
+        データベースの検索結果にはアーカイブ・削除されたページが含まれないため、
+        全件を取得する場合（full）は、取得できなかったページをミラーから削除する。
+        """
+        with self._sync_lock:
+            started = time.perf_counter()
+            with self._lock:
+                since = None if full else self._get_meta("last_edited_time")
+                full = since is None
+                # 同期中にアプリから追加されたページを削除しないよう、開始時点のページのみを対象にする
+                existing = {page_id for page_id, in self._conn.execute("SELECT page_id FROM jobs")} if full else set()
+            if since is None:
+                # 最も古いページの最終更新日時から分割する
+                first = next(query_database_batches(client, database_id, page_size=1), [])
+                since = first[0]["last_edited_time"] if first else None
+            windows = [(None, None)]
+            if since is not None:
+                windows = split_windows(parse_iso(since), datetime.now(timezone.utc), workers)
+            to_row = schema.row_from_page if schema is not None else page_to_row
+
+            def fetch(window):
+                counts = [0, 0, None, set()]
+                for pages in query_database_batches(client, database_id, to_iso(window[0]), to_iso(window[1]),
+                                                    page_size=page_size):
+                    counts[3].update(page["id"] for page in pages)
+                    updated, removed, latest = self.write_pages(pages, to_row)
+                    counts[0] += updated
+                    counts[1] += removed
+                    if latest and (counts[2] is None or latest > counts[2]):
+                        counts[2] = latest
+                return counts
+
+            with ThreadPoolExecutor(len(windows), thread_name_prefix="job-mirror") as pool:
+                results = list(pool.map(fetch, windows))
+            updated = sum(result[0] for result in results)
+            removed = sum(result[1] for result in results)
+            latest = max((result[2] for result in results if result[2]), default=None)
+            stale = existing.difference(*(result[3] for result in results))
+            with self._lock:
+                for page_id in stale:
+                    self._delete(page_id)
+                removed += len(stale)
+                if full:
+                    self._set_meta("last_full_sync", str(time.time()))
+                if latest:
+                    self._set_meta("last_edited_time", latest)
+                self._conn.commit()
+            elapsed = time.perf_counter() - started
+            logging.info("Synced job mirror: %d updated, %d removed in %.1fs (%d windows)",
+                         updated, removed, elapsed, len(windows))
+            return {"updated": updated, "removed": removed, "windows": len(windows), "last_edited_time": latest,
+                    "elapsed_seconds": round(elapsed, 3), **self.stats()}
+
+    def start_syncer(self, client, database_id, schema=None, interval=600, workers=4, full_interval=86400):
+        """一定間隔でNotionと同期するスレッドを起動する（起動済みの場合は何もしない）
+
+        full_interval 秒ごとに全件を取得し、Notionで削除されたページをミラーから取り除く。
+        """
+        with self._lock:
+            if self._syncer is not None:
+                return
+            self._syncer = threading.Thread(
+                target=self._sync_loop, args=(client, database_id, schema, interval, workers, full_interval),
+                name="job-mirror", daemon=True
+            )
+        self._syncer.start()
+
+    def _sync_loop(self, client, database_id, schema, interval, workers, full_interval):
+        while True:
+            try:
+                with self._lock:
+                    last_full_sync = float(self._get_meta("last_full_sync") or 0)
+                self.sync(client, database_id, schema, full=time.time() - last_full_sync >= full_interval,
+                          workers=workers)
+            except Exception:
+                logging.exception("Failed to sync job mirror")
+            time.sleep(interval)
+
+    def _filters(self, query=None, tags=(), prefecture=None, remote=None, salary_min=None, salary_max=None,
+                 start_from=None, start_by=None):
+        """検索条件の WHERE 句とパラメーター"""
+        clauses = []
+        params = []
+        for term in (query or "").split():
+            if self.fts and len(term) >= 3:
+                clauses.append("j.rowid IN (SELECT rowid FROM jobs_fts WHERE jobs_fts MATCH ?)")
+                params.append(fts_phrase(term))
+            else:
+                clauses.append("j.rowid IN (SELECT rowid FROM jobs_fts WHERE text LIKE ? ESCAPE '\\')")
+                params.append("%" + re.sub(r'([\\%_])', r'\\\1', term) + "%")
+        for tag in tags:
+            clauses.append("j.page_id IN (SELECT page_id FROM job_tags WHERE tag = ?)")
+            params.append(tag)
+        if prefecture:
+            clauses.append("j.prefecture = ?")
+            params.append(prefecture)
+        if remote is not None:
+            clauses.append("j.remote = ?")
+            params.append(int(remote))
+        if salary_min is not None:
+            clauses.append("j.salary_max >= ?")
+            params.append(salary_min)
+        if salary_max is not None:
+            clauses.append("COALESCE(j.salary_min, j.salary_max) <= ?")
+            params.append(salary_max)
+        if start_from:
+            clauses.append("j.period_start >= ?")
+            params.append(start_from)
+        if start_by:
+            clauses.append("(j.period_immediate = 1 OR j.period_start <= ?)")
+            params.append(start_by)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, limit=20, offset=0, facets=True, **filters):
+        """全文検索とファセットによる絞り込み
+
+        filters: query（空白区切りの語をすべて含む）、tags（すべてを含む）、prefecture、remote、
+        salary_min / salary_max（万円）、start_from / start_by（YYYY-MM、start_by は即日開始を含む）
+        """
+        where, params = self._filters(**filters)
+        columns = ", ".join(f"j.{quote(field)}" for field in RESULT_FIELDS)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM jobs j{where}", params).fetchone()[0]
+            found = self._conn.execute(
+                f"SELECT j.page_id, j.url, j.last_edited_time, {columns} FROM jobs j{where} "
+                "ORDER BY j.last_edited_time DESC LIMIT ? OFFSET ?", [*params, limit, offset]
+            ).fetchall()
+            result = {
+                "total": total,
+                "results": [
+                    {"page_id": page_id, "url": url, "last_edited_time": edited, **dict(zip(RESULT_FIELDS, values))}
+                    for page_id, url, edited, *values in found
+                ],
+            }
+            if facets:
+                result["facets"] = self._facets(where, params)
+        return result
+
+    def _facets(self, where, params):
+        def counts(sql, extra_params=()):
+            return [{"value": value, "count": count}
+                    for value, count in self._conn.execute(sql, [*params, *extra_params]).fetchall()]
+
+        low, middle, high = SALARY_BUCKETS
+        salary_bucket = (
+            "CASE WHEN j.salary_max IS NULL THEN '不明' "
+            f"WHEN j.salary_max < {low} THEN '〜{low}万' WHEN j.salary_max < {middle} THEN '{low}〜{middle}万' "
+            f"WHEN j.salary_max < {high} THEN '{middle}〜{high}万' ELSE '{high}万〜' END"
+        )
+        period_bucket = "CASE WHEN j.period_immediate = 1 THEN '即日' ELSE COALESCE(j.period_start, '不明') END"
+        return {
+            "タグ": counts(f"SELECT t.tag, COUNT(*) FROM job_tags t JOIN jobs j ON j.page_id = t.page_id{where} "
+                         "GROUP BY t.tag ORDER BY COUNT(*) DESC, t.tag LIMIT ?", (FACET_LIMIT,)),
+            "給与": counts(f"SELECT {salary_bucket} AS bucket, COUNT(*) FROM jobs j{where} "
+                         "GROUP BY bucket ORDER BY MIN(COALESCE(j.salary_max, 1e9))"),
+            "勤務地": counts(f"SELECT COALESCE(j.prefecture, '不明'), COUNT(*) FROM jobs j{where} "
+                          "GROUP BY j.prefecture ORDER BY COUNT(*) DESC LIMIT ?", (FACET_LIMIT,)),
+            "リモート": counts(f"SELECT CASE WHEN j.remote = 1 THEN '可' ELSE '不可・不明' END AS bucket, COUNT(*) "
+                           f"FROM jobs j{where} GROUP BY bucket"),
+            "期間": counts(f"SELECT {period_bucket} AS bucket, COUNT(*) FROM jobs j{where} "
+                         "GROUP BY bucket ORDER BY bucket LIMIT ?", (FACET_LIMIT,)),
+        }
+
+    def stats(self):
+        with self._lock:
+            pages = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            return {"pages": pages, "full_text": "fts5" if self.fts else "like",
+                    "last_synced_edit": self._get_meta("last_edited_time")}
@@ -0,0 +1,227 @@
+"""SQLiteを使ったローカルのジョブキュー
+
+外部のメッセージブローカーを使わずに、求人情報の処理をバックグラウンドの
+ワーカースレッドで実行する。キューはSQLiteファイルに保存されるため、
+同じファイルを参照する複数のgunicornワーカープロセス間でも共有できる。
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """SQLiteに保存されるジョブキューとワーカースレッド
+
+    handler: (content, progress, **options) を受け取り、結果の辞書を返す関数。
+             progress(stage) を呼ぶと進捗がジョブに記録される。
+             options は登録時に指定した処理のオプション（on_duplicate など）。
+    """
+
+    def __init__(self, path, handler, workers=2, poll_interval=0.5,
+                 stale_after=600, retention_seconds=7 * 24 * 3600):
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.retention_seconds = retention_seconds
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._last_purge = 0.0
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _initialize(self):
+        """キューのテーブルを作成する（import 時間を増やさないよう、最初に使うときに1回だけ行う）"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress TEXT NOT NULL,
+                content TEXT NOT NULL,
+                options TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        # options 列のない既存のキューファイルには列を追加する
+        columns = {column["name"] for column in conn.execute("PRAGMA table_info(jobs)")}
+        if "options" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN options TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._initialize()
+                    self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def start(self):
+        """ワーカースレッドを起動する（起動済みの場合は何もしない）"""
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            self._requeue_stale()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logging.info("Started %d job queue workers", self.workers)
+
+    def submit(self, content, options=None):
+        """ジョブを登録し、ジョブIDを返す（options は handler に渡す処理のオプション）"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, status, progress, content, options, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, content, json.dumps(options, ensure_ascii=False) if options else None,
+                 now, now),
+            )
+        finally:
+            conn.close()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """ジョブの状態を返す（存在しない場合は None）"""
+        conn = self._connect()
+        try:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            status = {
+                "job_id": job["id"],
+                "status": job["status"],
+                "progress": job["progress"],
+                "created_at": job["created_at"],
+                "started_at": job["started_at"],
+                "finished_at": job["finished_at"],
+            }
+            if job["status"] == QUEUED:
+                status["queue_position"] = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at <= ?",
+                    (QUEUED, job["created_at"]),
+                ).fetchone()[0]
+            if job["result"] is not None:
+                status["result"] = json.loads(job["result"])
+            if job["error"] is not None:
+                status["error"] = job["error"]
+            return status
+        finally:
+            conn.close()
+
+    def _claim(self, conn):
+        """待機中のジョブを1件取り出して実行中にする"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            job = conn.execute(
+                "SELECT id, content, options FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if job is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, progress = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, "started", now, now, job["id"]),
+            )
+            conn.execute("COMMIT")
+            return job["id"], job["content"], json.loads(job["options"]) if job["options"] else {}
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _update(self, conn, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _requeue_stale(self):
+        """異常終了したプロセスに残された実行中ジョブを待機中に戻す"""
+        conn = self._connect()
+        try:
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, progress = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, QUEUED, RUNNING, time.time() - self.stale_after),
+            ).rowcount
+            if requeued:
+                logging.warning("Requeued %d stale jobs", requeued)
+        finally:
+            conn.close()
+
+    def _purge(self, conn):
+        """保持期間を過ぎた完了済みジョブを削除する"""
+        now = time.time()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (SUCCEEDED, FAILED, now - self.retention_seconds),
+        )
+
+    def _worker(self):
+        conn = self._connect()
+        while True:
+            try:
+                claimed = self._claim(conn)
+            except sqlite3.Error:
+                logging.exception("Failed to claim a job")
+                claimed = None
+            if claimed is None:
+                try:
+                    self._purge(conn)
+                except sqlite3.Error:
+                    logging.exception("Failed to purge finished jobs")
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            job_id, content, options = claimed
+            logging.info("Processing job %s", job_id)
+
+            def progress(stage, job_id=job_id):
+                self._update(conn, job_id, progress=stage)
+
+            try:
+                result = self.handler(content, progress, **options)
+                self._update(conn, job_id, status=SUCCEEDED, progress="done",
+                             result=json.dumps(result, ensure_ascii=False), finished_at=time.time())
+            except Exception as e:
+                logging.exception("Job %s failed", job_id)
+                # 状態を記録できなくてもワーカーは止めない（ジョブは実行中のまま残り、次にワーカーを起動したときに待機中に戻される）
+                try:
+                    self._update(conn, job_id, status=FAILED, progress="failed",
+                                 error=str(e), finished_at=time.time())
+                except sqlite3.Error:
+                    logging.exception("Failed to record failure of job %s", job_id)
@@ -0,0 +1,150 @@
+"""処理時間などの計測値の集計と Prometheus 形式での出力
+
+外部ライブラリを使わずに、カウンターとヒストグラムをプロセス内で集計する。
+各処理ステージの所要時間は JobContext.span()（job_context.py）でヒストグラムに記録する。
+値はプロセスごとに集計されるため、gunicornの複数ワーカーでは各ワーカーの値を合算して扱う。
+"""
+import threading
+
+# ヒストグラムのバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# OpenAI のトークン数のバケット
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 1500, 2000, 4000, 8000, 16000)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    ) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+class Counter:
+    """ラベルごとに加算するカウンター"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """ラベルごとに値の分布を集計するヒストグラム"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0))
+            if counts is None:
+                counts = [0] * len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(float(bound))),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(round(float(total), 6))}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """メトリクスの一覧（Prometheus のテキスト形式で出力する）"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "job_stage_duration_seconds", "Time spent in each stage of processing a job posting.", ("stage",))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("endpoint", "status"))
+OPENAI_TOKENS = REGISTRY.histogram(
+    "openai_tokens", "Tokens used per OpenAI API call.", ("model", "type"), TOKEN_BUCKETS)
+OPENAI_TOKENS_TOTAL = REGISTRY.counter(
+    "openai_tokens_total", "Total tokens used by OpenAI API calls.", ("model", "type"))
+OPENAI_PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    "openai_prompt_tokens_saved_total", "Prompt tokens saved by prompt compaction and trimming.", ("model",))
+EXTRACTION_TIER_ATTEMPTS = REGISTRY.counter(
+    "extraction_tier_attempts_total", "Extraction attempts per routing tier, by outcome.", ("tier", "outcome"))
+EXTRACTION_TIER_SECONDS = REGISTRY.histogram(
+    "extraction_tier_duration_seconds", "Time spent extracting a posting in each routing tier.", ("tier",))
+NOTION_RESPONSES = REGISTRY.counter(
+    "notion_responses_total", "Notion API responses by method and status code.", ("method", "status"))
+NOTION_RETRIES = REGISTRY.counter(
+    "notion_retries_total", "Notion API requests retried, by reason.", ("reason",))
+
+def record_openai_usage(model, usage):
+    """OpenAI のレスポンスの usage からトークン数を記録する"""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        value = getattr(usage, kind, None)
+        if value is None:
+            continue
+        label = kind[:-len("_tokens")]
+        OPENAI_TOKENS.observe(value, model=model, type=label)
+        OPENAI_TOKENS_TOTAL.inc(value, model=model, type=label)
@@ -0,0 +1,48 @@
+"""Notionの求人データベースをローカルミラー（SQLite）に同期するCLI
+
+使い方:
+    python mirror_sync.py                 # 前回以降に更新されたページのみ同期
+    python mirror_sync.py --full --workers 8
+    python mirror_sync.py --search "Python" --tag AWS --salary-min 70
+
+同期したデータはアプリの /search エンドポイントからも検索できる。
+"""
+import argparse
+import json
+import logging
+import sys
+
+from app import (
+    DATABASE_ID,
+    JOB_MIRROR_SYNC_WORKERS,
+    job_mirror,
+    notion_client,
+    notion_schema,
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Notionの求人データベースをローカルミラーに同期します")
+    parser.add_argument("--full", action="store_true", help="差分ではなくすべてのページを取得し直す")
+    parser.add_argument("--workers", type=int, default=JOB_MIRROR_SYNC_WORKERS, help="並列に取得する期間の数")
+    parser.add_argument("--no-sync", action="store_true", help="同期せずに検索のみ行う")
+    parser.add_argument("--search", help="同期後に検索する語（空白区切りですべてを含む）")
+    parser.add_argument("--tag", action="append", default=[], help="タグで絞り込む（複数指定可）")
+    parser.add_argument("--salary-min", type=float, help="給与の下限（万円）")
+    parser.add_argument("--limit", type=int, default=20, help="検索結果の件数")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO)
+    if not args.no_sync:
+        result = job_mirror.sync(notion_client, DATABASE_ID, notion_schema, full=args.full, workers=args.workers)
+        print(f"更新: {result['updated']}件 削除: {result['removed']}件 合計: {result['pages']}件 "
+              f"所要時間: {result['elapsed_seconds']}秒（{result['windows']}並列）")
+
+    if args.search or args.tag or args.salary_min is not None:
+        found = job_mirror.search(query=args.search, tags=args.tag, salary_min=args.salary_min, limit=args.limit)
+        print(json.dumps(found, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""Notion API クライアント
+
+Notion への書き込みを次の仕組みで安定させる。
+- キープアライブ接続を再利用する requests.Session
+- Notion のレート制限（平均3リクエスト/秒）に合わせたトークンバケット
+- 429 / 5xx 応答に対する Retry-After を考慮した指数バックオフ付きの再試行
+  （ページの作成など冪等でない POST は、Notion に届いていないことが確かな 429 / 503 / 接続エラーのみ）
+- 登録に失敗した変換済みデータを保存して後から再送するローカルの送信待ちキュー（SQLite）
+"""
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from metrics import NOTION_RESPONSES, NOTION_RETRIES
+from sqlite_store import SQLiteStore
+
+NOTION_API_URL = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+
+# 再試行の対象とするステータスコード
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# 冪等でないリクエストを再試行するステータスコード（Notion が処理していないことが確かなもの）
+SAFE_RETRY_STATUS_CODES = {429, 503}
+
+
+class NotionUnavailableError(Exception):
+    """Notion が一時的に利用できない（再試行しても 429 / 5xx / 通信エラーが続いた）"""
+
+
+def property_text(prop):
+    """Notionのプロパティ値を文字列に変換する（multi_select はカンマ区切り）"""
+    if not prop:
+        return ""
+    kind = prop.get("type")
+    if kind in ("title", "rich_text"):
+        return "".join(part.get("plain_text") or part.get("text", {}).get("content", "") for part in prop.get(kind, []))
+    if kind == "multi_select":
+        return ",".join(option["name"] for option in prop.get("multi_select", []))
+    if kind == "select":
+        return (prop.get("select") or {}).get("name", "")
+    if kind == "number":
+        value = prop.get("number")
+        return "" if value is None else str(value)
+    return ""
+
+
+def page_to_row(page):
+    """Notionのページを行データ（プロパティ名 → 文字列）に変換する"""
+    return {name: property_text(prop) for name, prop in page.get("properties", {}).items()}
+
+
+def query_database_batches(client, database_id, edited_since=None, edited_before=None, page_size=100):
+    """データベースのページを最終更新日時の昇順で、APIの1ページ分（最大100件）ずつ返す
+
+    edited_since（ISO 8601）を指定するとその日時以降、edited_before を指定するとその日時より前に
+    更新されたページのみを返す。
+    """
+    body = {
+        "page_size": page_size,
+        "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+    }
+    conditions = []
+    if edited_since:
+        conditions.append({"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": edited_since}})
+    if edited_before:
+        conditions.append({"timestamp": "last_edited_time", "last_edited_time": {"before": edited_before}})
+    if len(conditions) == 1:
+        body["filter"] = conditions[0]
+    elif conditions:
+        body["filter"] = {"and": conditions}
+    while True:
+        response = client.post(f"databases/{database_id}/query", json=body, idempotent=True)
+        if response.status_code in RETRY_STATUS_CODES:
+            raise NotionUnavailableError(f"Notion API returned {response.status_code}")
+        if response.status_code != 200:
+            raise RuntimeError(f"Notion API returned {response.status_code}: {response.text}")
+        result = response.json()
+        yield result.get("results", [])
+        if not result.get("has_more"):
+            return
+        body["start_cursor"] = result["next_cursor"]
+
+
+def query_database(client, database_id, edited_since=None, page_size=100):
+    """データベースのページを最終更新日時の昇順で1件ずつ返す
+
+    edited_since（ISO 8601）を指定すると、その日時以降に更新されたページのみを返す。
+    """
+    for batch in query_database_batches(client, database_id, edited_since, page_size=page_size):
+        yield from batch
+
+
+def is_connect_error(error):
+    """接続の確立に失敗した通信エラーか（リクエストが Notion に届いていない）"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    reason = getattr(error.args[0], "reason", error.args[0])
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class TokenBucket:
+    """トークンバケットによるリクエスト間隔の制御（スレッドセーフ）"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        # 1秒あたり1リクエスト未満の場合も1リクエストは送信できるようにする
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得する（足りない場合は補充されるまで待つ）"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class NotionClient:
+    """セッションの再利用・流量制御・再試行を行う Notion API クライアント"""
+
+    def __init__(self, token, base_url=NOTION_API_URL, rate=3.0, max_retries=5,
+                 backoff_base=0.5, backoff_max=30.0, timeout=30, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate)
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION,
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, path, idempotent=None, **kwargs):
+        """APIリクエストを送信する（429 / 5xx / 通信エラーの場合は再試行する）
+
+        idempotent: 再送しても結果が変わらないリクエストか（省略時は POST 以外）。
+        ページの作成など冪等でないリクエストは、タイムアウトや 500 / 502 / 504 の場合に
+        Notion 側で処理済みの可能性があるため、429 / 503 / 接続エラーの場合のみ再試行する。
+        再試行しても成功しなかった場合は最後のレスポンスを返し、
+        通信エラーが続いた場合は最後の例外を送出する。
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method != "POST"
+        retry_status_codes = RETRY_STATUS_CODES if idempotent else SAFE_RETRY_STATUS_CODES
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason = "timeout" if isinstance(e, requests.Timeout) else "connection_error"
+                NOTION_RESPONSES.inc(method=method, status=reason)
+                if attempt >= self.max_retries or not (idempotent or is_connect_error(e)):
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning("Notion request failed (%s), retrying in %.1fs", e, delay)
+            else:
+                NOTION_RESPONSES.inc(method=method, status=response.status_code)
+                if response.status_code not in retry_status_codes or attempt >= self.max_retries:
+                    return response
+                reason = str(response.status_code)
+                delay = self._retry_after(response) or self._backoff(attempt)
+                logging.warning("Notion API returned %d, retrying in %.1fs", response.status_code, delay)
+            NOTION_RETRIES.inc(reason=reason)
+            attempt += 1
+            time.sleep(delay)
+
+    def _backoff(self, attempt):
+        """指数バックオフ（ジッター付き）の待ち時間"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_after(self, response):
+        """Retry-After ヘッダーの秒数（指定がない場合は None）"""
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return min(self.backoff_max, max(0.0, float(value)))
+        except ValueError:
+            return None
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+
+class NotionOutbox(SQLiteStore):
+    """Notion への登録待ちデータを保存するローカルの送信待ちキュー
+
+    AI変換済みのデータを保存しておくことで、Notion の障害時にも
+    AI変換をやり直さずに後から再送できる。
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._lock = threading.Lock()
+        self._replayer = None
+
+    def _create_schema(self, conn):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notion_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                row TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                claimed_until REAL,
+                options TEXT
+            )
+            """
+        )
+        # options 列のない既存の送信待ちキューには列を追加する
+        columns = {column[1] for column in conn.execute("PRAGMA table_info(notion_outbox)")}
+        if "options" not in columns:
+            conn.execute("ALTER TABLE notion_outbox ADD COLUMN options TEXT")
+
+    def add(self, row, error=None, options=None):
+        """Notion が利用できず登録できなかったデータを保存し、IDを返す
+
+        options: 再送時に send へキーワード引数として渡す値（重複の扱いなど）
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO notion_outbox (row, attempts, last_error, created_at, updated_at, options) "
+                "VALUES (?, 0, ?, ?, ?, ?)",
+                (json.dumps(row, ensure_ascii=False), error, now, now,
+                 json.dumps(options, ensure_ascii=False) if options else None),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def pending(self, limit=100, max_attempts=None):
+        """送信待ちのデータを古い順に返す（max_attempts 回以上失敗したものは除く）"""
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT id, row, attempts, last_error, created_at, options FROM notion_outbox "
+                "WHERE attempts < ? ORDER BY id LIMIT ?",
+                (max_attempts if max_attempts is not None else 2 ** 31, limit),
+            ).fetchall()
+        return [
+            {"id": entry_id, "row": json.loads(row), "attempts": attempts, "last_error": last_error,
+             "created_at": created_at, "options": json.loads(options) if options else {}}
+            for entry_id, row, attempts, last_error, created_at, options in found
+        ]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notion_outbox").fetchone()[0]
+
+    def claim(self, entry_id, lease_seconds=300):
+        """再送するデータを確保する（他のプロセスが確保済みの場合は False）"""
+        now = time.time()
+        with self._lock:
+            claimed = self._conn.execute(
+                "UPDATE notion_outbox SET claimed_until = ? WHERE id = ? AND (claimed_until IS NULL OR claimed_until < ?)",
+                (now + lease_seconds, entry_id, now),
+            ).rowcount
+            self._conn.commit()
+        return claimed == 1
+
+    def remove(self, entry_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM notion_outbox WHERE id = ?", (entry_id,))
+            self._conn.commit()
+
+    def release(self, entry_id, error):
+        """Notion が利用できず再送できなかったデータを、失敗回数を増やさずに次回の再送に戻す"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE notion_outbox SET last_error = ?, updated_at = ?, claimed_until = NULL WHERE id = ?",
+                (error, time.time(), entry_id),
+            )
+            self._conn.commit()
+
+    def mark_failed(self, entry_id, error):
+        """データ自体の問題で再送に失敗した回数を記録する"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE notion_outbox SET attempts = attempts + 1, last_error = ?, updated_at = ?, claimed_until = NULL WHERE id = ?",
+                (error, time.time(), entry_id),
+            )
+            self._conn.commit()
+
+    def replay(self, send, limit=100, max_attempts=10, prepare=None):
+        """送信待ちのデータを古い順に再送する
+
+        send: 行データと保存時の options（キーワード引数）を受け取って登録結果を返す関数。
+        Notion が利用できない場合は NotionUnavailableError を、データ自体に問題がある場合はその他の例外を送出する。
+        prepare: 再送するデータがある場合に、最初の再送の前に1回だけ呼ぶ関数（重複検出インデックスの同期など）
+        Notion が利用できない間は再送を中断し、残りは次回に持ち越す（失敗回数には数えない）。
+        データの問題で max_attempts 回失敗したデータは再送せずに残す（/notion_outbox で確認できる）。
+        """
+        sent = []
+        failed = []
+        entries = self.pending(limit, max_attempts)
+        if entries and prepare is not None:
+            try:
+                prepare()
+            except NotionUnavailableError as e:
+                logging.warning("Notion is still unavailable, skipping outbox replay: %s", e)
+                return {"sent": sent, "failed": failed, "remaining": self.count()}
+        for entry in entries:
+            if not self.claim(entry["id"]):
+                continue
+            try:
+                result = send(entry["row"], **entry["options"])
+            except NotionUnavailableError as e:
+                logging.warning("Notion is still unavailable, stopping outbox replay: %s", e)
+                self.release(entry["id"], str(e))
+                failed.append({"id": entry["id"], "message": str(e)})
+                break
+            except Exception as e:
+                logging.warning("Failed to replay outbox entry %d: %s", entry["id"], e)
+                self.mark_failed(entry["id"], str(e))
+                failed.append({"id": entry["id"], "message": str(e)})
+                continue
+            self.remove(entry["id"])
+            sent.append({"id": entry["id"], "result": result})
+        return {"sent": sent, "failed": failed, "remaining": self.count()}
+
+    def start_replayer(self, send, interval=60, prepare=None):
+        """一定間隔で送信待ちのデータを再送するスレッドを起動する（起動済みの場合は何もしない）"""
+        with self._lock:
+            if self._replayer is not None:
+                return
+            self._replayer = threading.Thread(
+                target=self._replay_loop, args=(send, interval, prepare), name="notion-outbox", daemon=True
+            )
+        self._replayer.start()
+
+    def _replay_loop(self, send, interval, prepare):
+        while True:
+            time.sleep(interval)
+            try:
+                if self.count():
+                    result = self.replay(send, prepare=prepare)
+                    logging.info("Replayed Notion outbox: %d sent, %d failed, %d remaining",
+                                 len(result["sent"]), len(result["failed"]), result["remaining"])
+            except Exception:
+                logging.exception("Failed to replay Notion outbox")
@@ -0,0 +1,236 @@
+"""Notionデータベースのスキーマのキャッシュと、スキーマに沿ったプロパティの作成
+
+データベースのプロパティ（名前・型・multi_select などの選択肢）を最初に一度取得してメモリに保持し、
+バックグラウンドのスレッドで一定間隔ごとに再取得する。ページのプロパティはキャッシュした
+スキーマに合わせて作成するため、行データの項目名や型がデータベースと一致しない場合は
+AIを呼び出す前、またはNotionに送信する前に検出でき、400 になるリクエストを送信しない。
+
+- 「名前」はデータベースのタイトルプロパティ（プロパティ名が異なる場合も）に対応させる
+- その他の項目は同じ名前（空白・大文字小文字の違いは無視）のプロパティに、プロパティの型に合わせて変換する
+- データベースにない項目や、計算式などの書き込めない型のプロパティは送信しない
+- multi_select / select は既存の選択肢の表記に合わせ、新しい選択肢を作成しない設定の場合は既存の選択肢のみ送信する
+"""
+import logging
+import re
+import threading
+import time
+
+from notion_api import RETRY_STATUS_CODES, NotionUnavailableError, page_to_row
+from section_parser import FIELDS, NO_INFO
+
+TITLE_FIELD = "名前"
+# rich_text / title の1要素あたりの文字数の上限
+TEXT_LIMIT = 2000
+# 選択肢の名前の文字数の上限
+OPTION_NAME_LIMIT = 100
+# 行データから書き込むプロパティの型
+WRITABLE_TYPES = {"title", "rich_text", "multi_select", "select", "number", "url", "email", "phone_number"}
+
+NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+class NotionSchemaError(ValueError):
+    """データベースのスキーマを取得できない、または行データと一致しない"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def normalize_name(name):
+    """プロパティ名・選択肢名の比較用の表記（空白を除き小文字にする）"""
+    return "".join(name.split()).lower()
+
+
+def split_values(value):
+    """カンマ区切りの文字列を値のリストにする（「情報なし」は除く）"""
+    return [part.strip() for part in value.split(",") if part.strip() and part.strip() != NO_INFO]
+
+
+def text_value(value):
+    return [{"text": {"content": value[:TEXT_LIMIT]}}]
+
+
+class DatabaseSchema:
+    """Notionデータベースのスキーマをメモリにキャッシュし、スキーマに沿ってプロパティを作成する"""
+
+    def __init__(self, client, database_id, refresh_interval=600, allow_new_options=True):
+        self.client = client
+        self.database_id = database_id
+        self.refresh_interval = refresh_interval
+        self.allow_new_options = allow_new_options
+        self._database = None
+        self._fetched_at = None
+        self._mapping = None
+        self._options = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+
+    def refresh(self):
+        """データベースのスキーマを取得し直してキャッシュを更新する"""
+        with self._refresh_lock:
+            return self._fetch()
+
+    def _fetch(self):
+        response = self.client.get(f"databases/{self.database_id}")
+        if response.status_code in RETRY_STATUS_CODES:
+            raise NotionUnavailableError(f"Notion API returned {response.status_code}")
+        if response.status_code != 200:
+            raise NotionSchemaError([f"Notion API returned {response.status_code}: {response.text}"])
+        database = response.json()
+        properties = database.get("properties", {})
+        options = {
+            name: {normalize_name(option["name"]): option["name"] for option in prop[prop["type"]].get("options", [])}
+            for name, prop in properties.items() if prop.get("type") in ("multi_select", "select")
+        }
+        with self._lock:
+            self._database = database
+            self._fetched_at = time.time()
+            self._mapping = None
+            self._options = options
+        logging.info("Loaded Notion database schema: %d properties", len(properties))
+        return database
+
+    def get(self, refresh=False):
+        """キャッシュしたデータベース情報を返す
+
+        未取得の場合、または定期的な再取得が動いておらず期限切れの場合のみNotionから取得する。
+        再取得に失敗した場合は取得済みのスキーマを使い続ける。
+        """
+        with self._lock:
+            database, fetched_at = self._database, self._fetched_at
+        expired = fetched_at is not None and self._refresher is None and time.time() - fetched_at > self.refresh_interval
+        if database is None and not refresh:
+            # 同時に届いた最初のリクエストでは1回だけ取得する
+            with self._refresh_lock:
+                return self._database or self._fetch()
+        if refresh or expired:
+            try:
+                return self.refresh()
+            except (NotionUnavailableError, NotionSchemaError):
+                if refresh:
+                    raise
+                logging.warning("Failed to refresh Notion database schema, using cached schema", exc_info=True)
+        return database
+
+    def mapping(self):
+        """項目名（比較用の表記） → (プロパティ名, プロパティの型) の対応"""
+        database = self.get()
+        with self._lock:
+            if self._mapping is not None and database is self._database:
+                return self._mapping
+        mapping = {}
+        for name, prop in database.get("properties", {}).items():
+            kind = prop.get("type")
+            if kind == "title":
+                mapping[normalize_name(TITLE_FIELD)] = (name, kind)
+            elif kind in WRITABLE_TYPES:
+                mapping.setdefault(normalize_name(name), (name, kind))
+        with self._lock:
+            if database is self._database:
+                self._mapping = mapping
+        return mapping
+
+    def check(self, fields):
+        """行データの項目がデータベースに書き込めるかを確認し、書き込めない項目のリストを返す
+
+        タイトルプロパティがない場合は NotionSchemaError を送出する。
+        """
+        mapping = self.mapping()
+        if normalize_name(TITLE_FIELD) not in mapping:
+            raise NotionSchemaError(["the database has no title property"])
+        return [field for field in fields if normalize_name(field) not in mapping]
+
+    def _option_names(self, prop_name, values):
+        """値を既存の選択肢の表記に合わせる（新しい選択肢を作成しない設定の場合は既存の選択肢のみ）"""
+        with self._lock:
+            existing = self._options.get(prop_name, {})
+        names = []
+        seen = set()
+        for value in values:
+            value = value[:OPTION_NAME_LIMIT]
+            key = normalize_name(value)
+            if not key or key in seen:
+                continue
+            name = existing.get(key)
+            if name is None and not self.allow_new_options:
+                logging.debug("Skipping unknown option %r for property %s", value, prop_name)
+                continue
+            seen.add(key)
+            names.append(name or value)
+        return names
+
+    def build_properties(self, row):
+        """行データからスキーマに沿ったNotionのプロパティを作成する"""
+        mapping = self.mapping()
+        if normalize_name(TITLE_FIELD) not in mapping:
+            raise NotionSchemaError(["the database has no title property"])
+        properties = {}
+        skipped = []
+        for field, value in row.items():
+            # 列数の多いCSVの余分な値（キーが None）などの文字列でない項目は送信しない
+            target = mapping.get(normalize_name(field)) if isinstance(field, str) else None
+            if target is None:
+                skipped.append(field)
+                continue
+            name, kind = target
+            value = value if isinstance(value, str) else ("" if value is None else str(value))
+            if kind in ("title", "rich_text"):
+                properties[name] = {kind: text_value(value)}
+            elif kind == "multi_select":
+                properties[name] = {kind: [{"name": option} for option in self._option_names(name, split_values(value))]}
+            elif kind == "select":
+                options = self._option_names(name, split_values(value)[:1])
+                properties[name] = {kind: {"name": options[0]} if options else None}
+            elif kind == "number":
+                match = NUMBER_PATTERN.search(value.replace(",", ""))
+                properties[name] = {kind: float(match.group(0)) if match else None}
+            else:
+                properties[name] = {kind: value[:TEXT_LIMIT] if value and value != NO_INFO else None}
+        if skipped:
+            logging.debug("Fields not in the Notion database: %s", skipped)
+        return properties
+
+    def row_from_page(self, page):
+        """Notionのページを行データ（項目名 → 文字列）に変換する（build_properties と同じ対応を逆にたどる）"""
+        mapping = self.mapping()
+        values = page_to_row(page)
+        row = {}
+        for field in FIELDS:
+            target = mapping.get(normalize_name(field))
+            row[field] = values.get(target[0], "") if target else ""
+        return row
+
+    def remember_options(self, properties):
+        """登録に成功したページで新しく作成された選択肢をキャッシュに追加する"""
+        with self._lock:
+            for name, value in properties.items():
+                if name not in self._options:
+                    continue
+                selected = value.get("multi_select") or [value.get("select") or {}]
+                for option in selected:
+                    if option.get("name"):
+                        self._options[name].setdefault(normalize_name(option["name"]), option["name"])
+
+    def start_refresher(self):
+        """一定間隔でスキーマを再取得するスレッドを起動する（起動済みの場合は何もしない）"""
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, name="notion-schema", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logging.exception("Failed to refresh Notion database schema")
+            time.sleep(self.refresh_interval)
+
+    def stats(self):
+        with self._lock:
+            properties = (self._database or {}).get("properties", {})
+            return {"properties": len(properties), "fetched_at": self._fetched_at,
+                    "options": {name: len(options) for name, options in self._options.items()}}
@@ -0,0 +1,163 @@
+"""求人情報のバッチ処理パイプライン
+
+AI変換ステージとNotion登録ステージを、それぞれ上限付きのスレッドプールで
+並行実行する。AI変換が終わった求人から順にNotion登録へ引き渡すため、
+両ステージの待ち時間が重なり、全体のスループットが向上する。
+"""
+import io
+import json
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# テキストファイル内の求人を区切る行（"---" や "===" など。次の行が求人の先頭の見出しの場合のみ境界とみなす）
+POSTING_SEPARATOR = re.compile(r'^\s*(?:-{3,}|={3,})\s*$')
+# 求人の先頭の見出し（【業務名】【案件名】【件名】は同じグループとして扱い、間に本文の行があっても同じ求人とみなす）
+POSTING_HEADER = re.compile(r'^[ \t　]*[■◆●・]?[ \t　]*【\s*(?:業務名|案件名|件名)\s*】')
+# 求人の本文のセクションの見出し（【作業概要】【単金】など、先頭の見出し以外の【】）
+SECTION_HEADER = re.compile(r'^[ \t　]*[■◆●・]?[ \t　]*【[^】]+】')
+
+
+def iter_postings(lines):
+    """行のイテレータ（ファイルやリクエストボディのストリーム）から求人を1件ずつ返す
+
+    それまでの行に求人の先頭の見出しが含まれている場合に限り、区切り行のあとに見出しが続く位置、
+    または本文のセクションのあとに再び見出しが現れた位置を求人の境界とみなす。
+    見出しの前の挨拶文などは次の求人に含め、見出しが続かない区切り行は求人の一部として残す。
+    境界が見つかるたびにそれまでの求人を返して読み込んだ行を破棄するため、
+    入力全体をメモリに読み込まずに、見つかった求人から順に処理できる。
+    """
+    buffer = []
+    # 区切り行とそのあとの空行（次の見出しが現れるまで境界かどうか決まらない行）
+    held = []
+    has_header = False
+    has_section = False
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if POSTING_SEPARATOR.match(line) or (held and not line.strip()):
+            held.append(line)
+            continue
+        if POSTING_HEADER.match(line):
+            if has_header and (held or has_section):
+                posting = "\n".join(buffer).strip()
+                if posting:
+                    yield posting
+                buffer = []
+                held = []
+                has_section = False
+            has_header = True
+        elif SECTION_HEADER.match(line):
+            has_section = has_header
+        buffer.extend(held)
+        held = []
+        buffer.append(line)
+    posting = "\n".join(buffer).strip()
+    if posting:
+        yield posting
+
+
+def iter_postings_from_text(text):
+    """複数の求人を含むテキストから求人を1件ずつ返す"""
+    return iter_postings(io.StringIO(text))
+
+
+def iter_postings_from_jsonl(lines):
+    """JSONL（1行1求人、``content`` キーまたは文字列）から求人を1件ずつ返す"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        posting = record.get("content") if isinstance(record, dict) else record
+        if isinstance(posting, str) and posting.strip():
+            yield posting.strip()
+
+
+def run_batch(contents, transform, publish, transform_workers=4, publish_workers=2, max_pending=None):
+    """求人のリスト（またはイテレータ）を2段階のパイプラインで処理する
+
+    transform: 求人テキストを受け取り、Notion用の行データ（辞書または ``name`` 属性を持つオブジェクト）を返す関数
+    publish: transform の戻り値を受け取り、登録結果を返す関数
+    transform_workers / publish_workers: 各ステージの同時実行数の上限
+    max_pending: 同時に処理中にできる求人数の上限（入力の先読みを抑える）
+
+    各求人の結果と全体のスループットをまとめた辞書を返す。
+    """
+    transform_workers = max(1, transform_workers)
+    publish_workers = max(1, publish_workers)
+    if max_pending is None:
+        max_pending = (transform_workers + publish_workers) * 2
+    pending = threading.BoundedSemaphore(max(1, max_pending))
+
+    results = {}
+    lock = threading.Lock()
+    transform_pool = ThreadPoolExecutor(transform_workers, thread_name_prefix="transform")
+    publish_pool = ThreadPoolExecutor(publish_workers, thread_name_prefix="publish")
+
+    def record(index, result):
+        with lock:
+            results[index] = result
+        pending.release()
+
+    def run_publish(index, row, item):
+        started = time.perf_counter()
+        try:
+            item["result"] = publish(row)
+            item["status"] = "success"
+        except Exception as e:
+            logging.exception("Failed to publish posting %d", index)
+            item["status"] = "error"
+            item["stage"] = "publish"
+            item["message"] = str(e)
+            item.update(getattr(e, "details", {}))
+        item["publish_seconds"] = round(time.perf_counter() - started, 3)
+        record(index, item)
+
+    def run_transform(index, content):
+        started = time.perf_counter()
+        item = {"index": index}
+        try:
+            row = transform(content)
+        except Exception as e:
+            logging.exception("Failed to transform posting %d", index)
+            item["status"] = "error"
+            item["stage"] = "transform"
+            item["message"] = str(e)
+            item.update(getattr(e, "details", {}))
+            item["transform_seconds"] = round(time.perf_counter() - started, 3)
+            record(index, item)
+            return
+        item["transform_seconds"] = round(time.perf_counter() - started, 3)
+        item["name"] = row.get("名前") if isinstance(row, dict) else getattr(row, "name", None)
+        # AI変換が完了した求人から順にNotion登録ステージへ引き渡す
+        publish_pool.submit(run_publish, index, row, item)
+
+    started = time.perf_counter()
+    total = 0
+    try:
+        for index, content in enumerate(contents):
+            pending.acquire()
+            transform_pool.submit(run_transform, index, content)
+            total += 1
+    finally:
+        # 変換ステージを先に閉じる（変換後の登録タスクの投入が完了してから登録ステージを閉じる）
+        transform_pool.shutdown(wait=True)
+        publish_pool.shutdown(wait=True)
+    elapsed = time.perf_counter() - started
+
+    items = [results[index] for index in sorted(results)]
+    succeeded = sum(1 for item in items if item["status"] == "success")
+    return {
+        "results": items,
+        "summary": {
+            "total": total,
+            "succeeded": succeeded,
+            "failed": total - succeeded,
+            "elapsed_seconds": round(elapsed, 3),
+            "postings_per_second": round(total / elapsed, 3) if elapsed > 0 else None,
+            "transform_concurrency": transform_workers,
+            "publish_concurrency": publish_workers,
+        },
+    }
@@ -0,0 +1,256 @@
+"""OpenAI に送るプロンプトの組み立てとトークン数の管理
+
+- 抽出ルールなどの固定の指示は毎回同じ内容の system メッセージにまとめる
+  （可変部分をユーザーメッセージに分けることで、プロンプトキャッシュも効きやすくなる）
+- 求人情報から挨拶・署名などの定型文と、抽出に使わない見出し（【面談】など）を除く
+- トークン数をローカルで数え、上限を超える場合は重要度の低い見出しから順に切り詰める
+
+トークン数は tiktoken がインストールされていればそれを使い、なければ文字種から概算する。
+"""
+import json
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken は任意の依存関係
+    tiktoken = None
+
+from section_parser import FIELDS, SECTION_ALIASES
+
+# 固定の指示（CSV形式で出力させる場合）
+CSV_SYSTEM_PROMPT = (
+    "求人情報を次の20項目の1行のCSV（ヘッダーなし、値にカンマを含む場合は\"で囲む）に変換する。\n"
+    + ",".join(FIELDS) + "\n"
+    "名前/案件タイトル=【業務名】、仕事内容/案件内容=【作業概要】、勤務地/働き方=【作業場所】、勤務時間=【稼働】、"
+    "必須スキル=<マスト>、歓迎スキル=<Better>、給与=【単金】、稼働率=【単金】の精算幅、"
+    "開発環境=【環境】の「開発環境」の技術スタックのみ、ポジション=【募集】、期間=【作業期間】、"
+    "期待する人物像=【備考】、タグ=業種・技術キーワード。\n"
+    "各項目は対応する見出しからのみ抽出し、【環境】と【単金】、【作業期間】と開発環境を混同しない。情報がなければ「情報なし」。"
+)
+
+# 固定の指示（スキーマに沿ったJSONで出力させる場合。各項目の説明はスキーマに含まれる）
+STRUCTURED_SYSTEM_PROMPT = (
+    "求人情報からNotionデータベースの各項目を抽出する。"
+    "各項目は対応する見出しからのみ抽出し、【環境】の開発環境と【単金】、【作業期間】と開発環境を混同しない。"
+    "情報がない項目は「情報なし」とする。"
+)
+
+USER_PREFIX = "求人情報:\n"
+
+# 以前のプロンプトの固定部分（節約できたトークン数の比較用。以前は求人情報と合わせて1つのメッセージで送信していた）
+LEGACY_INSTRUCTIONS = """
+    以下の求人情報を、指定されたCSVフォーマットに変換してください。
+
+    フォーマット: 名前,タグ,仕事内容,勤務地,勤務時間,必須スキル,案件タイトル,案件内容,歓迎スキル,給与,開発環境,雇用形態,業種業界,ポジション,プロダクト,期間,稼働率,働き方,期待する人物像,その他
+
+    各フィールドの詳細な説明と抽出ルール:
+    1. 名前: 【業務名】セクションから抽出。例: "福祉事業会社向け 社内システム開発支援"
+    2. タグ: 業種・業界、技術キーワードをカンマ区切りで。例: "Ruby,Rails,Web開発"
+    3. 仕事内容: 【作業概要】セクションの内容。
+    4. 勤務地: 【作業場所】セクションから場所情報を抽出。例: "基本リモート作業（地方の方可能）"
+    5. 勤務時間: 【稼働】や勤務時間に関する情報。
+    6. 必須スキル: 【スキル】の<マスト>セクションの内容。
+    7. 案件タイトル: 【業務名】セクションの内容。
+    8. 案件内容: 【作業概要】セクションの内容。
+    9. 歓迎スキル: 【スキル】の<Better>セクションの内容。
+    10. 給与: 【単金】セクションの内容。例: "85万（スキル見合い）（精算 140-180/月）"
+    11. 開発環境: 【環境】セクションの「開発環境」に記載されている技術スタックのみ。例: "Ruby、Ruby on Rails、TypeScript、React.js"
+    12. 雇用形態: 契約形態（業務委託など）。
+    13. 業種業界: 業種・業界に関する情報。例: "福祉事業"
+    14. ポジション: 【募集】セクションの内容。例: "バックエンドエンジニア × SE 8名"
+    15. プロダクト: 開発対象のプロダクト情報。
+    16. 期間: 【作業期間】セクションの内容。例: "2025年4月〜"
+    17. 稼働率: 【単金】セクションの精算情報。例: "140-180/月"
+    18. 働き方: 【作業場所】や働き方に関する情報。例: "基本リモート作業"
+    19. 期待する人物像: 【備考】から期待する人物像を抽出。例: "主体的・自律的に行動できる方"
+    20. その他: その他の重要情報。
+
+    重要な注意点:
+    - 各フィールドは必ず対応するセクションから情報を抽出し、混同しないでください。
+    - 【環境】の開発環境と【単金】の情報を混同しないでください。
+    - 【作業期間】と開発環境の情報を混同しないでください。
+    - 給与情報は必ず【単金】セクションから抽出してください。
+    - 期間情報は必ず【作業期間】セクションから抽出してください。
+    - 開発環境は【環境】セクションの「開発環境」部分から技術スタックのみを抽出してください。
+    - 情報がない場合は「情報なし」と出力してください。
+    - 必ず1行のCSV形式で出力し、ヘッダー行は含めないでください。
+
+    求人情報:
+    """
+
+# 抽出に使わない見出し
+IRRELEVANT_SECTIONS = {"面談", "面談回数", "商流", "支払サイト", "支払い", "提案方法", "応募方法", "連絡先", "担当", "担当者", "選考"}
+
+# 切り詰める順序（値が小さい見出しから切り詰める。表にない見出しは 0）
+SECTION_PRIORITY = {
+    "備考": 1, "作業概要": 2, "環境": 2, "プロダクト": 2,
+    "スキル": 3, "マスト": 3, "Better": 3,
+    "業務名": 9, "単金": 9, "精算": 9, "作業期間": 9, "作業場所": 9, "稼働": 9, "募集": 9,
+}
+# これより重要度の高い見出しは切り詰めない
+MAX_TRIM_PRIORITY = 3
+# 切り詰めても残すトークン数
+MIN_SECTION_TOKENS = 30
+TRIM_MARKER = "…（以下省略）"
+
+HEADING_PATTERN = re.compile(r'^[ \t　]*[■◆●・]?[ \t　]*【\s*([^】\n]{1,20}?)\s*】', re.MULTILINE)
+# 挨拶・締めの定型文（短い行のみを対象にする）
+BOILERPLATE_PATTERN = re.compile(
+    r'^[ \t　]*(?:お疲れ様|お疲れさま|お世話になっております|いつもお世話|お世話になります|'
+    r'よろしくお願い|宜しくお願い|以上、|以上です|ご確認|ご検討|ご提案|下記.{0,20}(?:案件|ご紹介)|以下.{0,20}(?:案件|ご紹介)|'
+    r'ご不明点|お問い合わせ|本メール|このメール)[^\n]{0,60}$',
+    re.MULTILINE,
+)
+# 署名などの区切り線
+RULE_PATTERN = re.compile(r'^[ \t　]*[-=＝━─_＿*＊~〜]{4,}[ \t　]*$', re.MULTILINE)
+BLANK_LINES_PATTERN = re.compile(r'\n[ \t　]*(?:\n[ \t　]*)+')
+SPACES_PATTERN = re.compile(r'[ \t　]+')
+ASCII_PATTERN = re.compile(r'[\x00-\x7f]+')
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model=None):
+    """トークン数を数える（tiktoken がない場合は英数字4文字・日本語1文字を1トークンとして概算）"""
+    encoding = _encoding(model or "gpt-3.5-turbo")
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(len(run) for run in ASCII_PATTERN.findall(text))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+@lru_cache(maxsize=8)
+def legacy_instruction_tokens(model=None):
+    return count_tokens(LEGACY_INSTRUCTIONS, model)
+
+
+def token_counter():
+    """トークン数の数え方（tiktoken / estimate）"""
+    return "tiktoken" if tiktoken is not None else "estimate"
+
+
+def split_sections(content):
+    """求人情報を見出しの前の文章と (見出し, 正規化した見出し名, 本文) のリストに分ける"""
+    matches = list(HEADING_PATTERN.finditer(content))
+    if not matches:
+        return content, []
+    preamble = content[:matches[0].start()]
+    sections = []
+    for match, following in zip(matches, matches[1:] + [None]):
+        heading = match.group(1)
+        body = content[match.end():following.start() if following else len(content)]
+        sections.append((heading, SECTION_ALIASES.get(heading, heading), body))
+    return preamble, sections
+
+
+def strip_boilerplate(text):
+    """挨拶・締めの定型文、区切り線、余分な空白を除く"""
+    text = BOILERPLATE_PATTERN.sub("", text)
+    text = RULE_PATTERN.sub("", text)
+    text = SPACES_PATTERN.sub(" ", text)
+    return BLANK_LINES_PATTERN.sub("\n", text).strip()
+
+
+def _join(preamble, sections):
+    parts = [preamble] if preamble else []
+    parts.extend(f"【{heading}】\n{body}" if body else f"【{heading}】" for heading, _, body in sections)
+    return "\n".join(parts)
+
+
+def compact_posting(content, max_tokens=None, model=None):
+    """求人情報から定型文と抽出に使わない見出しを除き、必要なら上限のトークン数まで切り詰める
+
+    (整形後の求人情報, 除いた見出しのリスト, 切り詰めた見出しのリスト) を返す。
+    """
+    preamble, sections = split_sections(content)
+    removed = [heading for heading, name, _ in sections if name in IRRELEVANT_SECTIONS]
+    preamble = strip_boilerplate(preamble)
+    sections = [(heading, name, strip_boilerplate(body)) for heading, name, body in sections
+                if name not in IRRELEVANT_SECTIONS]
+    text = _join(preamble, sections)
+    trimmed = []
+    if max_tokens is None:
+        return text, removed, trimmed
+
+    excess = count_tokens(text, model) - max_tokens
+    if excess > 0 and preamble and sections:
+        # 見出しの前の文章（メールの前置きなど）を最初に除く
+        excess -= count_tokens(preamble, model)
+        preamble = ""
+        trimmed.append("(preamble)")
+    order = sorted(
+        (index for index, (_, name, _) in enumerate(sections) if SECTION_PRIORITY.get(name, 0) <= MAX_TRIM_PRIORITY),
+        key=lambda index: SECTION_PRIORITY.get(sections[index][1], 0),
+    )
+    for index in order:
+        if excess <= 0:
+            break
+        heading, name, body = sections[index]
+        tokens = count_tokens(body, model)
+        if tokens <= MIN_SECTION_TOKENS:
+            continue
+        keep = max(MIN_SECTION_TOKENS, tokens - excess - count_tokens(TRIM_MARKER, model))
+        body = body[:len(body) * keep // tokens].rstrip() + TRIM_MARKER
+        sections[index] = (heading, name, body)
+        excess -= tokens - count_tokens(body, model)
+        trimmed.append(heading)
+
+    text = _join(preamble, sections)
+    if excess > 0:
+        # 見出しを切り詰めても収まらない場合は末尾から切り詰める
+        # （文字種の偏りで比例配分が上限を超えることがあるため、収まるまで繰り返す）
+        limit = max(1, max_tokens - count_tokens(TRIM_MARKER, model))
+        tokens = count_tokens(text, model)
+        while tokens > limit and text:
+            text = text[:len(text) * limit // tokens].rstrip()
+            tokens = count_tokens(text, model)
+        text += TRIM_MARKER
+        trimmed.append("(all)")
+    return text, removed, trimmed
+
+
+@lru_cache(maxsize=8)
+def _schema_tokens(schema_json, model):
+    return count_tokens(schema_json, model)
+
+
+def build_messages(content, structured=True, max_tokens=None, model=None, schema=None):
+    """OpenAI に送るメッセージと、節約できたトークン数などの記録を返す
+
+    max_tokens はプロンプト全体（system とユーザーメッセージ、schema を指定した場合は
+    Function Calling などで送るスキーマも含む）のトークン数の上限。
+    """
+    system = STRUCTURED_SYSTEM_PROMPT if structured else CSV_SYSTEM_PROMPT
+    system_tokens = count_tokens(system, model)
+    if schema is not None:
+        system_tokens += _schema_tokens(json.dumps(schema, ensure_ascii=False), model)
+    budget = None
+    if max_tokens is not None:
+        budget = max(MIN_SECTION_TOKENS, max_tokens - system_tokens - count_tokens(USER_PREFIX, model))
+    posting, removed, trimmed = compact_posting(content, budget, model)
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": USER_PREFIX + posting},
+    ]
+    prompt_tokens = system_tokens + count_tokens(messages[1]["content"], model)
+    # 以前のプロンプト（固定の指示と求人情報をそのまま送信）との比較
+    original_tokens = legacy_instruction_tokens(model) + count_tokens(content, model)
+    report = {
+        "prompt_tokens": prompt_tokens,
+        "original_tokens": original_tokens,
+        "saved_tokens": max(0, original_tokens - prompt_tokens),
+        "removed_sections": removed,
+        "trimmed_sections": trimmed,
+        "counter": token_counter(),
+    }
+    return messages, report
+
@@ -0,0 +1,307 @@
+"""【…】形式の求人情報を解析するセクションパーサー
+
+求人情報を 【見出し】 / <マスト> / <Better> の区切りで1回の走査で分割し、
+Notionの20項目を直接埋める。テンプレートに沿った求人であれば AI を
+呼び出さずに登録できるよう、抽出結果の信頼度（0〜1）もあわせて返す。
+"""
+import re
+from functools import lru_cache
+
+# Notionデータベースの項目（CSVの列順）
+FIELDS = ["名前", "タグ", "仕事内容", "勤務地", "勤務時間", "必須スキル", "案件タイトル", "案件内容",
+          "歓迎スキル", "給与", "開発環境", "雇用形態", "業種業界", "ポジション", "プロダクト",
+          "期間", "稼働率", "働き方", "期待する人物像", "その他"]
+
+NO_INFO = "情報なし"
+
+# 見出しの表記揺れを正規化するための対応表
+SECTION_ALIASES = {
+    "業務名": "業務名", "案件名": "業務名", "件名": "業務名", "案件": "業務名",
+    "作業概要": "作業概要", "概要": "作業概要", "業務内容": "作業概要", "作業内容": "作業概要", "案件概要": "作業概要",
+    "作業場所": "作業場所", "場所": "作業場所", "勤務地": "作業場所", "勤務場所": "作業場所",
+    "稼働": "稼働", "勤務時間": "稼働", "稼働時間": "稼働", "稼働日": "稼働",
+    "スキル": "スキル",
+    "必須スキル": "マスト", "必須": "マスト",
+    "歓迎スキル": "Better", "尚可スキル": "Better", "尚可": "Better",
+    "単金": "単金", "単価": "単金", "金額": "単金", "報酬": "単金",
+    "精算": "精算", "精算幅": "精算",
+    "環境": "環境", "開発環境": "環境",
+    "募集": "募集", "募集人数": "募集", "人数": "募集", "ポジション": "募集",
+    "作業期間": "作業期間", "期間": "作業期間", "開始時期": "作業期間",
+    "備考": "備考",
+    "契約形態": "契約形態", "雇用形態": "契約形態",
+    "業種": "業種", "業界": "業種", "業種業界": "業種",
+    "プロダクト": "プロダクト", "製品": "プロダクト",
+    "稼働率": "稼働率",
+}
+
+# 見出し（【…】）とスキルの小見出し（<マスト> / <Better>）を1つのパターンで検出する
+# （先頭を文字クラスにすると、区切り文字以外の位置を高速に読み飛ばせる）
+MARKER_PATTERN = re.compile(
+    r'[【<＜](?:(?<=【)\s*([^】\n]{1,20}?)\s*】'
+    r'|(?<=[<＜])\s*(マスト|必須|MUST|Must|must|Better|BETTER|better|尚可|歓迎)\s*[>＞])'
+)
+SUBSECTION_ALIASES = {"マスト": "マスト", "必須": "マスト", "MUST": "マスト", "Must": "マスト", "must": "マスト",
+                      "Better": "Better", "BETTER": "Better", "better": "Better", "尚可": "Better", "歓迎": "Better"}
+
+# 行頭の箇条書き記号（改行から始まるパターンにして改行以外の位置を読み飛ばす）
+BULLET_PATTERN = re.compile(r'\n[ \t　]*[・\-\*•●◆■□]')
+DEV_ENV_PATTERN = re.compile(r'開発環境\s*[:：]?\s*([^\n]+)')
+SETTLEMENT_PATTERN = re.compile(r'精算\s*[:：]?\s*(\d+(?:\.\d+)?\s*[-〜~～－]\s*\d+(?:\.\d+)?\s*(?:h|H|時間)?(?:\s*/\s*月)?)')
+SETTLEMENT_RANGE_PATTERN = re.compile(r'(\d+(?:\.\d+)?\s*[-〜~～－]\s*\d+(?:\.\d+)?\s*(?:h|H|時間)?(?:\s*/\s*月)?)')
+UTILIZATION_PATTERN = re.compile(r'(\d{2,3}\s*[%％]|週\s*[1-5１-５](?:\s*[〜~～-]\s*[1-5１-５])?\s*日)')
+CONTRACT_PATTERN = re.compile(r'(業務委託|準委任|請負|派遣|正社員|契約社員)')
+INDUSTRY_PATTERN = re.compile(r'([^\s　・、,]+?)(?:会社|企業)?向け')
+PERSONA_PATTERN = re.compile(r'(方|人物|志向|姿勢)')
+SALARY_WORDS = ("万", "円", "千", "k")
+
+# タグ付けに使う技術・業務キーワード（1つの選択パターンにまとめて1回の走査で検出する）
+TAG_KEYWORDS = [
+    "Ruby on Rails", "Ruby", "Rails", "Python", "Django", "Flask", "FastAPI", "Java", "Spring", "Kotlin",
+    "Scala", "Go", "PHP", "Laravel", "C#", ".NET", "C++", "JavaScript", "TypeScript", "React", "Next.js",
+    "Vue", "Nuxt", "Angular", "Node.js", "Swift", "Flutter", "Android", "iOS", "AWS", "GCP", "Azure",
+    "Docker", "Kubernetes", "Terraform", "MySQL", "PostgreSQL", "Oracle", "Salesforce", "SAP",
+    "Web", "フロントエンド", "バックエンド", "インフラ", "機械学習", "データ分析", "PM", "PMO",
+    "要件定義", "設計", "開発", "テスト", "運用保守",
+]
+# IGNORECASE や前後の境界チェックを含むパターンは位置ごとの照合が遅くなるため、
+# 小文字化した本文に対して単純な選択パターンで候補を集め、英字のキーワードだけ境界を確認する
+TAG_PATTERN = re.compile("|".join(re.escape(k.lower()) for k in sorted(TAG_KEYWORDS, key=len, reverse=True)))
+TAG_CANONICAL = {k.lower(): k for k in TAG_KEYWORDS}
+# 前後に英字が続く場合は別の単語の一部とみなすキーワード（例: Google の Go）
+TAG_ASCII_KEYWORDS = frozenset(k.lower() for k in TAG_KEYWORDS if k[0].isascii() and k[0].isalpha() or k[-1].isascii() and k[-1].isalpha())
+ASCII_LETTERS = frozenset("abcdefghijklmnopqrstuvwxyz")
+# 汎用的なキーワードは技術名より後ろに並べる
+GENERIC_TAGS = {"Web", "要件定義", "設計", "開発", "テスト", "運用保守"}
+MAX_TAGS = 8
+
+# 期間に混入していれば誤抽出とみなす技術名
+PERIOD_TECH_WORDS = ("ruby", "rails", "jest", "typescript", "react", "aws", "docker")
+
+# 信頼度の計算に使う項目ごとの重み（合計1.0）
+CONFIDENCE_WEIGHTS = {
+    "名前": 0.15, "仕事内容": 0.15, "給与": 0.15, "必須スキル": 0.15,
+    "期間": 0.1, "勤務地": 0.1,
+    "開発環境": 0.05, "ポジション": 0.05, "勤務時間": 0.05, "歓迎スキル": 0.05,
+}
+
+
+@lru_cache(maxsize=64)
+def parse_sections(content):
+    """求人情報を見出しごとに分割する
+
+    見出しの本文を正規化した見出し名をキーとする辞書と、<マスト>/<Better> の
+    本文の辞書、未知の見出しの (見出し, 本文) のリストを返す。
+    同じ見出しが複数回現れた場合は最初のものを使う。
+
+    同じ求人に対する検証・再抽出で何度も走査しないよう結果をキャッシュするため、
+    返された辞書やリストは呼び出し側で変更しないこと。
+    """
+    sections = {}
+    subsections = {}
+    unknown = []
+
+    current = None
+    current_kind = None
+    start = 0
+    for match in MARKER_PATTERN.finditer(content):
+        if current is not None:
+            _store(sections, subsections, unknown, current_kind, current, content[start:match.start()])
+        if match.group(1) is not None:
+            heading = match.group(1)
+            current = SECTION_ALIASES.get(heading, heading)
+            current_kind = "section" if heading in SECTION_ALIASES else "unknown"
+            # 【必須スキル】【尚可スキル】は小見出しとして扱う
+            if current in ("マスト", "Better"):
+                current_kind = "subsection"
+        else:
+            current = SUBSECTION_ALIASES[match.group(2)]
+            current_kind = "subsection"
+        start = match.end()
+    if current is not None:
+        _store(sections, subsections, unknown, current_kind, current, content[start:])
+
+    return sections, subsections, unknown
+
+
+def _store(sections, subsections, unknown, kind, name, body):
+    body = body.strip()
+    if kind == "unknown":
+        if body:
+            unknown.append((name, body))
+    elif kind == "subsection":
+        subsections.setdefault(name, body)
+    else:
+        sections.setdefault(name, body)
+
+
+def clean(text):
+    """箇条書きの記号を除き、空白をまとめて1行にする"""
+    return " ".join(BULLET_PATTERN.sub("\n", "\n" + text).split())
+
+
+def extract_tags(text, limit=MAX_TAGS):
+    """本文に出現する順にタグを抽出する（汎用的なキーワードは後ろに並べる）"""
+    specific = []
+    generic = []
+    lowered = text.lower()
+    for candidate in dict.fromkeys(TAG_PATTERN.findall(lowered)):
+        # 英単語の一部（例: Google の Go）だけに一致した候補は除外する
+        if candidate in TAG_ASCII_KEYWORDS and not _has_word(lowered, candidate):
+            continue
+        tag = TAG_CANONICAL[candidate]
+        (generic if tag in GENERIC_TAGS else specific).append(tag)
+    return (specific + generic)[:limit]
+
+
+def _has_word(text, word):
+    """前後に英字が続かない位置に word が出現するか"""
+    start = text.find(word)
+    while start != -1:
+        end = start + len(word)
+        if (start == 0 or text[start - 1] not in ASCII_LETTERS) and (end == len(text) or text[end] not in ASCII_LETTERS):
+            return True
+        start = text.find(word, start + 1)
+    return False
+
+
+def has_salary(value):
+    """給与らしい値か（万/円などを含むか）"""
+    lowered = value.lower()
+    return any(word in lowered for word in SALARY_WORDS)
+
+
+def has_period_tech(value):
+    """期間に技術名が混入しているか"""
+    lowered = value.lower()
+    return any(word in lowered for word in PERIOD_TECH_WORDS)
+
+
+def extract_fields(content):
+    """求人情報から20項目を抽出し、(行データ, 信頼度) を返す"""
+    sections, subsections, unknown = parse_sections(content)
+    row = {field: NO_INFO for field in FIELDS}
+
+    def section(*names):
+        for name in names:
+            value = sections.get(name)
+            if value:
+                return value
+        return ""
+
+    title = clean(section("業務名"))
+    if title:
+        row["名前"] = title
+        row["案件タイトル"] = title
+
+    summary = clean(section("作業概要"))
+    if summary:
+        row["仕事内容"] = summary
+        row["案件内容"] = summary
+
+    location = clean(section("作業場所"))
+    if location:
+        row["勤務地"] = location
+        row["働き方"] = location
+
+    hours = clean(section("稼働"))
+    if hours:
+        row["勤務時間"] = hours
+
+    must = clean(subsections.get("マスト", ""))
+    if must:
+        row["必須スキル"] = must
+    elif section("スキル"):
+        row["必須スキル"] = clean(section("スキル"))
+
+    better = clean(subsections.get("Better", ""))
+    if better:
+        row["歓迎スキル"] = better
+
+    salary = section("単金")
+    if salary:
+        row["給与"] = clean(salary)
+
+    environment = section("環境")
+    if environment:
+        dev_env = DEV_ENV_PATTERN.search(environment)
+        row["開発環境"] = clean(dev_env.group(1)) if dev_env else clean(environment)
+
+    contract = clean(section("契約形態"))
+    if contract:
+        row["雇用形態"] = contract
+    else:
+        contract_match = CONTRACT_PATTERN.search(content)
+        if contract_match:
+            row["雇用形態"] = contract_match.group(1)
+
+    industry = clean(section("業種"))
+    if industry:
+        row["業種業界"] = industry
+    elif title:
+        industry_match = INDUSTRY_PATTERN.search(title)
+        if industry_match:
+            row["業種業界"] = industry_match.group(1)
+
+    position = clean(section("募集"))
+    if position:
+        row["ポジション"] = position
+
+    product = clean(section("プロダクト"))
+    if product:
+        row["プロダクト"] = product
+
+    period = clean(section("作業期間"))
+    if period:
+        row["期間"] = period
+
+    utilization = clean(section("稼働率"))
+    if not utilization:
+        settlement = SETTLEMENT_PATTERN.search(salary) or SETTLEMENT_RANGE_PATTERN.search(section("精算"))
+        if settlement:
+            utilization = "".join(settlement.group(1).split())
+        elif hours:
+            utilization_match = UTILIZATION_PATTERN.search(hours)
+            if utilization_match:
+                utilization = utilization_match.group(1)
+    if utilization:
+        row["稼働率"] = utilization
+
+    # 備考は人物像に関する行とそれ以外に分ける
+    persona = []
+    others = []
+    for line in section("備考").splitlines():
+        line = clean(line)
+        if not line:
+            continue
+        (persona if PERSONA_PATTERN.search(line) else others).append(line)
+    others.extend(f"{name}: {clean(body)}" for name, body in unknown)
+    if persona:
+        row["期待する人物像"] = " / ".join(persona)
+    if others:
+        row["その他"] = " / ".join(others)
+
+    tags = extract_tags(content)
+    if tags:
+        row["タグ"] = ",".join(tags)
+
+    return row, score_row(row)
+
+
+def score_row(row):
+    """抽出結果の信頼度（0〜1）を計算する
+
+    主要項目が埋まっているほど高くなる。給与に金額の単位がない場合や、
+    期間に技術名が混入している場合はその項目を未抽出とみなす。
+    """
+    score = 0.0
+    for field, weight in CONFIDENCE_WEIGHTS.items():
+        value = row.get(field, NO_INFO)
+        if not value or value == NO_INFO:
+            continue
+        if field == "給与" and not has_salary(value):
+            continue
+        if field == "期間" and has_period_tech(value):
+            continue
+        score += weight
+    return round(score, 3)
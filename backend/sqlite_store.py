@@ -0,0 +1,35 @@
+"""SQLite のファイルにデータを保存するローカルのストアの共通処理"""
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """最初に使うときに SQLite のファイルを開くストアの基底クラス
+
+    import 時間を増やさないよう、ファイルを開いてテーブルを作成するのは最初に _conn を参照したときの1回だけにする。
+    接続はスレッド間で共有するため、サブクラスはそれぞれのロックを取得してから使う。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def _conn(self):
+        if self._db is None:
+            with self._open_lock:
+                if self._db is None:
+                    self._db = self._open()
+        return self._db
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._create_schema(conn)
+        conn.commit()
+        return conn
+
+    def _create_schema(self, conn):
+        """テーブルを作成する（サブクラスで実装する）"""
+        raise NotImplementedError
@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# backend のモジュール（app.py など）とベンチマーク用のスタブをテストから import できるようにする
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "bench"))
+
+from fake_servers import FakeNotionHandler, FakeOpenAIHandler, StubConfig, server_url, start_server  # noqa: E402
+from section_parser import FIELDS  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def stubs():
+    """OpenAI / Notion のスタブ（fake_servers.py）を起動し、それぞれの設定を返す"""
+    openai_config = StubConfig()
+    notion_config = StubConfig(record=True)
+    openai_server = start_server(FakeOpenAIHandler, openai_config)
+    notion_server = start_server(FakeNotionHandler, notion_config)
+    yield {"openai": openai_config, "notion": notion_config,
+           "openai_url": server_url(openai_server), "notion_url": server_url(notion_server)}
+    openai_server.shutdown()
+    notion_server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def app_module(stubs):
+    """スタブと一時ディレクトリの SQLite ファイルを使う設定で app を読み込む"""
+    workdir = tempfile.mkdtemp(prefix="app-tests-")
+    os.environ.update({
+        "LOG_LEVEL": "WARNING",
+        "OPENAI_API_KEY": "test",
+        "OPENAI_BASE_URL": stubs["openai_url"],
+        "NOTION_API_URL": stubs["notion_url"],
+        "NOTION_TOKEN": "test",
+        "NOTION_DATABASE_ID": "test-database",
+        "NOTION_RATE_LIMIT": "1000",
+        "DUPLICATE_MODE": "create",
+        "EXTRACTION_CACHE_ENABLED": "false",
+        "JOB_QUEUE_PATH": os.path.join(workdir, "job_queue.sqlite3"),
+        "NOTION_OUTBOX_PATH": os.path.join(workdir, "notion_outbox.sqlite3"),
+        "DUPLICATE_INDEX_PATH": os.path.join(workdir, "duplicate_index.sqlite3"),
+        "JOB_MIRROR_PATH": os.path.join(workdir, "job_mirror.sqlite3"),
+    })
+    import app
+
+    return app
+
+
+@pytest.fixture
+def make_row():
+    """名前から、すべての項目を持つ行データを作る関数"""
+    def make(name):
+        row = {field: "情報なし" for field in FIELDS}
+        row.update({"名前": name, "仕事内容": f"{name}の開発", "給与": "70万"})
+        return row
+    return make
+
+
+@pytest.fixture
+def notion_pages(app_module, stubs):
+    """Notionスタブにページを作成（create）・削除（delete）する関数
+
+    delete は、Notionでアーカイブされたページがデータベースの検索結果に含まれなくなった状態を再現する。
+    """
+    def delete(page_id):
+        with stubs["notion"]._lock:
+            del stubs["notion"].pages[page_id]
+    return SimpleNamespace(create=lambda row: app_module.create_notion_page(row).json(), delete=delete)
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.text = str(body)
+
+    def json(self):
+        return self.body
+
+
+class FakeNotionClient:
+    """データベースのスキーマと検索結果を固定で返す NotionClient の代わり"""
+
+    def __init__(self, properties, pages=()):
+        self.database = {"object": "database", "properties": properties}
+        self.pages = list(pages)
+
+    def get(self, path, **kwargs):
+        return FakeResponse(self.database)
+
+    def post(self, path, json=None, **kwargs):
+        return FakeResponse({"object": "list", "results": self.pages, "has_more": False, "next_cursor": None})
@@ -0,0 +1,53 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from concurrency_check import MARKER_PATTERN, check_pages, make_posting
+
+SINGLE_REQUESTS = 24
+BATCH_SIZE = 8
+CONCURRENCY = 8
+
+
+@pytest.fixture
+def corrupt_openai(stubs):
+    """OpenAI スタブに期間・勤務地・ポジションをわざと誤って返させる"""
+    stubs["openai"].corrupt = True
+    yield
+    stubs["openai"].corrupt = False
+
+
+def test_concurrent_requests_do_not_mix_postings(app_module, stubs, corrupt_openai, monkeypatch):
+    """/process_job と /process_jobs を同時に処理しても、ページごとの項目に他の求人の値が混ざらない"""
+    # 全件を AI で抽出し、入力データからの再抽出も並行して行わせる
+    monkeypatch.setattr(app_module, "SECTION_PARSER_THRESHOLD", 2)
+    singles = list(range(SINGLE_REQUESTS))
+    batch = list(range(SINGLE_REQUESTS, SINGLE_REQUESTS + BATCH_SIZE))
+    expected = {f"{index:05d}" for index in singles + batch}
+    recorded = len(stubs["notion"].bodies)
+
+    def send(index):
+        response = app_module.app.test_client().post("/process_job", json={"content": make_posting(index)})
+        return index, response.status_code, response.get_data(as_text=True)[:200]
+
+    def send_batch():
+        text = "\n---\n".join(make_posting(index) for index in batch)
+        response = app_module.app.test_client().post(
+            "/process_jobs", data=text.encode("utf-8"), headers={"Content-Type": "text/plain; charset=utf-8"}
+        )
+        return response.status_code, response.get_data(as_text=True)
+
+    with ThreadPoolExecutor(CONCURRENCY + 1) as pool:
+        batch_future = pool.submit(send_batch)
+        failures = [result for result in pool.map(send, singles) if result[1] != 200]
+        batch_status, batch_body = batch_future.result()
+
+    assert failures == []
+    assert batch_status == 200, batch_body[:200]
+    assert json.loads(batch_body)["summary"]["succeeded"] == BATCH_SIZE
+
+    # 他のテストで登録されたページは除いて確認する
+    bodies = [body for body in stubs["notion"].bodies[recorded:]
+              if set(MARKER_PATTERN.findall(json.dumps(body, ensure_ascii=False))) & expected]
+    assert check_pages(bodies, sorted(expected)) == []
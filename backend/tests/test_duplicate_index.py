@@ -0,0 +1,80 @@
+from conftest import FakeNotionClient
+from duplicate_index import DuplicateIndex
+from notion_schema import DatabaseSchema
+
+
+def test_full_sync_removes_pages_deleted_in_notion(app_module, notion_pages, tmp_path, make_row):
+    row = make_row("削除済みページ検出テスト案件")
+    page = notion_pages.create(row)
+    index = DuplicateIndex(str(tmp_path / "duplicate_index.sqlite3"))
+    index.sync(app_module.notion_client, app_module.DATABASE_ID)
+    assert [match["page_id"] for match in index.find(row)] == [page["id"]]
+
+    notion_pages.delete(page["id"])
+    index.sync(app_module.notion_client, app_module.DATABASE_ID)
+    assert index.find(row)
+
+    result = index.sync(app_module.notion_client, app_module.DATABASE_ID, full=True)
+    assert index.find(row) == []
+    assert result["removed"] == 1
+
+
+def test_index_is_loaded_on_first_find(tmp_path, make_row):
+    path = str(tmp_path / "duplicate_index.sqlite3")
+    row = make_row("遅延読み込みテスト案件")
+    DuplicateIndex(path).add("page-1", row)
+
+    index = DuplicateIndex(path)
+    assert index._db is None
+    assert index._pages == {}
+    assert [match["page_id"] for match in index.find(row)] == ["page-1"]
+
+
+def test_sync_maps_title_property_with_schema(tmp_path, make_row):
+    page = {
+        "id": "page-1", "url": "https://www.notion.so/page1", "last_edited_time": "2025-04-01T00:00:00.000Z",
+        "properties": {
+            "求人名": {"type": "title", "title": [{"plain_text": "スキーマ対応テスト案件"}]},
+            "仕事内容": {"type": "rich_text", "rich_text": [{"plain_text": "スキーマ対応テスト案件の開発"}]},
+            "給与": {"type": "rich_text", "rich_text": [{"plain_text": "70万"}]},
+        },
+    }
+    client = FakeNotionClient({
+        "求人名": {"type": "title", "title": {}},
+        "仕事内容": {"type": "rich_text", "rich_text": {}},
+        "給与": {"type": "rich_text", "rich_text": {}},
+    }, [page])
+    index = DuplicateIndex(str(tmp_path / "duplicate_index.sqlite3"))
+    index.sync(client, "test-database", DatabaseSchema(client, "test-database"))
+
+    matches = index.find(make_row("スキーマ対応テスト案件"))
+    assert [(match["page_id"], match["name"], match["reason"]) for match in matches] == [
+        ("page-1", "スキーマ対応テスト案件", "exact")
+    ]
+
+
+def test_pages_added_by_another_process_are_found(tmp_path, make_row):
+    path = str(tmp_path / "duplicate_index.sqlite3")
+    worker_a = DuplicateIndex(path)
+    worker_b = DuplicateIndex(path)
+    row = make_row("別プロセス追加テスト案件")
+    assert worker_b.find(row) == []
+
+    worker_a.add("page-1", row)
+    assert [match["page_id"] for match in worker_b.find(row)] == ["page-1"]
+    worker_a.remove("page-1")
+    assert worker_b.find(row) == []
+
+
+def test_index_is_reloaded_when_change_log_was_pruned(tmp_path, make_row):
+    path = str(tmp_path / "duplicate_index.sqlite3")
+    worker_a = DuplicateIndex(path)
+    worker_b = DuplicateIndex(path)
+    worker_b.load()
+    worker_a.add("page-1", make_row("変更履歴削除テスト案件A"))
+    worker_a.add("page-2", make_row("物流倉庫の在庫管理基盤刷新"))
+    # worker_b が読み込む前に古い変更履歴が削除された
+    worker_a._conn.execute("DELETE FROM duplicate_index_changes WHERE page_id = 'page-1'")
+    worker_a._conn.commit()
+
+    assert [match["page_id"] for match in worker_b.find(make_row("変更履歴削除テスト案件A"))] == ["page-1"]
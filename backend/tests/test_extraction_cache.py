@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+
+import extraction_cache
+from extraction_cache import ExtractionCache, make_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """キャッシュが参照する現在時刻を固定し、テストから進められるようにする"""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(extraction_cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_cache_key_ignores_whitespace_and_width_but_not_version():
+    key = make_cache_key("【業務名】\n社内システム開発　ＡＷＳ", "3:tools:gpt-4o-mini")
+    assert make_cache_key("【業務名】 社内システム開発 AWS  ", "3:tools:gpt-4o-mini") == key
+    assert make_cache_key("【業務名】 社内システム開発 AWS", "4:tools:gpt-4o-mini") != key
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.put("key", {"名前": "案件A"})
+    clock.value += 59
+    assert cache.get("key") == {"名前": "案件A"}
+
+    clock.value += 2
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put("a", {"名前": "案件A"})
+    clock.value += 1
+    cache.put("b", {"名前": "案件B"})
+    clock.value += 1
+    # 参照したエントリは最終アクセス日時が更新され、削除の対象から外れる
+    assert cache.get("a") is not None
+    clock.value += 1
+    cache.put("c", {"名前": "案件C"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,66 @@
+import openai
+import pytest
+
+from job_context import JobContext
+
+POSTING = "【業務名】社内システム開発\n【作業概要】・勤怠管理システムの開発\n【環境】\n開発環境：Python、Docker、Kotlin、Slack\n"
+
+
+def test_salary_is_not_required_without_amount(app_module):
+    row = {"名前": "社内システム開発", "仕事内容": "勤怠管理システムの開発", "給与": "情報なし"}
+    assert app_module.quality_issues(row, POSTING) == []
+
+
+def test_salary_is_required_when_posting_has_amount(app_module):
+    row = {"名前": "社内システム開発", "仕事内容": "勤怠管理システムの開発", "給与": "情報なし"}
+    assert app_module.quality_issues(row, POSTING + "【単金】\n・70万（精算 140-180/月）\n") == ["給与"]
+    assert app_module.quality_issues(row, POSTING + "月額 700,000円\n") == ["給与"]
+
+
+def test_later_tier_wins_on_tie(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "EXTRACTION_TIERS", ["parser", "gpt-4o-mini"])
+    monkeypatch.setattr(app_module, "extraction_cache", None)
+    monkeypatch.setattr(app_module, "run_tier", lambda context, tier, parsed: {"名前": tier})
+    monkeypatch.setattr(app_module, "quality_issues", lambda row, content: ["給与"])
+    context = JobContext(POSTING)
+    context.confidence = 1.0
+    assert app_module.route_extraction(context, {}) == {"名前": "gpt-4o-mini"}
+    assert [step["tier"] for step in context.routing] == ["parser", "gpt-4o-mini"]
+
+
+def test_csv_row_with_extra_columns_can_be_registered(app_module, stubs):
+    values = ["CSV列数テスト案件"] + ["情報なし"] * 19 + ["余分な列"]
+    row = app_module.parse_ai_csv(",".join(values))
+    assert list(row) == list(app_module.FIELDS) and row["その他"] == "情報なし"
+    assert app_module.create_notion_page(row).status_code == 200
+
+
+def route_with_failing_tiers(app_module, monkeypatch, failing, confidence):
+    def run_tier(context, tier, parsed):
+        if tier in failing:
+            raise openai.APIConnectionError(request=None)
+        return {"名前": tier}
+
+    monkeypatch.setattr(app_module, "EXTRACTION_TIERS", ["parser", "gpt-4o-mini", "gpt-4o"])
+    monkeypatch.setattr(app_module, "extraction_cache", None)
+    monkeypatch.setattr(app_module, "run_tier", run_tier)
+    monkeypatch.setattr(app_module, "quality_issues", lambda row, content: [])
+    context = JobContext(POSTING)
+    context.confidence = confidence
+    return context, app_module.route_extraction(context, {})
+
+
+def test_openai_error_escalates_to_next_tier(app_module, monkeypatch):
+    context, row = route_with_failing_tiers(app_module, monkeypatch, {"gpt-4o-mini"}, 0.5)
+    assert row == {"名前": "gpt-4o"}
+    assert context.routing[1]["error"] == "AIによる抽出中にエラーが発生しました"
+
+
+def test_low_confidence_parser_row_is_not_used_when_ai_fails(app_module, monkeypatch):
+    with pytest.raises(app_module.JobProcessingError) as raised:
+        route_with_failing_tiers(app_module, monkeypatch, {"gpt-4o-mini", "gpt-4o"}, 0.5)
+    assert raised.value.status_code == 503
+
+    monkeypatch.setattr(app_module, "PARSER_FALLBACK_ON_AI_ERROR", True)
+    _, row = route_with_failing_tiers(app_module, monkeypatch, {"gpt-4o-mini", "gpt-4o"}, 0.5)
+    assert row == {"名前": "parser"}
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from extraction_schema import (
+    FUNCTION_NAME, JOB_ROW_SCHEMA, SchemaValidationError, function_tool, parse_row, response_format,
+)
+from section_parser import FIELDS, NO_INFO
+
+
+def test_schema_requires_every_field_and_rejects_others():
+    assert JOB_ROW_SCHEMA["required"] == list(FIELDS)
+    assert JOB_ROW_SCHEMA["additionalProperties"] is False
+    assert JOB_ROW_SCHEMA["properties"]["タグ"]["type"] == "array"
+    assert function_tool(strict=True)["function"] == {**function_tool()["function"], "strict": True}
+    assert function_tool()["function"]["name"] == FUNCTION_NAME
+    assert response_format()["json_schema"]["schema"] is JOB_ROW_SCHEMA
+
+
+def test_parse_row_fills_missing_fields_and_keeps_commas():
+    row = parse_row(json.dumps({
+        "名前": " 在庫管理システム開発 ",
+        "タグ": ["Python", " ", "AWS"],
+        "仕事内容": "設計、開発, テスト\n運用",
+        "給与": 70,
+        "期間": "",
+        "未定義の項目": "無視される",
+    }, ensure_ascii=False))
+    assert list(row) == list(FIELDS)
+    assert row["名前"] == "在庫管理システム開発"
+    assert row["タグ"] == "Python, AWS"
+    assert row["仕事内容"] == "設計、開発, テスト\n運用"
+    assert row["給与"] == "70"
+    assert row["期間"] == row["勤務地"] == NO_INFO
+
+
+@pytest.mark.parametrize("arguments, error", [
+    ("{not json", "invalid JSON"),
+    ("[]", "expected object, got list"),
+    ({"タグ": ["Python", 1]}, "タグ: expected array of strings"),
+    ({"名前": {"value": "案件"}}, "名前: expected string, got dict"),
+    ({"給与": True}, "給与: expected string, got bool"),
+])
+def test_parse_row_rejects_values_that_do_not_match_schema(arguments, error):
+    with pytest.raises(SchemaValidationError) as raised:
+        parse_row(arguments)
+    assert raised.value.errors[0].startswith(error)
@@ -0,0 +1,16 @@
+from job_mirror import JobMirror
+
+
+def test_full_sync_removes_pages_deleted_in_notion(app_module, notion_pages, tmp_path, make_row):
+    page = notion_pages.create(make_row("ミラー削除検出テスト案件"))
+    mirror = JobMirror(str(tmp_path / "job_mirror.sqlite3"))
+    mirror.sync(app_module.notion_client, app_module.DATABASE_ID, app_module.notion_schema, workers=2)
+    assert [job["page_id"] for job in mirror.search(query="ミラー削除検出", facets=False)["results"]] == [page["id"]]
+
+    notion_pages.delete(page["id"])
+    result = mirror.sync(app_module.notion_client, app_module.DATABASE_ID, app_module.notion_schema, full=True,
+                         workers=2)
+
+    assert result["removed"] == 1
+    assert mirror.search(query="ミラー削除検出", facets=False)["total"] == 0
+    assert mirror.search(query="削除検出", facets=False)["total"] == 0
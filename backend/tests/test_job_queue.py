@@ -0,0 +1,79 @@
+import sqlite3
+import time
+
+from job_queue import JobQueue
+
+
+def wait_for(queue, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish: {job}")
+
+
+def test_options_are_passed_to_handler(tmp_path):
+    def handler(content, progress, on_duplicate=None):
+        return {"content": content, "on_duplicate": on_duplicate}
+
+    queue = JobQueue(str(tmp_path / "job_queue.sqlite3"), handler, workers=1, poll_interval=0.05)
+    queue.start()
+    with_option = queue.submit("求人A", {"on_duplicate": "update"})
+    without_option = queue.submit("求人B")
+    assert wait_for(queue, with_option)["result"] == {"content": "求人A", "on_duplicate": "update"}
+    assert wait_for(queue, without_option)["result"] == {"content": "求人B", "on_duplicate": None}
+
+
+def test_async_submission_keeps_on_duplicate(app_module):
+    client = app_module.app.test_client()
+    content = ("【業務名】\n非同期重複検出テスト案件\n【作業概要】\n・非同期重複検出テスト用システムの開発\n"
+               "【単金】\n・70万\n【作業期間】\n・2025年4月〜\n")
+    assert client.post("/process_job", json={"content": content}).status_code == 200
+
+    response = client.post("/process_job", json={"content": content, "async": True, "on_duplicate": "skip"})
+    assert response.status_code == 202
+    job = wait_for(app_module.job_queue, response.get_json()["job_id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "登録済みの求人と重複しています"
+
+
+def test_worker_survives_status_update_errors(tmp_path):
+    def handler(content, progress):
+        if content == "失敗する求人":
+            raise ValueError("invalid posting")
+        return {"content": content}
+
+    queue = JobQueue(str(tmp_path / "job_queue.sqlite3"), handler, workers=1, poll_interval=0.05)
+    update = queue._update
+
+    def locked_on_failure(conn, job_id, **fields):
+        if fields.get("status") == "failed":
+            raise sqlite3.OperationalError("database is locked")
+        update(conn, job_id, **fields)
+
+    queue._update = locked_on_failure
+    queue.start()
+    queue.submit("失敗する求人")
+    job_id = queue.submit("求人B")
+    assert wait_for(queue, job_id)["result"] == {"content": "求人B"}
+
+
+def test_worker_survives_purge_errors(tmp_path):
+    queue = JobQueue(str(tmp_path / "job_queue.sqlite3"), lambda content, progress: {"content": content},
+                     workers=1, poll_interval=0.05)
+    purged = []
+
+    def locked(conn):
+        purged.append(True)
+        if len(purged) <= 2:
+            raise sqlite3.OperationalError("database is locked")
+
+    queue._purge = locked
+    queue.start()
+    # キューが空の間に削除が失敗したあとも、ワーカーは次のジョブを処理する
+    while len(purged) < 2:
+        time.sleep(0.05)
+    job_id = queue.submit("求人A")
+    assert wait_for(queue, job_id)["result"] == {"content": "求人A"}
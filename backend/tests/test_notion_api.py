@@ -0,0 +1,76 @@
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from notion_api import NotionClient, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+def make_client(outcomes):
+    """outcomes の順に応答（ステータスコード）または例外を返すクライアントと、送信されたリクエストのリスト"""
+    client = NotionClient("test", rate=1000, max_retries=3, backoff_base=0)
+    sent = []
+
+    def request(method, url, **kwargs):
+        sent.append((method, url))
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    client.session.request = request
+    return client, sent
+
+
+def connect_error():
+    reason = NewConnectionError(None, "Failed to establish a new connection")
+    return requests.ConnectionError(MaxRetryError(None, "/v1/pages", reason))
+
+
+@pytest.mark.parametrize("status", [500, 502, 504])
+def test_create_page_is_not_retried_on_ambiguous_status(status):
+    client, sent = make_client([status, 200])
+    assert client.post("pages", json={}).status_code == status
+    assert len(sent) == 1
+
+
+def test_create_page_is_not_retried_on_read_timeout():
+    client, sent = make_client([requests.ReadTimeout(), 200])
+    with pytest.raises(requests.ReadTimeout):
+        client.post("pages", json={})
+    assert len(sent) == 1
+
+
+@pytest.mark.parametrize("outcome", [429, 503, requests.ConnectTimeout()])
+def test_create_page_is_retried_when_not_delivered(outcome):
+    client, sent = make_client([outcome, 200])
+    assert client.post("pages", json={}).status_code == 200
+    assert len(sent) == 2
+
+
+def test_create_page_is_retried_on_connection_refused():
+    client, sent = make_client([connect_error(), 200])
+    assert client.post("pages", json={}).status_code == 200
+    assert len(sent) == 2
+
+
+def test_idempotent_requests_are_retried_on_server_errors():
+    client, sent = make_client([500, requests.ReadTimeout(), 200, 502, 200])
+    assert client.post("databases/test/query", json={}, idempotent=True).status_code == 200
+    assert client.patch("pages/test", json={}).status_code == 200
+    assert len(sent) == 5
+
+
+def test_token_bucket_below_one_request_per_second():
+    # ワーカー数で等分した結果、1リクエスト/秒未満になった場合も送信できる
+    bucket = TokenBucket(1.5 / 4)
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started < 0.1
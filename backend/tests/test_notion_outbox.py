@@ -0,0 +1,98 @@
+import time
+
+import requests
+
+from job_context import JobContext
+from notion_api import NotionOutbox, NotionUnavailableError
+
+
+def test_replay_skips_page_created_before_timeout(app_module, stubs, make_row):
+    row = make_row("送信待ち再送テスト案件")
+    # タイムアウトしたがNotion側では作成済みのページ（重複検出インデックスには未登録）
+    assert app_module.create_notion_page(row).status_code == 200
+    created = len(stubs["notion"].bodies)
+
+    app_module.sync_duplicate_index_for_replay()
+    result = app_module.replay_notion_row(row, on_duplicate="create", queued_at=time.time())
+
+    assert result["status"] == "duplicate"
+    assert len(stubs["notion"].bodies) == created
+
+
+def test_outage_does_not_count_toward_max_attempts(tmp_path, make_row):
+    outbox = NotionOutbox(str(tmp_path / "outbox.sqlite3"))
+    first = outbox.add(make_row("案件A"), "Notion API returned 503")
+    outbox.add(make_row("案件B"), "Notion API returned 503")
+
+    def unavailable(row, **options):
+        raise NotionUnavailableError("Notion API returned 503")
+
+    for _ in range(15):
+        result = outbox.replay(unavailable, max_attempts=3)
+        assert [entry["id"] for entry in result["failed"]] == [first]
+    assert [entry["attempts"] for entry in outbox.pending(max_attempts=3)] == [0, 0]
+
+
+def test_data_errors_count_toward_max_attempts(tmp_path, make_row):
+    outbox = NotionOutbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.add(make_row("案件A"), "Notion API returned 503")
+
+    def invalid(row, **options):
+        raise ValueError("validation_error")
+
+    for _ in range(3):
+        outbox.replay(invalid, max_attempts=3)
+    assert outbox.pending(max_attempts=3) == []
+    assert outbox.count() == 1
+
+
+def test_replay_applies_saved_on_duplicate(app_module, stubs, make_row):
+    existing = make_row("送信待ち重複設定テスト案件A")
+    assert app_module.create_notion_page(existing).status_code == 200
+    app_module.sync_duplicate_index_for_replay()
+    # 仕事内容が同じ別の案件（あいまい一致の重複）
+    row = dict(existing, 名前="送信待ち重複設定テスト案件B")
+
+    assert app_module.replay_notion_row(row, on_duplicate="skip")["status"] == "duplicate"
+    created = len(stubs["notion"].bodies)
+    result = app_module.replay_notion_row(row, on_duplicate="create", queued_at=time.time())
+    assert result["page_id"]
+    assert len(stubs["notion"].bodies) == created + 1
+
+
+def test_replay_syncs_duplicate_index_once_per_batch(tmp_path, make_row):
+    outbox = NotionOutbox(str(tmp_path / "outbox.sqlite3"))
+    for name in ("案件A", "案件B", "案件C"):
+        outbox.add(make_row(name), "Notion API returned 503", {"on_duplicate": "skip"})
+    prepared = []
+    sent = []
+
+    result = outbox.replay(lambda row, **options: sent.append((row["名前"], options)),
+                           prepare=lambda: prepared.append(True))
+
+    assert len(prepared) == 1
+    assert sent == [(name, {"on_duplicate": "skip"}) for name in ("案件A", "案件B", "案件C")]
+    assert result["remaining"] == 0
+
+
+def test_update_is_saved_to_outbox_when_notion_is_unavailable(app_module, notion_pages, monkeypatch, tmp_path,
+                                                               make_row):
+    row = make_row("送信待ち更新テスト案件")
+    page = notion_pages.create(row)
+    app_module.duplicate_index.add(page["id"], row, page["url"], page["last_edited_time"])
+    outbox = NotionOutbox(str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(app_module, "notion_outbox", outbox)
+    update_notion_page = app_module.update_notion_page
+
+    def unavailable(page_id, row):
+        raise requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr(app_module, "update_notion_page", unavailable)
+    context = JobContext(on_duplicate="update")
+    context.row = dict(row, 給与="80万")
+    assert app_module.publish_job_row(context)["status"] == "deferred"
+    assert outbox.pending()[0]["options"] == {"page_id": page["id"]}
+
+    monkeypatch.setattr(app_module, "update_notion_page", update_notion_page)
+    result = outbox.replay(app_module.replay_notion_row)
+    assert result["sent"][0]["result"] == {"page_id": page["id"], "url": page["url"], "status": "updated"}
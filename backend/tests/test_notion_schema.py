@@ -0,0 +1,48 @@
+from conftest import FakeNotionClient
+from notion_schema import DatabaseSchema
+
+PROPERTIES = {
+    "求人名": {"type": "title", "title": {}},
+    "仕事内容": {"type": "rich_text", "rich_text": {}},
+    "タグ": {"type": "multi_select", "multi_select": {"options": [{"name": "Python"}]}},
+    "雇用形態": {"type": "select", "select": {"options": [{"name": "業務委託"}]}},
+    "給与": {"type": "number", "number": {}},
+}
+
+
+def test_build_properties_skips_keys_that_are_not_strings():
+    schema = DatabaseSchema(FakeNotionClient(PROPERTIES), "test-database")
+    properties = schema.build_properties({"名前": "社内システム開発", "仕事内容": "勤怠管理", None: ["余分な列"]})
+    assert properties == {
+        "求人名": {"title": [{"text": {"content": "社内システム開発"}}]},
+        "仕事内容": {"rich_text": [{"text": {"content": "勤怠管理"}}]},
+    }
+
+
+def test_options_are_matched_to_existing_names_and_deduplicated():
+    schema = DatabaseSchema(FakeNotionClient(PROPERTIES), "test-database")
+    properties = schema.build_properties({"タグ": "python, AWS, 情報なし, aws, P y t h o n", "雇用形態": "業務委託, 派遣"})
+    assert properties["タグ"] == {"multi_select": [{"name": "Python"}, {"name": "AWS"}]}
+    assert properties["雇用形態"] == {"select": {"name": "業務委託"}}
+
+
+def test_unknown_options_are_skipped_when_new_options_are_not_allowed():
+    schema = DatabaseSchema(FakeNotionClient(PROPERTIES), "test-database", allow_new_options=False)
+    properties = schema.build_properties({"タグ": "AWS, python", "雇用形態": "派遣", "給与": "情報なし"})
+    assert properties["タグ"] == {"multi_select": [{"name": "Python"}]}
+    assert properties["雇用形態"] == {"select": None}
+    assert properties["給与"] == {"number": None}
+
+
+def test_remembered_options_are_used_for_later_rows():
+    schema = DatabaseSchema(FakeNotionClient(PROPERTIES), "test-database", allow_new_options=False)
+    schema.get()
+    schema.remember_options({"タグ": {"multi_select": [{"name": "AWS"}]}, "雇用形態": {"select": {"name": "派遣"}}})
+    properties = schema.build_properties({"タグ": "aws", "雇用形態": "派遣"})
+    assert properties["タグ"] == {"multi_select": [{"name": "AWS"}]}
+    assert properties["雇用形態"] == {"select": {"name": "派遣"}}
+
+
+def test_number_is_parsed_from_text():
+    schema = DatabaseSchema(FakeNotionClient(PROPERTIES), "test-database")
+    assert schema.build_properties({"給与": "1,200,000円（スキル見合い）"})["給与"] == {"number": 1200000.0}
@@ -0,0 +1,38 @@
+from pipeline import iter_postings_from_text
+
+
+def test_separator_inside_posting_is_kept():
+    text = "【業務名】社内システム開発\n-----\n【作業概要】・勤怠管理システムの開発\n【単金】・70万"
+    assert list(iter_postings_from_text(text)) == [text]
+
+
+def test_subject_and_business_name_stay_in_one_posting():
+    text = "【件名】社内システム開発案件\n【業務名】社内システム開発\n【作業概要】・勤怠管理システムの開発"
+    assert list(iter_postings_from_text(text)) == [text]
+
+
+def test_separator_followed_by_header_splits_postings():
+    text = "【業務名】案件A\n【作業概要】・開発A\n---\n\n【業務名】案件B\n【作業概要】・開発B\n===\n"
+    assert list(iter_postings_from_text(text)) == [
+        "【業務名】案件A\n【作業概要】・開発A",
+        "【業務名】案件B\n【作業概要】・開発B",
+    ]
+
+
+def test_repeated_header_splits_postings():
+    text = "【案件名】案件A\n【作業概要】・開発A\n【件名】案件B\n【業務名】案件B\n【作業概要】・開発B"
+    assert list(iter_postings_from_text(text)) == [
+        "【案件名】案件A\n【作業概要】・開発A",
+        "【件名】案件B\n【業務名】案件B\n【作業概要】・開発B",
+    ]
+
+
+def test_greeting_before_separator_stays_with_posting():
+    text = "お疲れ様です。本日の案件です。\n-----\n【業務名】社内システム開発\n【作業概要】・勤怠管理システムの開発"
+    assert list(iter_postings_from_text(text)) == [text]
+
+
+def test_subject_and_business_name_with_lines_between_stay_in_one_posting():
+    text = ("【件名】社内システム開発案件のご紹介\nお疲れ様です。以下の案件をご確認ください。\n"
+            "【業務名】社内システム開発\n【作業概要】・勤怠管理システムの開発")
+    assert list(iter_postings_from_text(text)) == [text]
@@ -0,0 +1,15 @@
+def test_concurrency_is_clamped_to_configured_maximum(app_module, monkeypatch):
+    used = {}
+
+    def run_batch(contents, transform, publish, transform_workers, publish_workers):
+        used.update(ai=transform_workers, notion=publish_workers)
+        return {"summary": {"total": 1}}
+
+    monkeypatch.setattr(app_module, "run_batch", run_batch)
+    monkeypatch.setattr(app_module, "MAX_AI_CONCURRENCY", 8)
+    monkeypatch.setattr(app_module, "MAX_NOTION_CONCURRENCY", 3)
+    response = app_module.app.test_client().post("/process_jobs", json={
+        "contents": ["【業務名】案件A"], "ai_concurrency": 10000, "notion_concurrency": 500,
+    })
+    assert response.status_code == 200
+    assert used == {"ai": 8, "notion": 3}
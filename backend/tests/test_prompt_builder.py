@@ -0,0 +1,60 @@
+import pytest
+
+import prompt_builder
+from prompt_builder import TRIM_MARKER, compact_posting, count_tokens
+
+POSTING = (
+    "お世話になっております。\n下記案件のご紹介です。\n"
+    "==========\n"
+    "【業務名】\n在庫管理システム開発\n"
+    "【作業概要】\n" + "在庫管理システムの設計と開発を担当します。" * 20 + "\n"
+    "【備考】\n" + "主体的に行動できる方を歓迎します。" * 20 + "\n"
+    "【単金】\n70万\n"
+    "【面談】\n1回\n"
+    "【商流】\nエンド直\n"
+    "よろしくお願いいたします。\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # tiktoken の有無に関わらず同じトークン数になるように概算を使う
+    monkeypatch.setattr(prompt_builder, "_encoding", lambda model: None)
+
+
+def test_boilerplate_and_irrelevant_sections_are_removed():
+    text, removed, trimmed = compact_posting(POSTING)
+    assert removed == ["面談", "商流"]
+    assert trimmed == []
+    assert text.startswith("【業務名】\n在庫管理システム開発\n【作業概要】")
+    assert "お世話になっております" not in text and "よろしくお願い" not in text
+    assert "【面談】" not in text and "==" not in text
+
+
+def test_low_priority_sections_are_trimmed_first():
+    full, _, _ = compact_posting(POSTING)
+    max_tokens = count_tokens(full) - 200
+    text, _, trimmed = compact_posting(POSTING, max_tokens)
+    assert trimmed == ["備考"]
+    assert count_tokens(text) <= max_tokens
+    sections = dict(section.split("】\n", 1) for section in text.split("【")[1:])
+    assert sections["備考"].rstrip().endswith(TRIM_MARKER)
+    assert sections["作業概要"].rstrip() == "在庫管理システムの設計と開発を担当します。" * 20
+    assert sections["業務名"].rstrip() == "在庫管理システム開発"
+    assert sections["単金"].rstrip() == "70万"
+
+
+def test_preamble_is_dropped_before_sections_are_trimmed():
+    posting = "案件の補足です。" * 10 + "\n【業務名】\n在庫管理\n【備考】\n" + "備考" * 50
+    full, _, _ = compact_posting(posting)
+    text, _, trimmed = compact_posting(posting, count_tokens(full) - 20)
+    assert trimmed == ["(preamble)"]
+    assert text.startswith("【業務名】")
+
+
+def test_important_sections_are_kept_until_everything_is_trimmed():
+    posting = "【業務名】\n" + "在庫管理" * 50 + "\n【単金】\n" + "70万" * 50
+    text, _, trimmed = compact_posting(posting, 100)
+    assert trimmed == ["(all)"]
+    assert text.endswith(TRIM_MARKER)
+    assert count_tokens(text) <= 100
@@ -0,0 +1,44 @@
+import os
+
+from conftest import BACKEND_DIR
+from section_parser import NO_INFO, extract_fields, extract_tags, score_row
+
+with open(os.path.join(BACKEND_DIR, "bench", "sample_posting.txt"), encoding="utf-8") as f:
+    SAMPLE_POSTING = f.read()
+
+
+def test_structured_posting_is_extracted_with_full_confidence():
+    row, confidence = extract_fields(SAMPLE_POSTING)
+    assert confidence == 1.0
+    assert row["名前"] == row["案件タイトル"] == "福祉事業会社向け 社内システム開発支援"
+    assert row["必須スキル"] == "Ruby on Railsでの開発経験3年以上 チーム開発経験"
+    assert row["歓迎スキル"] == "React.jsでの開発経験 AWSの知識"
+    assert row["開発環境"] == "Ruby、Ruby on Rails、TypeScript、React.js"
+    assert row["業種業界"] == "福祉事業"
+    assert row["稼働率"] == "140-180/月"
+    # 人物像に関する備考と、それ以外の備考・未知の見出しを分ける
+    assert row["期待する人物像"] == "主体的・自律的に行動できる方"
+    assert row["その他"] == "外国籍不可 / 面談: 1回（Web）"
+
+
+def test_heading_aliases_are_normalized():
+    row, _ = extract_fields("【案件名】\n在庫管理\n【業務内容】\n・在庫管理システム開発\n【単価】\n・60万\n")
+    assert (row["名前"], row["仕事内容"], row["給与"]) == ("在庫管理", "在庫管理システム開発", "60万")
+
+
+def test_free_form_posting_has_low_confidence():
+    row, confidence = extract_fields("Pythonエンジニア募集。リモート可、単価70万程度。詳細はご相談ください。")
+    assert confidence == 0.0
+    assert row["名前"] == NO_INFO
+    assert row["タグ"] == "Python"
+
+
+def test_score_ignores_salary_without_amount_and_period_with_tech_names():
+    row = {"名前": "在庫管理", "仕事内容": "在庫管理システム開発", "給与": "スキル見合い", "期間": "Ruby 経験"}
+    assert score_row(row) == 0.3
+    assert score_row(dict(row, 給与="60万", 期間="2025年4月〜")) == 0.55
+
+
+def test_ascii_tags_require_word_boundaries():
+    assert extract_tags("Googleの広告基盤") == []
+    assert extract_tags("Googleの広告基盤、Go言語") == ["Go"]
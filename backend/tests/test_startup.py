@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+
+def test_import_does_not_open_sqlite_stores(stubs, tmp_path):
+    """import app の時点では SQLite のファイルを開かず、重複検出インデックスも読み込まない"""
+    paths = {
+        "JOB_QUEUE_PATH": tmp_path / "job_queue.sqlite3",
+        "NOTION_OUTBOX_PATH": tmp_path / "notion_outbox.sqlite3",
+        "DUPLICATE_INDEX_PATH": tmp_path / "duplicate_index.sqlite3",
+        "JOB_MIRROR_PATH": tmp_path / "job_mirror.sqlite3",
+        "EXTRACTION_CACHE_PATH": tmp_path / "extraction_cache.sqlite3",
+    }
+    env = dict(os.environ)
+    env.update({name: str(path) for name, path in paths.items()})
+    env.update({
+        "LOG_LEVEL": "WARNING",
+        "OPENAI_API_KEY": "test",
+        "OPENAI_BASE_URL": stubs["openai_url"],
+        "NOTION_API_URL": stubs["notion_url"],
+        "NOTION_TOKEN": "test",
+        "NOTION_DATABASE_ID": "test-database",
+    })
+    completed = subprocess.run(
+        [sys.executable, "-c", "import app; assert app.duplicate_index._db is None"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert [name for name, path in paths.items() if os.path.exists(path)] == []
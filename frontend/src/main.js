@@ -49,6 +49,37 @@ document.addEventListener('DOMContentLoaded', function() {
       console.error('API connection test failed:', error);
     });
   
+  // ジョブの進捗表示用のラベル
+  const progressLabels = {
+    queued: '順番待ち中...',
+    started: '処理中...',
+    transforming: 'AIで解析中...',
+    publishing: 'Notionに登録中...',
+  };
+  
+  // ジョブの完了を待つ時間の上限（ミリ秒）
+  const JOB_TIMEOUT_MS = 10 * 60 * 1000;
+  
+  async function waitForJob(jobId) {
+    const deadline = Date.now() + JOB_TIMEOUT_MS;
+    while (true) {
+      const response = await fetch(`${apiUrl}/jobs/${jobId}`, { mode: 'cors' });
+      const job = await response.json();
+      // 別のワーカーのキューにある、または削除済みのジョブは 404 になるためポーリングを止める
+      if (!response.ok || !job.status) {
+        throw new Error(job.message || `ジョブの状態を取得できませんでした（HTTP ${response.status}）`);
+      }
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      if (Date.now() > deadline) {
+        throw new Error('ジョブの処理がタイムアウトしました');
+      }
+      resultDiv.textContent = progressLabels[job.progress] || '処理中...';
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  }
+  
   submitBtn.addEventListener('click', async () => {
     const content = jobContentTextarea.value;
     
@@ -64,24 +95,50 @@ document.addEventListener('DOMContentLoaded', function() {
       console.log('Sending request to:', apiUrl);
       console.log('Request data:', { content });
       
+      // ジョブとして登録し、完了するまで状態をポーリングする
       const response = await fetch(`${apiUrl}/process_job`, {
         method: 'POST',
         mode: 'cors',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ content }),
+        body: JSON.stringify({ content, async: true }),
       });
       
       console.log('Response status:', response.status);
       const data = await response.json();
       console.log('Response data:', data);
       
-      resultDiv.textContent = data.message;
+      if (response.status !== 202) {
+        resultDiv.textContent = data.message;
+        resultDiv.style.color = response.ok ? 'green' : 'red';
+        return;
+      }
+      
+      // 複数の求人が貼り付けられた場合は求人ごとのジョブの完了を待つ
+      if (data.jobs) {
+        const jobs = [];
+        for (const [index, queued] of data.jobs.entries()) {
+          resultDiv.textContent = `${index + 1}/${data.jobs.length}件目を処理中...`;
+          jobs.push(await waitForJob(queued.job_id));
+        }
+        const failed = jobs.filter(job => job.status === 'failed');
+        resultDiv.textContent = failed.length
+          ? `${jobs.length}件中${failed.length}件でエラーが発生しました: ${failed.map(job => job.error).join(' / ')}`
+          : `${jobs.length}件の求人の処理が完了しました`;
+        resultDiv.style.color = failed.length ? 'red' : 'green';
+        return;
+      }
       
-      if (response.ok) {
+      const job = await waitForJob(data.job_id);
+      if (job.status === 'succeeded' && job.result && job.result.status === 'deferred') {
+        resultDiv.textContent = 'Notionが一時的に利用できないため登録を保留しました（自動的に再送されます）';
+        resultDiv.style.color = 'orange';
+      } else if (job.status === 'succeeded') {
+        resultDiv.textContent = '処理が完了しました';
         resultDiv.style.color = 'green';
       } else {
+        resultDiv.textContent = `エラーが発生しました: ${job.error}`;
         resultDiv.style.color = 'red';
       }
     } catch (error) {